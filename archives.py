@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import dataclasses
+import hashlib
+import itertools
+import json
+import logging
+import os
+import posixpath
+import zipfile
+
+from collections.abc import Iterator
+from typing import IO
+
+from catalog import load_catalog_pages, save_catalog_pages
+from content_store import HASH_CHUNK_SIZE, ContentStore, hash_file
+from downloader import PART_FILE_SUFFIX, get_download_state_path
+from export import EXPORT_DIR, export_catalog
+from metrics import metrics
+from utils import ArchiveMember, GuidencePublishPage, render_markdown
+
+try:
+    import rarfile
+except ImportError:
+    # 未安装 rarfile 时不展开 RAR 压缩包
+    rarfile = None
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 展开状态
+ARCHIVE_STATUS_EXPANDED = "expanded"
+ARCHIVE_STATUS_UNCHANGED = "unchanged"
+ARCHIVE_STATUS_UNSUPPORTED = "unsupported"
+ARCHIVE_STATUS_FAILED = "failed"
+
+# 压缩包格式
+ARCHIVE_FORMAT_ZIP = "zip"
+ARCHIVE_FORMAT_RAR = "rar"
+ARCHIVE_FORMAT_7Z = "7z"
+
+# 压缩包附件的扩展名
+ARCHIVE_EXTENSION_LIST = [".zip", ".rar", ".7z"]
+
+# 压缩包文件头，扩展名与实际格式不一定一致
+ARCHIVE_MAGIC_LIST = [
+    (b"PK\x03\x04", ARCHIVE_FORMAT_ZIP),
+    (b"Rar!\x1a\x07", ARCHIVE_FORMAT_RAR),
+    (b"7z\xbc\xaf\x27\x1c", ARCHIVE_FORMAT_7Z),
+]
+
+# 成员清单文件后缀，保存在压缩包的下载状态文件旁
+MANIFEST_SUFFIX = ".members.json"
+
+# 压缩包展开目录的根目录，位于不纳入版本控制的缓存目录中
+ARCHIVE_EXTRACT_DIR = os.path.join(".cache", "archives")
+
+# 单个压缩包展开后的总大小上限（字节），超过时视为异常的压缩包，不展开
+MAX_EXPANDED_SIZE = 2 * 1024**3
+
+# zip 文件名使用 UTF-8 编码的标志位
+ZIP_FLAG_UTF8 = 0x800
+
+
+@dataclasses.dataclass
+class ArchiveResult:
+    save_path: str
+    status: str
+    members: tuple[ArchiveMember, ...] = ()
+    bytes: int = 0
+    duplicates: int = 0
+    error: str = ""
+
+
+def is_archive(file_name: str) -> bool:
+    return os.path.splitext(file_name)[1].lower() in ARCHIVE_EXTENSION_LIST
+
+
+def get_archive_format(file_path: str) -> str | None:
+    """
+    根据文件头判断压缩包格式，无法识别时返回 None。
+    """
+
+    with open(file_path, "rb") as f:
+        header = f.read(8)
+    for magic, archive_format in ARCHIVE_MAGIC_LIST:
+        if header.startswith(magic):
+            return archive_format
+    return None
+
+
+def get_extract_dir(save_path: str, root: str = "guidences") -> str:
+    """
+    获取压缩包的展开目录：`ARCHIVE_EXTRACT_DIR` 下与压缩包相对 `root` 的路径相同的目录，目录名保留扩展名，
+    如 `guidences/2009-04-28/胃管.rar` 展开至 `.cache/archives/2009-04-28/胃管.rar`，同名的 zip 与 rar 压缩包互不覆盖。
+    """
+
+    return os.path.join(ARCHIVE_EXTRACT_DIR, os.path.relpath(save_path, root))
+
+
+def get_manifest_path(save_path: str) -> str:
+    return get_download_state_path(save_path) + MANIFEST_SUFFIX
+
+
+def read_manifest(manifest_path: str) -> tuple[str, tuple[ArchiveMember, ...]] | None:
+    """
+    读取成员清单，返回压缩包的 SHA-256 摘要及成员，清单不存在时返回 None。
+    """
+
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    return manifest["sha256"], tuple(ArchiveMember(**member) for member in manifest["members"])
+
+
+def write_manifest(manifest_path: str, sha256: str, members: tuple[ArchiveMember, ...]) -> None:
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"sha256": sha256, "members": [dataclasses.asdict(member) for member in members]},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    os.replace(tmp_path, manifest_path)
+
+
+def get_zip_member_name(info: zipfile.ZipInfo) -> str:
+    """
+    获取 zip 成员的文件名。没有 UTF-8 标志的文件名被 zipfile 按 CP437 解码，而国内的压缩软件通常使用 GBK 编码，
+    按原始字节依次尝试 UTF-8 及 GBK 解码。
+    """
+
+    if info.flag_bits & ZIP_FLAG_UTF8:
+        return info.filename
+    raw_name = info.filename.encode("cp437")
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return raw_name.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return info.filename
+
+
+def get_safe_member_name(name: str) -> str | None:
+    """
+    规范化成员路径，拒绝绝对路径及指向展开目录之外的路径。
+    """
+
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    if name in ("", ".") or name == ".." or name.startswith("../") or ":" in name.split("/")[0]:
+        return None
+    return name
+
+
+def iter_archive_members(file_path: str, archive_format: str) -> Iterator[tuple[str, int, IO[bytes]]]:
+    """
+    依次打开压缩包中的文件，生成 `(成员路径, 大小, 文件流)`，跳过目录。文件内容以流的形式读取，不整体载入内存。
+    """
+
+    if archive_format == ARCHIVE_FORMAT_ZIP:
+        archive = zipfile.ZipFile(file_path)
+    else:
+        archive = rarfile.RarFile(file_path)
+
+    with archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+        if sum(info.file_size for info in infos) > MAX_EXPANDED_SIZE:
+            raise ValueError(f"expanded size exceeds {MAX_EXPANDED_SIZE} bytes")
+        for info in infos:
+            name = get_zip_member_name(info) if archive_format == ARCHIVE_FORMAT_ZIP else info.filename
+            with archive.open(info) as f:
+                yield name, info.file_size, f
+
+
+def expand_archive(save_path: str, content_store: ContentStore | None = None) -> ArchiveResult:
+    """
+    展开单个压缩包。
+
+    - 压缩包内容与成员清单中记录的摘要相同，且成员文件均存在时，直接返回清单中的成员；
+    - 成员逐个以流的形式解压到 `.part` 临时文件，同时计算摘要，完整后原子地重命名为目标文件；
+    - 成员在内容索引中登记，与 `guidences` 目录中其他文件内容相同的成员改为指向已有文件的链接；
+    - 压缩包更新后不再包含的旧成员文件被删除。
+
+    Args:
+        save_path (str): 压缩包路径。
+        content_store (ContentStore | None): 内容索引，为 None 时不去重。
+    Returns:
+        ArchiveResult: 展开结果。
+    """
+
+    result = ArchiveResult(save_path=save_path, status=ARCHIVE_STATUS_FAILED)
+    archive_format = get_archive_format(save_path)
+    if archive_format != ARCHIVE_FORMAT_ZIP and not (archive_format == ARCHIVE_FORMAT_RAR and rarfile is not None):
+        result.status = ARCHIVE_STATUS_UNSUPPORTED
+        result.error = f"unsupported archive format: {archive_format}"
+        return result
+
+    sha256 = (content_store.get_digest(save_path) if content_store is not None else None) or hash_file(save_path)
+    extract_dir = get_extract_dir(save_path)
+    manifest_path = get_manifest_path(save_path)
+    manifest = read_manifest(manifest_path)
+    if (
+        manifest is not None
+        and manifest[0] == sha256
+        and all(os.path.exists(os.path.join(extract_dir, member.name)) for member in manifest[1])
+    ):
+        result.status = ARCHIVE_STATUS_UNCHANGED
+        result.members = manifest[1]
+        return result
+
+    logger.info(f"正在将 {save_path} 展开至 {extract_dir}")
+    members: list[ArchiveMember] = []
+    member_digests: set[str] = set()
+    try:
+        for name, size, f in iter_archive_members(save_path, archive_format):
+            if (safe_name := get_safe_member_name(name)) is None:
+                logger.warning(f"Skipped unsafe member {name!r} in {save_path}.")
+                continue
+
+            member_path = os.path.join(extract_dir, *safe_name.split("/"))
+            part_path = member_path + PART_FILE_SUFFIX
+            os.makedirs(os.path.dirname(member_path), exist_ok=True)
+            digest = hashlib.sha256()
+            with open(part_path, "wb") as out:
+                while chunk := f.read(HASH_CHUNK_SIZE):
+                    out.write(chunk)
+                    digest.update(chunk)
+            os.replace(part_path, member_path)
+
+            member = ArchiveMember(safe_name, size, digest.hexdigest())
+            members.append(member)
+            result.bytes += size
+            # 同一压缩包中内容相同的成员都保留，只与压缩包之外的文件去重
+            if content_store is not None and member.sha256 not in member_digests:
+                if content_store.add(member_path, member.sha256) is not None:
+                    result.duplicates += 1
+            member_digests.add(member.sha256)
+    except Exception as e:
+        result.error = repr(e)
+        return result
+
+    # 删除旧版本压缩包中已不存在的成员
+    if manifest is not None:
+        names = {member.name for member in members}
+        for old_member in manifest[1]:
+            old_path = os.path.join(extract_dir, *old_member.name.split("/"))
+            if old_member.name not in names and os.path.exists(old_path):
+                os.remove(old_path)
+
+    write_manifest(manifest_path, sha256, tuple(members))
+    result.status = ARCHIVE_STATUS_EXPANDED
+    result.members = tuple(members)
+    return result
+
+
+def expand_archives(
+    guidence_publish_pages: list[GuidencePublishPage],
+    content_store: ContentStore | None = None,
+    max_workers: int = 4,
+) -> list[ArchiveResult]:
+    """
+    展开所有已下载的压缩包附件，并将成员记录到对应附件的 `members` 中。
+
+    未展开的压缩包（格式不支持或展开失败）保留附件原有的 `members`。
+
+    Args:
+        guidence_publish_pages (list[GuidencePublishPage]): 指导原则发布页列表。
+        content_store (ContentStore | None): 内容索引，为 None 时不去重。
+        max_workers (int): 同时展开的压缩包数量。
+    Returns:
+        list[ArchiveResult]: 每个压缩包的展开结果。
+    """
+
+    archive_accessories = []
+    for page in guidence_publish_pages:
+        save_dir = os.path.join("guidences", page.date.strftime("%Y-%m-%d"))
+        for accessory in page.accessories:
+            save_path = os.path.join(save_dir, accessory.purified_title)
+            if accessory.is_valid and is_archive(accessory.purified_title) and os.path.isfile(save_path):
+                archive_accessories.append((accessory, save_path))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(
+            executor.map(
+                expand_archive,
+                [save_path for _, save_path in archive_accessories],
+                itertools.repeat(content_store),
+            )
+        )
+
+    for (accessory, _), result in zip(archive_accessories, results):
+        metrics.increment("archives", status=result.status)
+        if result.status == ARCHIVE_STATUS_FAILED:
+            logger.error(f"Failed to expand {result.save_path}: {result.error}.")
+        elif result.status == ARCHIVE_STATUS_UNSUPPORTED:
+            logger.debug(f"{result.save_path} 无法展开：{result.error}")
+        else:
+            accessory.members = result.members
+        metrics.increment("archive_member_bytes", result.bytes)
+    return results
+
+
+def summarize_results(results: list[ArchiveResult]) -> str:
+    counts = {
+        status: sum(result.status == status for result in results)
+        for status in (
+            ARCHIVE_STATUS_EXPANDED,
+            ARCHIVE_STATUS_UNCHANGED,
+            ARCHIVE_STATUS_UNSUPPORTED,
+            ARCHIVE_STATUS_FAILED,
+        )
+    }
+    return (
+        f"展开 {counts[ARCHIVE_STATUS_EXPANDED]} 个压缩包，未变化 {counts[ARCHIVE_STATUS_UNCHANGED]} 个，"
+        f"无法展开 {counts[ARCHIVE_STATUS_UNSUPPORTED]} 个，失败 {counts[ARCHIVE_STATUS_FAILED]} 个；"
+        f"共 {sum(len(result.members) for result in results)} 个文件，"
+        f"{sum(result.duplicates for result in results)} 个与已有文件重复"
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Expand downloaded archives and record their members in the catalog.")
+    parser.add_argument("--catalog", help="The SQLite catalog to update, the pickle file is updated otherwise.")
+    parser.add_argument("--pickle", default="guidences.pickle", help="The pickle file of the catalog.")
+    parser.add_argument("--markdown", default="guidences-list.md", help="The Markdown file to update.")
+    parser.add_argument("--max-workers", type=int, default=4, help="The number of archives expanded concurrently.")
+    args = parser.parse_args()
+
+    guidence_publish_pages = load_catalog_pages(args.catalog, args.pickle)
+    with ContentStore() as content_store:
+        results = expand_archives(guidence_publish_pages, content_store, args.max_workers)
+    logger.info(summarize_results(results))
+
+    change_set, guidence_publish_page_list = save_catalog_pages(guidence_publish_pages, args.catalog, args.pickle)
+    logger.info(change_set.summary())
+    render_markdown(guidence_publish_page_list, args.markdown, change_set)
+    export_catalog(guidence_publish_page_list, EXPORT_DIR, change_set)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import copy
+import dataclasses
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+
+from catalog import Catalog
+from downloader import DOWNLOAD_STATUS_DOWNLOADED, DOWNLOAD_STATUS_FAILED
+from pipeline import CrawlPipeline
+from replay_server import DEFAULT_ATTACHMENT_SIZE, FaultSettings, ReplaySite, scale_pages, start_replay_server
+from throttle import configure_throttle
+from utils import (
+    BACKEND_HTTP,
+    BACKEND_LIST,
+    DriverPool,
+    GuidencePublishPage,
+    discover_max_page,
+    read_pickle_file,
+    render_markdown,
+    set_listing_url,
+    update_pickle_file,
+)
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不记录内存峰值
+    resource = None
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 默认的目录规模（当前目录大小的倍数）
+DEFAULT_SCALES = [1, 10, 100]
+
+# 基准测试报告文件路径
+BENCHMARK_REPORT_PATH = os.path.join(".cache", "benchmark.json")
+
+# 增量合并时修改的发布页数量，相当于一次定时任务获取到的一个列表页
+INCREMENTAL_PAGE_COUNT = 20
+
+
+@dataclasses.dataclass
+class CrawlBenchmarkResult:
+    scale: int
+    seconds: float
+    listing_pages: int
+    publish_pages: int
+    downloads: int
+    failed_downloads: int
+    download_bytes: int
+    pages_per_second: float
+    downloads_per_second: float
+    peak_rss_mib: float | None
+
+
+@dataclasses.dataclass
+class CatalogBenchmarkResult:
+    scale: int
+    pages: int
+    accessories: int
+    full_merge_seconds: float
+    incremental_merge_seconds: float
+    full_render_seconds: float
+    incremental_render_seconds: float
+    catalog_upsert_seconds: float
+    catalog_incremental_upsert_seconds: float
+    peak_rss_mib: float | None
+
+
+def get_peak_rss_mib() -> float | None:
+    """
+    获取当前进程的内存峰值（MiB），每个基准测试在独立的子进程中运行，互不影响。
+    """
+
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 的单位为 KiB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_crawl_benchmark(
+    scale: int,
+    listing_url: str,
+    work_dir: str,
+    backend: str,
+    max_concurrency: int,
+    max_downloads: int,
+) -> CrawlBenchmarkResult:
+    """
+    从回放站点获取全部列表页、附件信息并下载附件，附件保存在 `work_dir` 中。
+    """
+
+    os.chdir(work_dir)
+    set_listing_url(listing_url)
+    # 只测量爬虫本身的吞吐量，不限制请求速率
+    configure_throttle(rate=1e6, burst=10**6, max_concurrency=max_concurrency)
+
+    start_time = time.perf_counter()
+    with DriverPool(size=min(4, os.cpu_count())) as driver_pool:
+        max_page = discover_max_page(backend, driver_pool)
+        pipeline = CrawlPipeline(
+            backend,
+            driver_pool,
+            max_listing_workers=8,
+            max_accessory_workers=max_concurrency,
+            timeout=60,
+            max_connections=max_downloads,
+            max_connections_per_host=max_downloads,
+        )
+        pipeline_result = pipeline.run(range(max_page + 1), datetime.date.min, datetime.date.max)
+    seconds = time.perf_counter() - start_time
+
+    downloaded = [result for result in pipeline_result.download_results if result.status == DOWNLOAD_STATUS_DOWNLOADED]
+    publish_pages = len(pipeline_result.pages)
+    return CrawlBenchmarkResult(
+        scale=scale,
+        seconds=seconds,
+        listing_pages=max_page + 1,
+        publish_pages=publish_pages,
+        downloads=len(downloaded),
+        failed_downloads=sum(result.status == DOWNLOAD_STATUS_FAILED for result in pipeline_result.download_results),
+        download_bytes=sum(result.bytes for result in downloaded),
+        pages_per_second=(max_page + 1 + publish_pages) / seconds,
+        downloads_per_second=len(downloaded) / seconds,
+        peak_rss_mib=get_peak_rss_mib(),
+    )
+
+
+def make_incremental_pages(guidence_publish_pages: list[GuidencePublishPage]) -> list[GuidencePublishPage]:
+    """
+    模拟一次定时任务获取到的发布页：最新的 `INCREMENTAL_PAGE_COUNT` 个发布页，其中一个发布页的附件有变化，
+    另有一个新的发布页。
+    """
+
+    new_pages = [copy.deepcopy(page) for page in guidence_publish_pages[:INCREMENTAL_PAGE_COUNT]]
+    for page in new_pages:
+        if page.accessories:
+            page.accessories[0].content += "（修订）"
+            break
+    if new_pages:
+        latest_page = new_pages[0]
+        new_pages.insert(
+            0,
+            GuidencePublishPage(
+                f"{latest_page.title}（新）",
+                latest_page.url.replace(".html", "-new.html"),
+                latest_page.date + datetime.timedelta(days=1),
+                copy.deepcopy(latest_page.accessories),
+            ),
+        )
+    return new_pages
+
+
+def run_catalog_benchmark(scale: int, pickle_path: str, work_dir: str) -> CatalogBenchmarkResult:
+    """
+    测量合并目录、生成 Markdown 文件及更新 SQLite 目录的耗时，每项分别测量全量及增量两种情况。
+    """
+
+    guidence_publish_pages = scale_pages(read_pickle_file(os.path.abspath(pickle_path)), scale)
+    incremental_pages = make_incremental_pages(guidence_publish_pages)
+    os.chdir(work_dir)
+
+    start_time = time.perf_counter()
+    update_pickle_file(guidence_publish_pages, "guidences.pickle")
+    full_merge_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    render_markdown(read_pickle_file("guidences.pickle", keep_candidates=False), "guidences-list.md")
+    full_render_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    change_set = update_pickle_file(incremental_pages, "guidences.pickle")
+    incremental_merge_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    render_markdown(read_pickle_file("guidences.pickle", keep_candidates=False), "guidences-list.md", change_set)
+    incremental_render_seconds = time.perf_counter() - start_time
+
+    with Catalog("guidences.db") as catalog:
+        start_time = time.perf_counter()
+        catalog.upsert_pages(guidence_publish_pages)
+        catalog_upsert_seconds = time.perf_counter() - start_time
+
+    with Catalog("guidences.db") as catalog:
+        start_time = time.perf_counter()
+        catalog.upsert_pages(incremental_pages)
+        catalog_incremental_upsert_seconds = time.perf_counter() - start_time
+
+    return CatalogBenchmarkResult(
+        scale=scale,
+        pages=len(guidence_publish_pages),
+        accessories=sum(len(page.accessories) for page in guidence_publish_pages),
+        full_merge_seconds=full_merge_seconds,
+        incremental_merge_seconds=incremental_merge_seconds,
+        full_render_seconds=full_render_seconds,
+        incremental_render_seconds=incremental_render_seconds,
+        catalog_upsert_seconds=catalog_upsert_seconds,
+        catalog_incremental_upsert_seconds=catalog_incremental_upsert_seconds,
+        peak_rss_mib=get_peak_rss_mib(),
+    )
+
+
+def run_in_subprocess(function, *args):
+    """
+    在独立的子进程中运行基准测试，使内存峰值及工作目录互不影响。
+    """
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(function, *args).result()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Benchmark the crawler against a local replay of the guidence site.")
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SCALES,
+        help="The catalog sizes to benchmark, as multiples of the current catalog.",
+    )
+    parser.add_argument("--pickle", default="guidences.pickle", help="The catalog to build the replay site from.")
+    parser.add_argument("--skip-crawl", action="store_true", help="Only benchmark merging and rendering the catalog.")
+    parser.add_argument("--skip-catalog", action="store_true", help="Only benchmark crawling the replay site.")
+    parser.add_argument(
+        "--listing-url",
+        help="Crawl an already running replay server (`python -m replay_server`) instead of starting one, "
+        "only one scale is benchmarked in this case.",
+    )
+    parser.add_argument(
+        "--backend", choices=BACKEND_LIST, default=BACKEND_HTTP, help="The backend used to fetch pages."
+    )
+    parser.add_argument("--max-concurrency", type=int, default=16, help="The number of concurrent page requests.")
+    parser.add_argument("--max-downloads", type=int, default=32, help="The number of concurrent downloads.")
+    parser.add_argument(
+        "--attachment-size", type=int, default=DEFAULT_ATTACHMENT_SIZE, help="The size of each attachment in bytes."
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="The delay added to every response in seconds.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="The fraction of requests answered with 503.")
+    parser.add_argument(
+        "--truncate-rate",
+        type=float,
+        default=0.0,
+        help="The fraction of attachment responses cut off halfway through.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="The random seed of the injected faults.")
+    parser.add_argument("--output", default=BENCHMARK_REPORT_PATH, help="The JSON file to write the results to.")
+    args = parser.parse_args()
+
+    scales = args.scales[:1] if args.listing_url else args.scales
+    faults = FaultSettings(latency=args.latency, error_rate=args.error_rate, truncate_rate=args.truncate_rate)
+    report: dict[str, list[dict]] = {"crawl": [], "catalog": []}
+
+    for scale in scales:
+        if not args.skip_crawl:
+            server = None
+            if args.listing_url:
+                listing_url = args.listing_url
+            else:
+                site = ReplaySite(scale_pages(read_pickle_file(args.pickle), scale), args.attachment_size)
+                server = start_replay_server(site, faults=faults, seed=args.seed)
+                listing_url = server.listing_url
+            try:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    crawl_result = run_in_subprocess(
+                        run_crawl_benchmark,
+                        scale,
+                        listing_url,
+                        work_dir,
+                        args.backend,
+                        args.max_concurrency,
+                        args.max_downloads,
+                    )
+            finally:
+                if server is not None:
+                    server.shutdown()
+                    server.server_close()
+            logger.info(
+                f"{scale}x 爬取：{crawl_result.publish_pages} 个发布页，{crawl_result.downloads} 个附件，"
+                f"耗时 {crawl_result.seconds:.2f} 秒，{crawl_result.pages_per_second:.1f} 页/秒，"
+                f"{crawl_result.downloads_per_second:.1f} 个附件/秒，内存峰值 {crawl_result.peak_rss_mib} MiB"
+            )
+            report["crawl"].append(dataclasses.asdict(crawl_result))
+
+        if not args.skip_catalog:
+            with tempfile.TemporaryDirectory() as work_dir:
+                catalog_result = run_in_subprocess(run_catalog_benchmark, scale, args.pickle, work_dir)
+            logger.info(
+                f"{scale}x 目录：{catalog_result.pages} 个发布页，"
+                f"合并 {catalog_result.full_merge_seconds:.2f} / {catalog_result.incremental_merge_seconds:.2f} 秒，"
+                f"生成 Markdown {catalog_result.full_render_seconds:.2f} / "
+                f"{catalog_result.incremental_render_seconds:.2f} 秒，"
+                f"更新 SQLite 目录 {catalog_result.catalog_upsert_seconds:.2f} / "
+                f"{catalog_result.catalog_incremental_upsert_seconds:.2f} 秒（全量 / 增量），"
+                f"内存峰值 {catalog_result.peak_rss_mib} MiB"
+            )
+            report["catalog"].append(dataclasses.asdict(catalog_result))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"基准测试结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import argparse
+import datetime
+import logging
+import os
+import pickle
+import sqlite3
+
+from utils import (
+    Accessory,
+    ArchiveMember,
+    ChangeSet,
+    GuidencePublishPage,
+    get_page_digest,
+    merge_accessories,
+    read_pickle_file,
+    update_pickle_file,
+)
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# SQLite 目录文件扩展名
+CATALOG_EXTENSION_LIST = [".db", ".sqlite", ".sqlite3"]
+
+# 附件字段，与 accessories 表的列一一对应
+ACCESSORY_FIELD_LIST = [
+    "content",
+    "anchor_title",
+    "anchor_content",
+    "anchor_href",
+    "anchor_text_value",
+    "purified_title",
+    "is_valid",
+    "is_link_available",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    date TEXT NOT NULL,
+    digest TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS pages_date ON pages (date);
+
+CREATE TABLE IF NOT EXISTS accessories (
+    page_url TEXT NOT NULL REFERENCES pages (url) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    anchor_title TEXT NOT NULL,
+    anchor_content TEXT NOT NULL,
+    anchor_href TEXT NOT NULL,
+    anchor_text_value TEXT NOT NULL,
+    purified_title TEXT NOT NULL,
+    is_valid INTEGER NOT NULL,
+    is_link_available INTEGER NOT NULL,
+    PRIMARY KEY (page_url, anchor_href)
+);
+CREATE INDEX IF NOT EXISTS accessories_anchor_href ON accessories (anchor_href);
+
+CREATE TABLE IF NOT EXISTS archive_members (
+    page_url TEXT NOT NULL,
+    anchor_href TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (page_url, anchor_href, position),
+    FOREIGN KEY (page_url, anchor_href) REFERENCES accessories (page_url, anchor_href) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS archive_members_sha256 ON archive_members (sha256);
+"""
+
+
+def is_catalog_path(file_path: str) -> bool:
+    """
+    根据扩展名判断文件是否为 SQLite 目录。
+    """
+
+    return os.path.splitext(file_path)[1] in CATALOG_EXTENSION_LIST
+
+
+def accessory_to_row(accessory: Accessory) -> tuple:
+    return tuple(getattr(accessory, field) for field in ACCESSORY_FIELD_LIST)
+
+
+def row_to_accessory(row: sqlite3.Row) -> Accessory:
+    """
+    将 accessories 表的一行还原为 `Accessory`，不重新计算 `purified_title` 等字段。
+    """
+
+    accessory = object.__new__(Accessory)
+    for field in ACCESSORY_FIELD_LIST:
+        setattr(accessory, field, row[field])
+    accessory.is_valid = bool(accessory.is_valid)
+    accessory.is_link_available = bool(accessory.is_link_available)
+    accessory.members = ()
+    return accessory
+
+
+def load_catalog_pages(catalog_path: str | None, pickle_path: str) -> list[GuidencePublishPage]:
+    """
+    读取已保存的指导原则发布页，优先读取 SQLite 目录，目录不存在或为空时读取 pickle 文件。
+    """
+
+    guidence_publish_page_list: list[GuidencePublishPage] = []
+    if catalog_path and os.path.exists(catalog_path):
+        with Catalog(catalog_path) as catalog:
+            guidence_publish_page_list = catalog.load_pages()
+    if not guidence_publish_page_list:
+        guidence_publish_page_list = read_pickle_file(pickle_path)
+    return guidence_publish_page_list
+
+
+def save_catalog_pages(
+    guidence_publish_pages: list[GuidencePublishPage], catalog_path: str | None, pickle_path: str
+) -> tuple[ChangeSet, list[GuidencePublishPage]]:
+    """
+    将指导原则发布页合并到 SQLite 目录（目录有变化时导出 pickle 文件），未指定目录时合并到 pickle 文件。
+
+    Returns:
+        tuple[ChangeSet, list[GuidencePublishPage]]: 合并产生的变化，以及合并后的全部发布页。
+    """
+
+    if catalog_path:
+        with Catalog(catalog_path) as catalog:
+            change_set = catalog.upsert_pages(guidence_publish_pages)
+            if change_set:
+                catalog.export_pickle(pickle_path)
+            return change_set, catalog.load_pages()
+    change_set = update_pickle_file(guidence_publish_pages, pickle_path)
+    return change_set, read_pickle_file(pickle_path, keep_candidates=False)
+
+
+class Catalog:
+    """
+    基于 SQLite 的指导原则目录，按发布页 url、发布日期及附件链接建立索引，支持增量更新。
+
+    Args:
+        file_path (str): SQLite 数据库文件路径。
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def __enter__(self) -> Catalog:
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+
+    def _migrate(self) -> None:
+        """
+        为早期版本的目录添加发布页摘要列，摘要在下次写入发布页时计算。
+        """
+
+        columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(pages)")}
+        if "digest" not in columns:
+            self.connection.execute("ALTER TABLE pages ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def _get_members(self, page_url: str | None = None) -> dict[tuple[str, str], tuple[ArchiveMember, ...]]:
+        """
+        读取压缩包附件的成员，按 `(发布页 url, 附件链接)` 分组，`page_url` 为 None 时读取全部发布页。
+        """
+
+        members: dict[tuple[str, str], list[ArchiveMember]] = {}
+        if page_url is None:
+            rows = self.connection.execute("SELECT * FROM archive_members ORDER BY page_url, anchor_href, position")
+        else:
+            rows = self.connection.execute(
+                "SELECT * FROM archive_members WHERE page_url = ? ORDER BY anchor_href, position", (page_url,)
+            )
+        for row in rows:
+            members.setdefault((row["page_url"], row["anchor_href"]), []).append(
+                ArchiveMember(row["name"], row["size"], row["sha256"])
+            )
+        return {key: tuple(value) for key, value in members.items()}
+
+    def get_accessories(self, page_url: str) -> list[Accessory]:
+        rows = self.connection.execute(
+            "SELECT * FROM accessories WHERE page_url = ? ORDER BY position", (page_url,)
+        ).fetchall()
+        members = self._get_members(page_url)
+        accessories = [row_to_accessory(row) for row in rows]
+        for accessory in accessories:
+            accessory.members = members.get((page_url, accessory.anchor_href), ())
+        return accessories
+
+    def get_page(self, url: str) -> GuidencePublishPage | None:
+        row = self.connection.execute("SELECT * FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return GuidencePublishPage(
+            row["title"],
+            row["url"],
+            datetime.date.fromisoformat(row["date"]),
+            self.get_accessories(row["url"]),
+            row["digest"],
+        )
+
+    def load_pages(self) -> list[GuidencePublishPage]:
+        """
+        读取全部指导原则发布页，按发布日期倒序、标题正序排列，日期及标题相同时按添加顺序排列。
+        """
+
+        members = self._get_members()
+        accessories_by_page_url: dict[str, list[Accessory]] = {}
+        for row in self.connection.execute("SELECT * FROM accessories ORDER BY page_url, position"):
+            accessory = row_to_accessory(row)
+            accessory.members = members.get((row["page_url"], row["anchor_href"]), ())
+            accessories_by_page_url.setdefault(row["page_url"], []).append(accessory)
+
+        return [
+            GuidencePublishPage(
+                row["title"],
+                row["url"],
+                datetime.date.fromisoformat(row["date"]),
+                accessories_by_page_url.get(row["url"], []),
+                row["digest"],
+            )
+            for row in self.connection.execute("SELECT * FROM pages ORDER BY date DESC, title, rowid")
+        ]
+
+    def _write_accessories(self, page_url: str, accessories: list[Accessory]) -> None:
+        self.connection.execute(
+            f"DELETE FROM accessories WHERE page_url = ? AND anchor_href NOT IN ({','.join('?' * len(accessories))})",
+            (page_url, *(accessory.anchor_href for accessory in accessories)),
+        )
+        self.connection.executemany(
+            f"""
+            INSERT INTO accessories (page_url, position, {", ".join(ACCESSORY_FIELD_LIST)})
+            VALUES (?, ?, {", ".join("?" * len(ACCESSORY_FIELD_LIST))})
+            ON CONFLICT (page_url, anchor_href) DO UPDATE SET
+                position = excluded.position,
+                {", ".join(f"{field} = excluded.{field}" for field in ACCESSORY_FIELD_LIST)}
+            """,
+            [(page_url, position, *accessory_to_row(accessory)) for position, accessory in enumerate(accessories)],
+        )
+        self.connection.execute("DELETE FROM archive_members WHERE page_url = ?", (page_url,))
+        self.connection.executemany(
+            """
+            INSERT INTO archive_members (page_url, anchor_href, position, name, size, sha256)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (page_url, accessory.anchor_href, position, member.name, member.size, member.sha256)
+                for accessory in accessories
+                for position, member in enumerate(accessory.members)
+            ],
+        )
+
+    def upsert_pages(self, new_data: list[GuidencePublishPage]) -> ChangeSet:
+        """
+        将新获取的指导原则发布页合并到目录中，合并规则与 `update_pickle_file` 一致，只写入发生变化的发布页。
+
+        Args:
+            new_data (list[GuidencePublishPage]): 新获取的指导原则发布页列表。
+        Returns:
+            ChangeSet: 合并产生的变化。
+        """
+
+        change_set = ChangeSet()
+        for new_gpp in new_data:
+            if (old_gpp := self.get_page(new_gpp.url)) is None:
+                new_gpp.digest = get_page_digest(new_gpp)
+                self.connection.execute(
+                    "INSERT INTO pages (url, title, date, digest) VALUES (?, ?, ?, ?)",
+                    (new_gpp.url, new_gpp.title, new_gpp.date.isoformat(), new_gpp.digest),
+                )
+                self._write_accessories(new_gpp.url, new_gpp.accessories)
+                change_set.added_pages.append(new_gpp)
+                change_set.added_accessories.extend((new_gpp.url, acc) for acc in new_gpp.accessories)
+                continue
+
+            old_gpp.accessories, changed = merge_accessories(
+                new_gpp.url, old_gpp.accessories, new_gpp.accessories, change_set
+            )
+            if changed:
+                self._write_accessories(new_gpp.url, old_gpp.accessories)
+                change_set.updated_pages.append(old_gpp)
+            if changed or not old_gpp.digest:
+                old_gpp.digest = get_page_digest(old_gpp)
+                self.connection.execute("UPDATE pages SET digest = ? WHERE url = ?", (old_gpp.digest, old_gpp.url))
+
+        return change_set
+
+    def import_pickle(self, file_path: str) -> None:
+        """
+        从 pickle 文件导入指导原则发布页，已有的发布页按 `upsert_pages` 的规则合并。
+        """
+
+        self.upsert_pages(read_pickle_file(file_path))
+
+    def export_pickle(self, file_path: str) -> None:
+        """
+        将目录导出为与 `update_pickle_file` 格式相同的 pickle 文件，同时补全早期版本的目录中没有摘要的发布页。
+        """
+
+        guidence_publish_page_list = self.load_pages()
+        for gpp in guidence_publish_page_list:
+            if not gpp.digest:
+                gpp.digest = get_page_digest(gpp)
+                self.connection.execute("UPDATE pages SET digest = ? WHERE url = ?", (gpp.digest, gpp.url))
+        with open(file_path, "wb") as f:
+            pickle.dump(guidence_publish_page_list, f)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Import or export the guidence catalog.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a pickle file into a SQLite catalog.")
+    import_parser.add_argument("pickle_path", help="The pickle file to import.")
+    import_parser.add_argument("catalog_path", help="The SQLite catalog to import into.")
+    export_parser = subparsers.add_parser("export", help="Export a SQLite catalog to a pickle file.")
+    export_parser.add_argument("catalog_path", help="The SQLite catalog to export.")
+    export_parser.add_argument("pickle_path", help="The pickle file to export to.")
+    args = parser.parse_args()
+
+    with Catalog(args.catalog_path) as catalog:
+        if args.command == "import":
+            catalog.import_pickle(args.pickle_path)
+            logger.info(f"已将 {args.pickle_path} 导入 {args.catalog_path}，共 {len(catalog)} 个页面")
+        else:
+            catalog.export_pickle(args.pickle_path)
+            logger.info(f"已将 {args.catalog_path} 导出至 {args.pickle_path}")
+
+
+if __name__ == "__main__":
+    main()
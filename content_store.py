@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from metrics import metrics
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 内容索引文件路径
+CONTENT_INDEX_PATH = os.path.join(".download-state", "content-index.json")
+
+# 计算哈希时每次读取的数据块大小
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """
+    计算文件内容的 SHA-256 摘要。
+    """
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentStore:
+    """
+    按内容寻址的附件索引，持久化保存文件路径与 SHA-256 摘要的对应关系，用于 O(1) 查找内容相同的文件。
+
+    内容相同的文件改为指向已有文件的硬链接（不支持硬链接时使用符号链接）。同一目录下内容相同的文件可能是目录中
+    文件名不同的两个附件，同样改为链接而不删除，避免删除目录中仍引用的文件。
+
+    Args:
+        root (str): 附件根目录。
+        index_path (str): 索引文件路径。
+    """
+
+    def __init__(self, root: str = "guidences", index_path: str = CONTENT_INDEX_PATH):
+        self.root = root
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._digests_by_path: dict[str, str] = {}
+        self._paths_by_digest: dict[str, set[str]] = {}
+        self._dirty = False
+
+    def __enter__(self) -> ContentStore:
+        self.load()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.save()
+
+    def _register(self, file_path: str, digest: str) -> None:
+        if (old_digest := self._digests_by_path.get(file_path)) is not None:
+            self._paths_by_digest[old_digest].discard(file_path)
+        self._digests_by_path[file_path] = digest
+        self._paths_by_digest.setdefault(digest, set()).add(file_path)
+        self._dirty = True
+
+    def _unregister(self, file_path: str) -> None:
+        if (digest := self._digests_by_path.pop(file_path, None)) is not None:
+            self._paths_by_digest[digest].discard(file_path)
+            self._dirty = True
+
+    def load(self) -> None:
+        """
+        读取索引文件，索引文件不存在时扫描附件根目录建立索引。
+        """
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for file_path, digest in json.load(f).items():
+                    self._register(os.path.normpath(file_path), digest)
+            self._dirty = False
+        else:
+            logger.info(f"正在为 {self.root} 目录建立内容索引")
+            for dir_path, _, file_names in os.walk(self.root):
+                for file_name in file_names:
+                    file_path = os.path.join(dir_path, file_name)
+                    if not os.path.islink(file_path):
+                        self._register(file_path, hash_file(file_path))
+
+    def save(self) -> None:
+        """
+        索引有变化时写入索引文件。
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            index = {
+                file_path.replace(os.sep, "/"): digest for file_path, digest in sorted(self._digests_by_path.items())
+            }
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=0)
+        os.replace(tmp_path, self.index_path)
+
+    def get_digest(self, file_path: str) -> str | None:
+        return self._digests_by_path.get(os.path.normpath(file_path))
+
+    def find(self, digest: str) -> list[str]:
+        """
+        查找内容为 `digest` 且仍存在的文件。
+        """
+
+        with self._lock:
+            return [file_path for file_path in self._paths_by_digest.get(digest, ()) if os.path.exists(file_path)]
+
+    def add(self, file_path: str, digest: str | None = None) -> str | None:
+        """
+        登记一个文件并处理内容重复的文件。
+
+        Args:
+            file_path (str): 文件路径。
+            digest (str | None): 文件内容的 SHA-256 摘要，为 None 时读取文件计算。
+        Returns:
+            str | None: `file_path` 被链接到的已有文件路径，没有链接时返回 None。
+        """
+
+        file_path = os.path.normpath(file_path)
+        if digest is None:
+            digest = self.get_digest(file_path) or hash_file(file_path)
+
+        with self._lock:
+            duplicate_paths = sorted(
+                path for path in self._paths_by_digest.get(digest, ()) if path != file_path and os.path.exists(path)
+            )
+            for path in list(self._paths_by_digest.get(digest, ())):
+                if path != file_path and not os.path.exists(path):
+                    self._unregister(path)
+
+            linked_path: str | None = None
+            if duplicate_paths:
+                linked_path = duplicate_paths[0]
+                if not os.path.samefile(linked_path, file_path):
+                    self._link(linked_path, file_path)
+                    logger.info(f"重复文件 {file_path} 已链接至 {linked_path}")
+                    metrics.increment("dedup", action="linked")
+
+            self._register(file_path, digest)
+            return linked_path
+
+    @staticmethod
+    def _link(source_path: str, link_path: str) -> None:
+        tmp_path = link_path + ".link"
+        try:
+            os.link(source_path, tmp_path)
+        except OSError:
+            os.symlink(os.path.relpath(source_path, os.path.dirname(link_path)), tmp_path)
+        os.replace(tmp_path, link_path)
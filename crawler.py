@@ -1,19 +1,37 @@
 import argparse
-import concurrent.futures
 import datetime
 import logging
 import os
 import sys
+import time
 
-
+from archives import expand_archives, summarize_results
+from catalog import CATALOG_EXTENSION_LIST, Catalog, is_catalog_path, load_catalog_pages
+from content_store import ContentStore
+from downloader import (
+    DOWNLOAD_STATUS_DOWNLOADED,
+    DOWNLOAD_STATUS_FAILED,
+    DOWNLOAD_STATUS_NOT_MODIFIED,
+    DOWNLOAD_STATUS_SKIPPED,
+)
+from export import EXPORT_DIR, export_catalog
+from metrics import metrics
+from page_cache import PAGE_CACHE_DIR, PageCache
+from pipeline import CrawlPipeline
+from throttle import DEFAULT_MAX_CONCURRENCY, DEFAULT_RATE, configure_throttle
 from utils import (
-    GuidencePublishPage,
-    fetch_page,
-    fetch_accessory,
-    download_accessory,
+    BACKEND_HTTP,
+    BACKEND_LIST,
+    BACKEND_SELENIUM,
+    LISTING_URL,
+    Accessory,
+    DriverPool,
+    discover_max_page,
     update_pickle_file,
     read_pickle_file,
     render_markdown,
+    set_listing_url,
+    set_page_cache,
 )
 
 
@@ -29,31 +47,198 @@ console_handler.setFormatter(formatter)
 
 logger.addHandler(console_handler)
 
-# 要爬取的网页地址
-MAX_PAGE: int = 62
-url_collection: list[str] = ["https://www.cmde.org.cn/flfg/zdyz/index.html"]
-url_collection.extend(list(map(lambda x: f"https://www.cmde.org.cn/flfg/zdyz/index_{x}.html", range(1, MAX_PAGE + 1))))
+
+def parse_page_range(value: str) -> tuple[int, int | None]:
+    """
+    解析 `--pages` 参数，支持 `N`、`A-B` 及 `A-` 三种形式，`A-B` 包含两端的页码，`A-` 表示从第 A 页到最后一页。
+
+    Returns:
+        tuple[int, int | None]: 起始页码及结束页码，结束页码为 None 时到最后一页。
+    """
+
+    try:
+        first, separator, last = value.partition("-")
+        first_page = int(first)
+        last_page = int(last) if last else (None if separator else first_page)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid page range: {value}, it must be like 3, 0-10 or 5-.")
+    if first_page < 0 or (last_page is not None and last_page < first_page):
+        raise argparse.ArgumentTypeError(f"Invalid page range: {value}, it must be like 3, 0-10 or 5-.")
+    return first_page, last_page
+
+
+def load_known_accessories(catalog_path: str | None, pickle_path: str) -> dict[str, list[Accessory]]:
+    """
+    读取已保存的指导原则发布页 url 及其附件，优先读取 SQLite 目录，目录不存在或为空时读取 pickle 文件。
+    """
+
+    return {page.url: page.accessories for page in load_catalog_pages(catalog_path, pickle_path)}
+
+
+# 运行报告文件路径
+METRICS_REPORT_PATH = os.path.join(".cache", "metrics.json")
+
+
+def write_metrics(report_path: str, prometheus_path: str | None) -> None:
+    """
+    输出各阶段耗时摘要，并写入 JSON 运行报告及 Prometheus 文本格式的指标。
+    """
+
+    for line in metrics.summary():
+        logger.info(line)
+    hits = metrics.get_counter("page_cache_requests", result="hit") + metrics.get_counter(
+        "page_cache_requests", result="revalidated"
+    )
+    misses = metrics.get_counter("page_cache_requests", result="miss") + metrics.get_counter(
+        "page_cache_requests", result="changed"
+    )
+    if hits + misses:
+        logger.info(f"页面缓存命中率：{hits / (hits + misses):.1%}")
+
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    metrics.write_report(report_path)
+    logger.info(f"运行报告已写入 {report_path}")
+    if prometheus_path:
+        metrics.write_prometheus(prometheus_path)
 
 
 def main():
     # 命令行参数
     parser = argparse.ArgumentParser(description="Crawl guidance publish pages.")
-    parser.add_argument("--page", type=int, help="The page number to crawl.")
+    page_group = parser.add_mutually_exclusive_group()
+    page_group.add_argument("--page", type=int, help="The page number to crawl.")
+    page_group.add_argument(
+        "--pages",
+        type=parse_page_range,
+        help="The page range to crawl, e.g. 0-10, or 5- to crawl from page 5 to the last page.",
+    )
+    page_group.add_argument("--all", action="store_true", help="Crawl all pages.")
+    parser.add_argument(
+        "--since",
+        type=datetime.date.fromisoformat,
+        help="Only crawl guidences published since this date (YYYY-MM-DD), crawls all pages unless a page is given.",
+    )
+    parser.add_argument(
+        "--max-listing-workers",
+        type=int,
+        default=8,
+        help="The maximum number of listing pages fetched at the same time.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKEND_LIST,
+        default=BACKEND_HTTP,
+        help="The backend used to fetch pages, falls back to selenium if the HTTP backend fails.",
+    )
+    parser.add_argument(
+        "--max-drivers",
+        type=int,
+        default=min(4, os.cpu_count()),
+        help="The maximum number of browsers running at the same time.",
+    )
+    parser.add_argument(
+        "--driver-max-uses",
+        type=int,
+        default=50,
+        help="The number of pages a browser loads before it is restarted.",
+    )
+    parser.add_argument(
+        "--cascade-extraction",
+        action="store_true",
+        help="Query the nine accessory selectors one by one with selenium instead of in a single script call.",
+    )
+    parser.add_argument(
+        "--max-downloads",
+        type=int,
+        default=32,
+        help="The maximum number of concurrent download connections.",
+    )
+    parser.add_argument(
+        "--max-downloads-per-host",
+        type=int,
+        default=8,
+        help="The maximum number of concurrent download connections to a single host.",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=DEFAULT_RATE,
+        help="The maximum number of requests per second sent to a single host.",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="The upper bound of the adaptive number of concurrent requests to a single host.",
+    )
+    parser.add_argument(
+        "--no-page-cache",
+        action="store_true",
+        help=f"Do not use the on-disk page cache in {PAGE_CACHE_DIR}.",
+    )
+    parser.add_argument(
+        "--no-archives",
+        action="store_true",
+        help="Do not expand downloaded .zip/.rar accessories, their recorded members are kept.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="append",
+        default=[],
+        metavar="URL",
+        help="Re-extract the accessories of this publish page even if it is already stored, can be given multiple times.",
+    )
+    parser.add_argument(
+        "--recent-days",
+        type=int,
+        default=7,
+        help="Publish pages released within this many days are always re-extracted.",
+    )
+    parser.add_argument(
+        "--full-refresh",
+        action="store_true",
+        help="Re-extract the accessories of every publish page, including the stored ones.",
+    )
+    parser.add_argument(
+        "--catalog",
+        help="The SQLite catalog (.db, .sqlite or .sqlite3) to update, the pickle file is exported from it on changes.",
+    )
+    parser.add_argument(
+        "--listing-url",
+        default=LISTING_URL,
+        help="The first listing page, e.g. a local replay server started with `python -m replay_server`.",
+    )
+    parser.add_argument(
+        "--metrics-report",
+        default=METRICS_REPORT_PATH,
+        help="The JSON file to write the run report (per-stage timings, counters, slowest URLs) to.",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        help="Also write the metrics in the Prometheus text format to this file, e.g. for the textfile collector.",
+    )
     args = parser.parse_args()
 
-    TARGET_PAGE: int = args.page
-    if 0 <= TARGET_PAGE < MAX_PAGE:
-        target_urls = [url_collection[TARGET_PAGE]]
-    else:
-        logger.error(f"Invalid page number: {TARGET_PAGE}, it must >= 0 and <= {MAX_PAGE}.")
-        sys.exit(1)
+    if args.catalog and not is_catalog_path(args.catalog):
+        parser.error(f"Invalid catalog path: {args.catalog}, it must end with one of {CATALOG_EXTENSION_LIST}.")
+
+    # 提前退出时同样写入运行报告
+    start_time = time.perf_counter()
+    try:
+        crawl(args)
+    finally:
+        metrics.observe("run_seconds", time.perf_counter() - start_time)
+        write_metrics(args.metrics_report, args.prometheus_file)
 
+
+def crawl(args: argparse.Namespace) -> None:
     # 目标日期范围
-    start_date: datetime.date = datetime.date(2007, 1, 1)
+    start_date: datetime.date = args.since or datetime.date(2007, 1, 1)
     end_date: datetime.date = datetime.date(2024, 12, 31)
 
-    # 线程池参数
-    max_workers: int = os.cpu_count() * 10
+    # 每个主机的请求速率及并发数由令牌桶及 AIMD 控制器限制，线程数只需达到并发数上限
+    configure_throttle(rate=args.max_rate, burst=max(1, int(args.max_rate)), max_concurrency=args.max_concurrency)
+    max_workers: int = args.max_concurrency
     timeout: int = 60
 
     # pickle 文件路径
@@ -62,92 +247,124 @@ def main():
     # guidence-list.md 文件路径
     guidence_list_path: str = "guidences-list.md"
 
-    logger.info("启动浏览器...")
-
-    guidence_publish_pages: list[GuidencePublishPage] = []
-
-    # 第一步：获取指导原则页面
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        logger.info("开始获取页面...")
-        futures = {executor.submit(fetch_page, url, start_date, end_date): url for url in target_urls}
-
-        try:
-            for future in futures:
-                url = futures[future]
-                try:
-                    result = future.result(timeout=timeout)
-                    guidence_publish_pages.extend(result)
-                except concurrent.futures.TimeoutError:
-                    logger.error(f"Timeout occurred for fetching pages from {url}.")
-                    future.cancel()
-                except Exception as e:
-                    logger.error(f"Failed to fetch pages from {url}: {e}.")
-                else:
-                    logging.info(f"成功从 {url} 获取页面")
-        except Exception as e:
-            logger.error(f"An error occurred: {e}.")
+    # 页面获取后端
+    backend: str = args.backend
+
+    # 列表页
+    set_listing_url(args.listing_url)
+
+    # 页面缓存
+    if not args.no_page_cache:
+        set_page_cache(PageCache())
+
+    if backend == BACKEND_SELENIUM:
+        logger.info("启动浏览器...")
+
+    # 获取页面、获取附件、下载附件三个阶段共用的 WebDriver 池
+    with DriverPool(size=args.max_drivers, max_uses=args.driver_max_uses) as driver_pool:
+        if args.page is not None:
+            first_page, last_page = args.page, args.page
+        elif args.pages is not None:
+            first_page, last_page = args.pages
+        elif args.all or args.since:
+            first_page, last_page = 0, None
+        else:
+            first_page, last_page = 0, 0
+        if first_page < 0:
+            logger.error(f"Invalid page number: {first_page}, it must >= 0.")
+            sys.exit(1)
+        if last_page is None:
+            # 只有页码范围没有上界时才需要从分页栏获取页数
+            last_page = discover_max_page(backend, driver_pool)
+            logger.info(f"共 {last_page + 1} 个列表页")
+            if first_page > last_page:
+                logger.error(f"Invalid page number: {first_page}, it must <= {last_page}.")
+                sys.exit(1)
+        page_numbers = range(first_page, last_page + 1)
+
+        # 已保存的发布页沿用已保存的附件
+        if args.full_refresh:
+            known_accessories = None
+        else:
+            known_accessories = load_known_accessories(args.catalog, guidence_pickle_path)
+            logger.info(f"已保存 {len(known_accessories)} 个页面的附件信息")
 
+        logger.info("开始获取页面、附件信息并下载附件...")
+        pipeline = CrawlPipeline(
+            backend,
+            driver_pool,
+            max_listing_workers=args.max_listing_workers,
+            max_accessory_workers=max_workers,
+            timeout=timeout,
+            single_pass=not args.cascade_extraction,
+            max_connections=args.max_downloads,
+            max_connections_per_host=args.max_downloads_per_host,
+            known_accessories=known_accessories,
+            recent_date=datetime.date.today() - datetime.timedelta(days=args.recent_days),
+            refresh_urls=set(args.refresh),
+        )
+        pipeline_result = pipeline.run(page_numbers, start_date, end_date)
+
+    guidence_publish_pages = pipeline_result.pages
+    download_results = pipeline_result.download_results
     if not guidence_publish_pages:
         logger.info("没有找到任何页面")
         sys.exit(1)
     else:
         logger.info(f"找到 {len(guidence_publish_pages)} 个页面")
+    if pipeline_result.known_pages:
+        logger.info(f"{len(pipeline_result.known_pages)} 个页面沿用已保存的附件信息")
+    if pipeline_result.failed_pages:
+        logger.error(f"{len(pipeline_result.failed_pages)} 个页面获取附件信息失败")
+        sys.exit(1)
 
-    # 第二步：获取附件
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        logger.info("开始获取附件信息...")
-        futures = {
-            executor.submit(fetch_accessory, guidence_publish_page): guidence_publish_page
-            for guidence_publish_page in guidence_publish_pages
-        }
-
-        try:
-            for future in futures:
-                url = futures[future].url
-                try:
-                    future.result(timeout=timeout)
-                except concurrent.futures.TimeoutError:
-                    logger.error(f"Timeout occurred for fetching accessories from {url}.")
-                    future.cancel()
-                    sys.exit(1)
-                except Exception as e:
-                    logger.error(f"Failed to fetch accessories from {url}: {e}.")
-                    sys.exit(1)
-                else:
-                    logging.info(f"成功从 {url} 获取附件信息")
-        except Exception as e:
-            logger.error(f"An error occurred: {e}.")
-
-    # 第三步：下载附件
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        logger.info("开始下载附件...")
-        futures = {
-            executor.submit(download_accessory, guidence_publish_page, timeout): guidence_publish_page
-            for guidence_publish_page in guidence_publish_pages
-        }
-
-        try:
-            for future in futures:
-                url = futures[future].url
-                try:
-                    future.result(timeout=timeout)
-                except concurrent.futures.TimeoutError:
-                    logger.error(f"Timeout occurred for downloading accessories from {url}.")
-                    future.cancel()
-                except Exception as e:
-                    logger.error(f"Failed to download accessories from {url}: {e}.")
-                else:
-                    logging.info(f"成功从 {url} 下载附件")
-        except Exception as e:
-            logger.error(f"An error occurred: {e}.")
-
-    # 更新 pickle 文件
-    logger.info("更新 pickle 文件...")
-    update_pickle_file(guidence_publish_pages, guidence_pickle_path)
+    for status in (
+        DOWNLOAD_STATUS_DOWNLOADED,
+        DOWNLOAD_STATUS_NOT_MODIFIED,
+        DOWNLOAD_STATUS_SKIPPED,
+        DOWNLOAD_STATUS_FAILED,
+    ):
+        status_results = [result for result in download_results if result.status == status]
+        logger.info(
+            f"{status}: {len(status_results)} 个附件，"
+            f"共 {sum(result.bytes for result in status_results)} 字节，"
+            f"耗时 {sum(result.duration for result in status_results):.2f} 秒"
+        )
+
+    if not args.no_archives:
+        # 展开下载的压缩包，成员记录到附件中
+        logger.info("展开压缩包...")
+        with ContentStore() as content_store:
+            archive_results = expand_archives(guidence_publish_pages, content_store)
+        logger.info(summarize_results(archive_results))
+
+    if args.catalog:
+        # 更新 SQLite 目录，目录有变化时导出 pickle 文件
+        logger.info("更新目录...")
+        with Catalog(args.catalog) as catalog:
+            if not len(catalog) and os.path.exists(guidence_pickle_path):
+                logger.info(f"从 {guidence_pickle_path} 导入目录...")
+                catalog.import_pickle(guidence_pickle_path)
+            change_set = catalog.upsert_pages(guidence_publish_pages)
+            if change_set:
+                logger.info("导出 pickle 文件...")
+                catalog.export_pickle(guidence_pickle_path)
+            guidence_publish_page_list = catalog.load_pages()
+    else:
+        # 更新 pickle 文件
+        logger.info("更新 pickle 文件...")
+        change_set = update_pickle_file(guidence_publish_pages, guidence_pickle_path)
+        guidence_publish_page_list = read_pickle_file(guidence_pickle_path, keep_candidates=False)
+
+    logger.info(change_set.summary())
 
     # 生成 Markdown 文件
     logger.info("生成 Markdown 文件...")
-    render_markdown(read_pickle_file(guidence_pickle_path), guidence_list_path)
+    render_markdown(guidence_publish_page_list, guidence_list_path, change_set)
+
+    # 导出按年份分片的 Markdown 及 JSON 文件
+    logger.info("导出目录...")
+    export_catalog(guidence_publish_page_list, EXPORT_DIR, change_set)
 
     logger.info("完成")
 
@@ -6,26 +6,8 @@ set -e # 在发生错误时退出脚本
 previous_tag=$(git describe --tags --abbrev=0)
 echo "Previous tag: $previous_tag"
 
-# 创建一个临时目录
-temp_dir=$(mktemp -d)
-
-# 在脚本结束时删除临时目录
-trap "rm -rf $temp_dir" EXIT
-
-# 切换到上一个 tag
-git switch --detach $previous_tag
-
-# 复制 guidences.pickle 文件到临时目录
-cp guidences.pickle $temp_dir
-
-# 返回最新的 commit
-git switch -
-
-# 将临时目录中的 guidences.pickle 文件复制到当前目录
-cp $temp_dir/guidences.pickle ./old_guidences.pickle
-
-# 比较差异，生成 diff.md 文件
-python -m diff_tag
+# 直接从上一个 tag 的 git 对象中读取 guidences.pickle，比较差异，生成 diff.md 文件
+python -m diff_tag --old-ref "$previous_tag"
 if [ $? -ne 0 ]; then
     echo "Error while running diff_tag.py."
     exit 1
@@ -1,32 +1,155 @@
+from __future__ import annotations
+
+import argparse
+import logging
 import os
+import pickle
+import subprocess
 import sys
 
-from utils import GuidencePublishPage, read_pickle_file
+from utils import ChangeSet, GuidencePublishPage, get_accessory_key, get_page_digest, read_pickle_file
+
 
+# 获取根日志记录器
+logger = logging.getLogger()
 
 old_pickle_path: str = "old_guidences.pickle"
 new_pickle_path: str = "guidences.pickle"
+diff_markdown_path: str = "diff.md"
+
+
+def read_pickle_from_git(revision: str, file_path: str = new_pickle_path) -> list[GuidencePublishPage]:
+    """
+    从 git 对象中读取 `revision` 版本的 pickle 文件，不切换工作区。
+
+    Args:
+        revision (str): git 版本，如 tag 名称或 commit。
+        file_path (str): pickle 文件在仓库中的路径。
+    Returns:
+        list[GuidencePublishPage]: 指导原则发布页列表，附件不保留候选标题字段。
+    """
+
+    with subprocess.Popen(["git", "show", f"{revision}:{file_path}"], stdout=subprocess.PIPE) as process:
+        try:
+            guidence_publish_page_list: list[GuidencePublishPage] = pickle.load(process.stdout)
+        except EOFError:
+            guidence_publish_page_list = []
+    if process.returncode:
+        raise RuntimeError(f"git show {revision}:{file_path} exited with {process.returncode}.")
+
+    for guidence_publish_page in guidence_publish_page_list:
+        for accessory in guidence_publish_page.accessories:
+            accessory.drop_candidates()
+    return guidence_publish_page_list
+
+
+def diff_pages(old_data: list[GuidencePublishPage], new_data: list[GuidencePublishPage]) -> ChangeSet:
+    """
+    比较新旧两个版本的目录。摘要相同的发布页直接跳过，其余发布页按附件链接逐个比较附件。
+    优先使用合并或保存时计算的摘要，早期版本的 pickle 文件中没有摘要的发布页在比较时计算。
+
+    Args:
+        old_data (list[GuidencePublishPage]): 旧版本的指导原则发布页列表。
+        new_data (list[GuidencePublishPage]): 新版本的指导原则发布页列表。
+    Returns:
+        ChangeSet: 新版本相对旧版本的变化。
+    """
+
+    change_set = ChangeSet()
+    old_gpp_by_url = {gpp.url: gpp for gpp in old_data}
+    new_url_set = {gpp.url for gpp in new_data}
+
+    for new_gpp in new_data:
+        if (old_gpp := old_gpp_by_url.get(new_gpp.url)) is None:
+            change_set.added_pages.append(new_gpp)
+            change_set.added_accessories.extend((new_gpp.url, acc) for acc in new_gpp.accessories)
+            continue
+        if (old_gpp.digest or get_page_digest(old_gpp)) == (new_gpp.digest or get_page_digest(new_gpp)):
+            continue
+
+        change_set.updated_pages.append(new_gpp)
+        old_acc_by_href = {acc.anchor_href: acc for acc in old_gpp.accessories}
+        new_acc_by_href = {acc.anchor_href: acc for acc in new_gpp.accessories}
+        for href, new_acc in new_acc_by_href.items():
+            if (old_acc := old_acc_by_href.get(href)) is None:
+                change_set.added_accessories.append((new_gpp.url, new_acc))
+            elif get_accessory_key(old_acc) != get_accessory_key(new_acc):
+                change_set.updated_accessories.append((new_gpp.url, new_acc))
+        for href, old_acc in old_acc_by_href.items():
+            if href not in new_acc_by_href:
+                change_set.removed_accessories.append((new_gpp.url, old_acc))
+
+    for old_gpp in old_data:
+        if old_gpp.url not in new_url_set:
+            change_set.removed_pages.append(old_gpp)
+            change_set.removed_accessories.extend((old_gpp.url, acc) for acc in old_gpp.accessories)
+
+    return change_set
+
+
+def render_diff_markdown(change_set: ChangeSet, file_path: str = diff_markdown_path) -> None:
+    """
+    将目录的变化渲染为发布说明。
+    """
+
+    accessories_by_page_url: dict[str, list[str]] = {}
+    for label, accessory_list in (
+        ("新增附件", change_set.added_accessories),
+        ("更新附件", change_set.updated_accessories),
+        ("移除附件", change_set.removed_accessories),
+    ):
+        for page_url, accessory in accessory_list:
+            accessories_by_page_url.setdefault(page_url, []).append(
+                f"  - {label}：[{accessory.purified_title}]({accessory.anchor_href})\n"
+            )
+
+    lines: list[str] = []
+    for heading, page_list, with_accessories in (
+        ("# New guidelines\n", change_set.added_pages, False),
+        ("# Updated guidelines\n", change_set.updated_pages, True),
+        ("# Removed guidelines\n", change_set.removed_pages, False),
+    ):
+        if not page_list:
+            continue
+        lines.append(heading)
+        for guidence in page_list:
+            lines.append(f"- [{guidence.title}]({guidence.url})\n")
+            if with_accessories:
+                lines.extend(accessories_by_page_url.get(guidence.url, []))
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("".join(lines))
+
 
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def render_diff_markdown(diff_guidences: list[GuidencePublishPage]):
-    with open("diff.md", "w", encoding="utf-8") as f:
-        f.write("# New guidelines\n")
-        for guidence in diff_guidences:
-            f.write(f"- [{guidence.title}]({guidence.url})\n")
+    parser = argparse.ArgumentParser(description="Render the changes of the guidence catalog since a release.")
+    parser.add_argument(
+        "--old-ref",
+        help=f"The git revision (e.g. the previous tag) to read {new_pickle_path} from, "
+        f"defaults to reading {old_pickle_path}.",
+    )
+    parser.add_argument("--old", default=old_pickle_path, help="The old pickle file, used when --old-ref is not given.")
+    parser.add_argument("--new", default=new_pickle_path, help="The new pickle file.")
+    parser.add_argument("--output", default=diff_markdown_path, help="The Markdown file to write the changes to.")
+    args = parser.parse_args()
 
+    if not os.path.exists(args.new) or (args.old_ref is None and not os.path.exists(args.old)):
+        print("pickle 文件不存在")
+        sys.exit(1)
 
-if os.path.exists(old_pickle_path) and os.path.exists(new_pickle_path):
-    old_guidences: list[GuidencePublishPage] = read_pickle_file(old_pickle_path)
-    new_guidences: list[GuidencePublishPage] = read_pickle_file(new_pickle_path)
+    if args.old_ref is not None:
+        old_guidences = read_pickle_from_git(args.old_ref, new_pickle_path)
+    else:
+        old_guidences = read_pickle_file(args.old, keep_candidates=False)
+    new_guidences = read_pickle_file(args.new, keep_candidates=False)
 
-    old_page_urls = set([guidence.url for guidence in old_guidences])
-    new_page_urls = set([guidence.url for guidence in new_guidences])
+    change_set = diff_pages(old_guidences, new_guidences)
+    logger.info(change_set.summary())
+    if change_set:
+        render_diff_markdown(change_set, args.output)
 
-    diff_urls = new_page_urls - old_page_urls
 
-    if diff_urls:
-        diff_guideces = [guidence for guidence in new_guidences if guidence.url in diff_urls]
-        render_diff_markdown(diff_guideces)
-else:
-    print("pickle 文件不存在")
-    sys.exit(1)
+if __name__ == "__main__":
+    main()
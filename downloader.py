@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import queue
+import time
+
+from typing import BinaryIO
+
+import aiohttp
+
+from content_store import HASH_CHUNK_SIZE, ContentStore
+from metrics import THROUGHPUT_BUCKETS, metrics
+from throttle import get_throttle
+from utils import Accessory, GuidencePublishPage
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 下载状态
+DOWNLOAD_STATUS_DOWNLOADED = "downloaded"
+DOWNLOAD_STATUS_NOT_MODIFIED = "not_modified"
+DOWNLOAD_STATUS_SKIPPED = "skipped"
+DOWNLOAD_STATUS_FAILED = "failed"
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_LIST = [500, 502, 503, 504]
+
+# 下载状态文件目录，目录结构与 guidences 目录一致
+DOWNLOAD_STATE_DIR = ".download-state"
+
+# 未完成下载的临时文件后缀
+PART_FILE_SUFFIX = ".part"
+
+
+@dataclasses.dataclass
+class DownloadResult:
+    url: str
+    save_path: str
+    status: str
+    status_code: int | None = None
+    bytes: int = 0
+    duration: float = 0.0
+    resumed_from: int = 0
+    error: str = ""
+
+
+@dataclasses.dataclass
+class DownloadState:
+    url: str = ""
+    etag: str = ""
+    last_modified: str = ""
+    content_length: int | None = None
+    bytes_written: int = 0
+    sha256: str = ""
+
+
+def get_download_state_path(save_path: str) -> str:
+    """
+    获取附件对应的下载状态文件路径，如 `guidences/2024-11-28/a.docx` 对应 `.download-state/2024-11-28/a.docx.json`。
+    """
+
+    return os.path.join(DOWNLOAD_STATE_DIR, os.path.relpath(save_path, "guidences") + ".json")
+
+
+def read_download_state(state_path: str) -> DownloadState | None:
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            return DownloadState(**json.load(f))
+    else:
+        return None
+
+
+def write_download_state(state_path: str, state: DownloadState) -> None:
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dataclasses.asdict(state), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def update_digest_from_file(digest: hashlib._Hash, file_path: str) -> None:
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+
+def write_chunk(f: BinaryIO, digest: hashlib._Hash, chunk: bytes) -> None:
+    f.write(chunk)
+    digest.update(chunk)
+
+
+def get_save_dir(guidence_publish_page: GuidencePublishPage) -> str:
+    """
+    获取并创建指导原则发布页附件的保存目录。
+    """
+
+    save_dir = os.path.join("guidences", guidence_publish_page.date.strftime("%Y-%m-%d"))
+    os.makedirs(save_dir, exist_ok=True)
+    return save_dir
+
+
+class Downloader:
+    """
+    异步附件下载器。
+
+    所有下载共用一个 `aiohttp.ClientSession`，按主机维护连接池，并限制全局及单个主机的并发连接数。
+    文件写入在线程池中执行，不阻塞事件循环。
+
+    Args:
+        timeout (int): 建立连接及两次读取之间的超时时间（秒）。
+        max_connections (int): 全局并发连接数上限。
+        max_connections_per_host (int): 单个主机的并发连接数上限。
+        retries (int): 连接错误、超时或 `RETRY_STATUS_LIST` 中的状态码的最大重试次数。
+        backoff_factor (float): 重试间隔的退避系数，第 n 次重试前等待 `backoff_factor * 2 ** (n - 1)` 秒。
+        chunk_size (int): 每次写入磁盘的数据块大小（字节）。
+        content_store (ContentStore | None): 内容索引，用于处理内容重复的附件，为 None 时不去重。
+    """
+
+    def __init__(
+        self,
+        timeout: int,
+        max_connections: int = 32,
+        max_connections_per_host: int = 8,
+        retries: int = 5,
+        backoff_factor: float = 1,
+        chunk_size: int = 64 * 1024,
+        content_store: ContentStore | None = None,
+    ):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.chunk_size = chunk_size
+        self.content_store = content_store
+        self.session: aiohttp.ClientSession | None = None
+        # 正在下载的文件路径及其下载结果，同一文件同时只有一个下载
+        self._in_flight: dict[str, asyncio.Future[DownloadResult]] = {}
+
+    async def __aenter__(self) -> Downloader:
+        connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_connections_per_host)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    async def fetch_to_file(self, url: str, part_path: str, state: DownloadState, headers: dict[str, str]) -> int:
+        """
+        下载单个文件，以流的方式写入临时文件。
+
+        响应为 206 时追加写入，为 200 时覆盖写入，并将响应中的校验信息、已写入的字节数及写入完成后文件内容的
+        SHA-256 摘要记录到 `state`。
+
+        Args:
+            url (str): 文件链接。
+            part_path (str): 临时文件路径。
+            state (DownloadState): 下载状态。
+            headers (dict[str, str]): 请求头。
+        Returns:
+            int: HTTP 状态码。
+        """
+
+        async with self.session.get(url, headers=headers) as response:
+            if response.status not in (200, 206):
+                return response.status
+
+            if response.status == 206:
+                mode = "ab"
+                state.bytes_written = os.path.getsize(part_path)
+                # Content-Range: bytes <start>-<end>/<total>
+                total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                state.content_length = int(total) if total.isdigit() else None
+            else:
+                mode = "wb"
+                state.bytes_written = 0
+                state.content_length = response.content_length
+            state.url = url
+            state.etag = response.headers.get("ETag", "")
+            state.last_modified = response.headers.get("Last-Modified", "")
+
+            state.sha256 = ""
+
+            digest = hashlib.sha256()
+            if mode == "ab":
+                await asyncio.to_thread(update_digest_from_file, digest, part_path)
+            f = await asyncio.to_thread(open, part_path, mode)
+            try:
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    await asyncio.to_thread(write_chunk, f, digest, chunk)
+                    state.bytes_written += len(chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            state.sha256 = digest.hexdigest()
+            return response.status
+
+    async def deduplicate(self, save_path: str, state: DownloadState) -> None:
+        """
+        在内容索引中登记附件，处理内容重复的文件，并将文件内容的摘要记录到 `state`。
+        """
+
+        if self.content_store is None:
+            return
+        await asyncio.to_thread(self.content_store.add, save_path, state.sha256 or None)
+        state.sha256 = self.content_store.get_digest(save_path)
+
+    async def probe(self, url: str, state: DownloadState) -> None:
+        """
+        通过 HEAD 请求获取文件的校验信息，用于补全缺少下载状态的已有文件。
+        """
+
+        async with self.session.head(url, allow_redirects=True) as response:
+            if response.status == 200:
+                state.url = url
+                state.etag = response.headers.get("ETag", "")
+                state.last_modified = response.headers.get("Last-Modified", "")
+                state.content_length = response.content_length
+
+    async def download_accessory(self, accessory: Accessory, save_dir: str) -> DownloadResult:
+        """
+        下载单个附件。
+
+        - 多个附件保存为同一文件（如同一发布页中文件名相同的附件）时，后开始的下载等待先开始的下载完成，
+          先开始的下载成功时跳过，失败时再下载；
+        - 已有文件且有下载状态时发送条件请求，未变化（304）则跳过，变化则重新下载；
+        - 已有文件但没有下载状态时，通过 HEAD 请求补全下载状态；
+        - 已有文件小于记录的 Content-Length，或存在未完成的临时文件时，通过 Range 请求续传；
+        - 下载先写入 `.part` 临时文件，完整后原子地重命名为目标文件；
+        - 连接错误、超时及服务端错误时按指数退避重试，重试时从已写入的位置续传。
+
+        Args:
+            accessory (Accessory): 附件。
+            save_dir (str): 保存目录。
+        Returns:
+            DownloadResult: 下载结果。
+        """
+
+        save_path = os.path.join(save_dir, accessory.purified_title)
+        key = os.path.normpath(save_path)
+        while (in_flight := self._in_flight.get(key)) is not None:
+            if not (await in_flight).error:
+                logger.info(f"File {save_path} is downloaded from another link, skipping {accessory.anchor_href}.")
+                metrics.increment("downloads", status=DOWNLOAD_STATUS_SKIPPED)
+                return DownloadResult(url=accessory.anchor_href, save_path=save_path, status=DOWNLOAD_STATUS_SKIPPED)
+
+        future: asyncio.Future[DownloadResult] = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await self._download_accessory(accessory, save_path)
+            future.set_result(result)
+            return result
+        finally:
+            if not future.done():
+                future.set_result(
+                    DownloadResult(
+                        url=accessory.anchor_href, save_path=save_path, status=DOWNLOAD_STATUS_FAILED, error="aborted"
+                    )
+                )
+            del self._in_flight[key]
+
+    async def _download_accessory(self, accessory: Accessory, save_path: str) -> DownloadResult:
+        url = accessory.anchor_href
+        part_path = save_path + PART_FILE_SUFFIX
+        state_path = get_download_state_path(save_path)
+        result = DownloadResult(url=url, save_path=save_path, status=DOWNLOAD_STATUS_FAILED)
+
+        state = read_download_state(state_path)
+        if state is not None and state.url != url:
+            state = None
+        original_state = dataclasses.replace(state) if state is not None else None
+
+        probed = False
+        if os.path.exists(save_path):
+            if state is None:
+                probed = True
+                state = DownloadState()
+                try:
+                    async with get_throttle(url).request_async():
+                        await self.probe(url, state)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Failed to probe {url}: {e!r}.")
+                state.bytes_written = os.path.getsize(save_path)
+
+            if state.content_length is not None and os.path.getsize(save_path) < state.content_length:
+                logger.info(f"File {save_path} is truncated, resuming.")
+                os.replace(save_path, part_path)
+            elif probed or (not state.etag and not state.last_modified):
+                # 刚通过 HEAD 请求确认完整，或服务器不提供校验信息时，沿用已有文件
+                logger.info(f"File {save_path} already exists.")
+                await self.deduplicate(save_path, state)
+                if state.url and state != original_state:
+                    write_download_state(state_path, state)
+                result.status = DOWNLOAD_STATUS_SKIPPED
+                metrics.increment("downloads", status=result.status)
+                return result
+        elif state is None:
+            state = DownloadState()
+
+        logger.info(f"正在从 {url} 下载附件并保存至 {save_path}")
+        start_time = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                metrics.increment("download_retries")
+                await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+
+            result.error = ""
+            headers: dict[str, str] = {}
+            if os.path.exists(part_path):
+                result.resumed_from = os.path.getsize(part_path)
+                headers["Range"] = f"bytes={result.resumed_from}-"
+                if validator := state.etag or state.last_modified:
+                    headers["If-Range"] = validator
+            elif os.path.exists(save_path):
+                if state.etag:
+                    headers["If-None-Match"] = state.etag
+                if state.last_modified:
+                    headers["If-Modified-Since"] = state.last_modified
+
+            try:
+                async with get_throttle(url).request_async() as ticket:
+                    result.status_code = await self.fetch_to_file(url, part_path, state, headers)
+                    ticket.record_status(result.status_code)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics.increment("download_timeouts")
+                result.error = repr(e)
+                continue
+            if result.status_code == 200:
+                # 服务器忽略了 Range 请求，从头下载
+                result.resumed_from = 0
+            if result.status_code == 416 and state.content_length == state.bytes_written:
+                # 临时文件已完整
+                result.status_code = 206
+            if result.status_code not in RETRY_STATUS_LIST:
+                if result.status_code in (200, 206) and state.content_length not in (None, state.bytes_written):
+                    result.error = f"incomplete content: {state.bytes_written}/{state.content_length} bytes"
+                    continue
+                break
+        result.duration = time.perf_counter() - start_time
+        result.bytes = state.bytes_written - result.resumed_from
+
+        if result.status_code == 304:
+            result.status = DOWNLOAD_STATUS_NOT_MODIFIED
+            result.bytes = 0
+            logger.info(f"File {save_path} is not modified.")
+            await self.deduplicate(save_path, state)
+        elif result.status_code in (200, 206) and not result.error:
+            os.replace(part_path, save_path)
+            result.status = DOWNLOAD_STATUS_DOWNLOADED
+            await self.deduplicate(save_path, state)
+        elif result.status_code is not None and not result.error:
+            result.error = f"status code: {result.status_code}"
+            logger.error(f"Failed to download {url}, status code: {result.status_code}.")
+        else:
+            logger.error(f"Failed to download {url}: {result.error}.")
+
+        if state.url and state != original_state:
+            write_download_state(state_path, state)
+
+        metrics.increment("downloads", status=result.status)
+        metrics.increment("download_bytes", result.bytes)
+        metrics.observe("download_seconds", result.duration, status=result.status)
+        metrics.record_url("download", url, result.duration)
+        if result.bytes and result.duration:
+            metrics.observe("download_bytes_per_second", result.bytes / result.duration, buckets=THROUGHPUT_BUCKETS)
+
+        return result
+
+
+async def download_from_queue(
+    accessory_queue: queue.Queue[tuple[Accessory, str] | None],
+    timeout: int,
+    max_connections: int = 32,
+    max_connections_per_host: int = 8,
+) -> list[DownloadResult]:
+    """
+    从队列中逐个取出 `(附件, 保存目录)` 并立即开始下载，取到 None 时等待已开始的下载完成后返回。
+
+    同时进行的下载不超过 `max_connections` 的两倍，下载跟不上时不再从队列中取出附件，由队列向上游施加背压。
+
+    Args:
+        accessory_queue (queue.Queue[tuple[Accessory, str] | None]): 待下载附件的队列，以 None 结束。
+        timeout (int): 建立连接及两次读取之间的超时时间（秒）。
+        max_connections (int): 全局并发连接数上限。
+        max_connections_per_host (int): 单个主机的并发连接数上限。
+    Returns:
+        list[DownloadResult]: 按完成顺序排列的下载结果。
+    """
+
+    results: list[DownloadResult] = []
+    semaphore = asyncio.Semaphore(max_connections * 2)
+
+    with ContentStore() as content_store:
+        async with Downloader(
+            timeout, max_connections, max_connections_per_host, content_store=content_store
+        ) as downloader:
+
+            async def download(accessory: Accessory, save_dir: str) -> None:
+                try:
+                    results.append(await downloader.download_accessory(accessory, save_dir))
+                except Exception as e:
+                    logger.error(f"Failed to download {accessory.anchor_href}: {e}.")
+                    save_path = os.path.join(save_dir, accessory.purified_title)
+                    results.append(
+                        DownloadResult(accessory.anchor_href, save_path, DOWNLOAD_STATUS_FAILED, error=str(e))
+                    )
+                finally:
+                    semaphore.release()
+
+            tasks: set[asyncio.Task] = set()
+            while (item := await asyncio.to_thread(accessory_queue.get)) is not None:
+                await semaphore.acquire()
+                task = asyncio.create_task(download(*item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+    return results
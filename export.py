@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+
+from catalog import load_catalog_pages
+from utils import MARKDOWN_HEADER, Accessory, ChangeSet, GuidencePublishPage, render_markdown_rows
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 导出目录
+EXPORT_DIR = "exports"
+
+# 全部发布页的 NDJSON 文件名，每行一个发布页
+NDJSON_FILE_NAME = "guidences.ndjson"
+
+# 索引文件名
+INDEX_MARKDOWN_FILE_NAME = "README.md"
+INDEX_JSON_FILE_NAME = "index.json"
+
+# 按年份分片的文件名，如 2024.md、2024.json
+SHARD_FILE_PATTERN = re.compile(r"^(\d{4})\.(md|json)$")
+
+
+def accessory_to_dict(accessory: Accessory, save_dir: str) -> dict:
+    return {
+        "title": accessory.purified_title,
+        "href": accessory.anchor_href,
+        "path": f"{save_dir}/{accessory.purified_title}",
+        "is_valid": accessory.is_valid,
+        "is_link_available": accessory.is_link_available,
+        "members": [
+            {"name": member.name, "size": member.size, "sha256": member.sha256} for member in accessory.members
+        ],
+    }
+
+
+def page_to_dict(page: GuidencePublishPage) -> dict:
+    """
+    将发布页转换为可以 JSON 序列化的字典，附件的 `path` 为下载后相对于仓库根目录的路径。
+    """
+
+    save_dir = f"guidences/{page.date.isoformat()}"
+    return {
+        "title": page.title,
+        "url": page.url,
+        "date": page.date.isoformat(),
+        "accessories": [accessory_to_dict(accessory, save_dir) for accessory in page.accessories],
+    }
+
+
+def write_if_changed(file_path: str, content: str) -> bool:
+    """
+    内容与已有文件不同时写入文件，避免产生多余的 git diff。
+    """
+
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, file_path)
+    return True
+
+
+def render_year_markdown(year: int, pages: list[GuidencePublishPage]) -> str:
+    """
+    渲染单个年份的 Markdown 分片，表格格式与 `guidences-list.md` 相同，`pages` 需已按日期倒序、标题正序排序。
+    """
+
+    date_groups: dict[datetime.date, list[GuidencePublishPage]] = {}
+    for page in pages:
+        date_groups.setdefault(page.date, []).append(page)
+    rows = [row for date_pages in date_groups.values() for row in render_markdown_rows(date_pages, "../guidences")]
+    header = MARKDOWN_HEADER.replace("# List of Guidences", f"# List of Guidences ({year})", 1)
+    return header + "".join(rows)
+
+
+def render_index(pages_by_year: dict[int, list[GuidencePublishPage]]) -> tuple[str, str]:
+    """
+    渲染索引：各年份的发布页及附件数量，以及对应分片的链接。返回 Markdown 及 JSON 索引的内容。
+    """
+
+    years = [
+        {
+            "year": year,
+            "pages": len(pages),
+            "accessories": sum(accessory.is_valid for page in pages for accessory in page.accessories),
+            "markdown": f"{year}.md",
+            "json": f"{year}.json",
+        }
+        for year, pages in sorted(pages_by_year.items(), reverse=True)
+    ]
+
+    markdown = "# List of Guidences\n\n"
+    markdown += f"全部发布页：[{NDJSON_FILE_NAME}]({NDJSON_FILE_NAME})\n\n"
+    markdown += "| 年份 | 发布页 | 附件 | 数据 |\n| ---- | ------ | ---- | ---- |\n"
+    for item in years:
+        markdown += (
+            f"| [{item['year']}]({item['markdown']}) | {item['pages']} | {item['accessories']} "
+            f"| [JSON]({item['json']}) |\n"
+        )
+
+    index = {
+        "pages": sum(item["pages"] for item in years),
+        "accessories": sum(item["accessories"] for item in years),
+        "ndjson": NDJSON_FILE_NAME,
+        "years": years,
+    }
+    return markdown, json.dumps(index, ensure_ascii=False, indent=2) + "\n"
+
+
+def export_catalog(
+    guidence_publish_page_list: list[GuidencePublishPage],
+    export_dir: str = EXPORT_DIR,
+    change_set: ChangeSet | None = None,
+) -> list[str]:
+    """
+    导出目录：每个年份一个 Markdown 分片及 JSON 分片，全部发布页的 NDJSON 文件，以及 Markdown 及 JSON 索引。
+
+    传入 `change_set` 且已有导出文件时，只重新生成发生变化的年份的分片；其余情况重新生成全部分片。
+    NDJSON 文件及索引每次重新生成，所有文件内容无变化时均不写入。
+
+    Args:
+        guidence_publish_page_list (list[GuidencePublishPage]): 全部指导原则发布页。
+        export_dir (str): 导出目录。
+        change_set (ChangeSet | None): 合并新数据时产生的变化。
+    Returns:
+        list[str]: 写入或删除的文件路径。
+    """
+
+    pages = sorted(guidence_publish_page_list, key=lambda x: (-x.date.toordinal(), x.title))
+    pages_by_year: dict[int, list[GuidencePublishPage]] = {}
+    for page in pages:
+        pages_by_year.setdefault(page.date.year, []).append(page)
+
+    index_path = os.path.join(export_dir, INDEX_JSON_FILE_NAME)
+    if change_set is not None and os.path.exists(index_path):
+        changed_years = {date.year for date in change_set.changed_dates}
+    else:
+        changed_years = set(pages_by_year)
+    os.makedirs(export_dir, exist_ok=True)
+
+    changed_files: list[str] = []
+    for year in sorted(changed_years & pages_by_year.keys(), reverse=True):
+        year_pages = pages_by_year[year]
+        markdown_path = os.path.join(export_dir, f"{year}.md")
+        if write_if_changed(markdown_path, render_year_markdown(year, year_pages)):
+            changed_files.append(markdown_path)
+        json_path = os.path.join(export_dir, f"{year}.json")
+        year_json = json.dumps([page_to_dict(page) for page in year_pages], ensure_ascii=False, indent=2) + "\n"
+        if write_if_changed(json_path, year_json):
+            changed_files.append(json_path)
+
+    # 删除已没有发布页的年份的分片
+    for file_name in os.listdir(export_dir):
+        if (match := SHARD_FILE_PATTERN.match(file_name)) and int(match.group(1)) not in pages_by_year:
+            os.remove(os.path.join(export_dir, file_name))
+            changed_files.append(os.path.join(export_dir, file_name))
+
+    ndjson_path = os.path.join(export_dir, NDJSON_FILE_NAME)
+    ndjson = "".join(json.dumps(page_to_dict(page), ensure_ascii=False) + "\n" for page in pages)
+    if write_if_changed(ndjson_path, ndjson):
+        changed_files.append(ndjson_path)
+
+    index_markdown, index_json = render_index(pages_by_year)
+    index_markdown_path = os.path.join(export_dir, INDEX_MARKDOWN_FILE_NAME)
+    if write_if_changed(index_markdown_path, index_markdown):
+        changed_files.append(index_markdown_path)
+    if write_if_changed(index_path, index_json):
+        changed_files.append(index_path)
+
+    return changed_files
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Export the catalog as per-year Markdown and JSON shards.")
+    parser.add_argument("--catalog", help="The SQLite catalog to export, the pickle file is exported otherwise.")
+    parser.add_argument("--pickle", default="guidences.pickle", help="The pickle file of the catalog.")
+    parser.add_argument("--output", default=EXPORT_DIR, help="The directory to write the exports to.")
+    args = parser.parse_args()
+
+    changed_files = export_catalog(load_catalog_pages(args.catalog, args.pickle), args.output)
+    logger.info(f"已更新 {len(changed_files)} 个文件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import bisect
+import contextlib
+import datetime
+import heapq
+import json
+import math
+import threading
+import time
+
+from collections.abc import Iterator
+
+
+# 耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, math.inf)
+
+# 下载速度直方图的桶上界（字节/秒）
+THROUGHPUT_BUCKETS = (1e4, 1e5, 1e6, 1e7, 1e8, math.inf)
+
+# 每个阶段在报告中保留的最慢 url 数量
+SLOWEST_URL_COUNT = 10
+
+# 指标名称前缀
+METRIC_PREFIX = "guidences_crawler_"
+
+
+class Histogram:
+    """
+    线程安全的累积直方图，记录样本数、总和、最小值、最大值及落入各个桶的样本数。
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "min": self.min if self.count else 0.0,
+                "max": self.max if self.count else 0.0,
+                "buckets": {
+                    ("+Inf" if math.isinf(bound) else str(bound)): count
+                    for bound, count in zip(self.buckets, self.bucket_counts)
+                },
+            }
+
+
+def format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    return ",".join(f"{key}={value}" for key, value in labels)
+
+
+class MetricsRegistry:
+    """
+    一次运行的指标：计数器、直方图及各阶段最慢的 url。
+
+    计数器及直方图以 `(名称, 标签)` 区分，标签为字符串键值对。
+    """
+
+    def __init__(self):
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._lock = threading.Lock()
+        self._counters: dict[tuple[str, tuple[tuple[str, str], ...]], float] = {}
+        self._histograms: dict[tuple[str, tuple[tuple[str, str], ...]], Histogram] = {}
+        self._slowest_urls: dict[str, list[tuple[float, str]]] = {}
+
+    def increment(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, buckets: tuple[float, ...] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if (histogram := self._histograms.get(key)) is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def record_url(self, stage: str, url: str, seconds: float) -> None:
+        """
+        记录 url 在某个阶段的耗时，每个阶段只保留最慢的 `SLOWEST_URL_COUNT` 个。
+        """
+
+        with self._lock:
+            slowest = self._slowest_urls.setdefault(stage, [])
+            if len(slowest) < SLOWEST_URL_COUNT:
+                heapq.heappush(slowest, (seconds, url))
+            else:
+                heapq.heappushpop(slowest, (seconds, url))
+
+    @contextlib.contextmanager
+    def timer(self, name: str, url: str | None = None, **labels: str) -> Iterator[None]:
+        """
+        记录代码块的耗时，传入 `url` 时同时记录该 url 在 `labels["stage"]`（没有时为 `name`）阶段的耗时。
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start_time
+            self.observe(name, seconds, **labels)
+            if url is not None:
+                self.record_url(labels.get("stage", name), url, seconds)
+
+    def get_counter(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def to_dict(self) -> dict:
+        """
+        生成 JSON 格式的运行报告。
+        """
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            slowest_urls = {stage: sorted(slowest, reverse=True) for stage, slowest in self._slowest_urls.items()}
+
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+            "histograms": [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(histograms.items())
+            ],
+            "slowest_urls": {
+                stage: [{"url": url, "seconds": seconds} for seconds, url in slowest]
+                for stage, slowest in slowest_urls.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        生成 Prometheus 文本格式（textfile collector）的指标。
+        """
+
+        report = self.to_dict()
+        lines: list[str] = []
+
+        def format_prometheus_labels(labels: dict[str, str], **extra: str) -> str:
+            labels = {**labels, **extra}
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+        typed_names: set[str] = set()
+        for counter in report["counters"]:
+            name = METRIC_PREFIX + counter["name"] + "_total"
+            if name not in typed_names:
+                lines.append(f"# TYPE {name} counter")
+                typed_names.add(name)
+            lines.append(f"{name}{format_prometheus_labels(counter['labels'])} {counter['value']}")
+
+        for histogram in report["histograms"]:
+            name = METRIC_PREFIX + histogram["name"]
+            if name not in typed_names:
+                lines.append(f"# TYPE {name} histogram")
+                typed_names.add(name)
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f"{name}_bucket{format_prometheus_labels(histogram['labels'], le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{format_prometheus_labels(histogram['labels'])} {histogram['sum']}")
+            lines.append(f"{name}_count{format_prometheus_labels(histogram['labels'])} {histogram['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, file_path: str) -> None:
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, file_path: str) -> None:
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+    def summary(self) -> list[str]:
+        """
+        各阶段耗时的摘要，用于日志输出。
+        """
+
+        lines: list[str] = []
+        for histogram in self.to_dict()["histograms"]:
+            if histogram["name"].endswith("_seconds"):
+                labels = format_labels(tuple(histogram["labels"].items()))
+                lines.append(
+                    f"{histogram['name']}{{{labels}}}: {histogram['count']} 次，共 {histogram['sum']:.2f} 秒，"
+                    f"平均 {histogram['mean']:.3f} 秒，最长 {histogram['max']:.3f} 秒"
+                )
+        return lines
+
+
+# 本次运行共用的指标
+metrics = MetricsRegistry()
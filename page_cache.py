@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import collections
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+
+from metrics import metrics
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 页面缓存目录
+PAGE_CACHE_DIR = os.path.join(".cache", "pages")
+
+# 列表页（index.html、index_N.html）的缓存有效期（秒），列表页随新发布的指导原则变化
+LISTING_PAGE_TTL = 60 * 60
+
+# 指导原则发布页的缓存有效期（秒），发布页发布后几乎不再变化
+PUBLISH_PAGE_TTL = 30 * 24 * 60 * 60
+
+# 缓存总大小上限（字节），超出时按最近使用时间淘汰
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+LISTING_PAGE_PATTERN = re.compile(r"/index(_\d+)?\.html$")
+
+
+def get_page_ttl(url: str) -> int:
+    """
+    根据 url 类型获取缓存有效期：列表页较短，发布页较长。
+    """
+
+    if LISTING_PAGE_PATTERN.search(url):
+        return LISTING_PAGE_TTL
+    return PUBLISH_PAGE_TTL
+
+
+@dataclasses.dataclass
+class PageCacheEntry:
+    url: str
+    fetched_at: float = 0.0
+    etag: str = ""
+    last_modified: str = ""
+
+
+class PageCache:
+    """
+    按 url 缓存页面 HTML 的磁盘缓存。
+
+    - 缓存未过期时直接返回，不发送请求；
+    - 缓存过期时携带 ETag、Last-Modified 发送条件请求，未变化（304）时沿用缓存并刷新有效期；
+    - 缓存总大小超过 `max_bytes` 时，按最近使用时间淘汰最久未使用的页面。
+
+    每个页面保存为 `<url 的 SHA-256>.html` 及同名的 `.json` 元数据文件，文件的修改时间用作最近使用时间。
+    创建时扫描一次缓存目录，之后在内存中维护各页面的大小、使用顺序及总大小，写入页面时无需再扫描目录。
+
+    Args:
+        root (str): 缓存目录。
+        max_bytes (int): 缓存总大小上限（字节）。
+    """
+
+    def __init__(self, root: str = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 页面文件路径 -> 大小，按最近使用时间从旧到新排列
+        self._body_sizes: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        body_list: list[tuple[float, int, str]] = []
+        with os.scandir(self.root) as entries:
+            for dir_entry in entries:
+                if dir_entry.name.endswith(".html"):
+                    stat = dir_entry.stat()
+                    body_list.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        for _, size, body_path in sorted(body_list):
+            self._body_sizes[body_path] = size
+            self._total_bytes += size
+
+    def _get_paths(self, url: str) -> tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{key}.html"), os.path.join(self.root, f"{key}.json")
+
+    def _read(self, url: str) -> tuple[PageCacheEntry, bytes] | None:
+        body_path, entry_path = self._get_paths(url)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = PageCacheEntry(**json.load(f))
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError, TypeError):
+            return None
+        if entry.url != url:
+            return None
+        # 刷新最近使用时间
+        os.utime(body_path)
+        with self._lock:
+            if body_path in self._body_sizes:
+                self._body_sizes.move_to_end(body_path)
+        return entry, body
+
+    def _write(self, entry: PageCacheEntry, body: bytes) -> None:
+        body_path, entry_path = self._get_paths(entry.url)
+        for path, data in ((body_path, body), (entry_path, json.dumps(dataclasses.asdict(entry)).encode("utf-8"))):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += len(body) - self._body_sizes.pop(body_path, 0)
+            self._body_sizes[body_path] = len(body)
+            self._evict()
+
+    def _evict(self) -> None:
+        """
+        缓存总大小超过上限时，淘汰最久未使用的页面，需在持有锁时调用。
+        """
+
+        while self._total_bytes > self.max_bytes and self._body_sizes:
+            body_path, size = self._body_sizes.popitem(last=False)
+            for path in (body_path, os.path.splitext(body_path)[0] + ".json"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._total_bytes -= size
+
+    def peek(self, url: str) -> bytes | None:
+        """
+        获取未过期的缓存页面，没有缓存或缓存已过期时返回 None，不发送请求。
+        """
+
+        if (cached := self._read(url)) is None:
+            return None
+        entry, body = cached
+        if time.time() - entry.fetched_at >= get_page_ttl(url):
+            return None
+        return body
+
+    def get(self, url: str, session: requests.Session, timeout: int = 30, revalidate: bool = False) -> bytes:
+        """
+        获取页面 HTML，优先使用缓存，缓存过期时向服务器验证。
+
+        Args:
+            url (str): 页面 url。
+            session (requests.Session): 用于请求的 session。
+            timeout (int): 请求超时时间（秒）。
+            revalidate (bool): 是否忽略有效期，总是携带 ETag、Last-Modified 向服务器验证缓存。
+        Returns:
+            bytes: 页面 HTML。
+        """
+
+        cached = self._read(url)
+        if cached is not None:
+            entry, body = cached
+            if not revalidate and time.time() - entry.fetched_at < get_page_ttl(url):
+                metrics.increment("page_cache_requests", result="hit")
+                return body
+            headers = {}
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        else:
+            headers = {}
+
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached is not None:
+            entry.fetched_at = time.time()
+            self._write(entry, body)
+            metrics.increment("page_cache_requests", result="revalidated")
+            return body
+        response.raise_for_status()
+        metrics.increment("page_cache_requests", result="miss" if cached is None else "changed")
+
+        entry = PageCacheEntry(
+            url=url,
+            fetched_at=time.time(),
+            etag=response.headers.get("ETag", ""),
+            last_modified=response.headers.get("Last-Modified", ""),
+        )
+        self._write(entry, response.content)
+        return response.content
@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import copy
+import dataclasses
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+from collections.abc import Iterator
+
+from downloader import DownloadResult, download_from_queue, get_save_dir
+from metrics import metrics
+from utils import Accessory, DriverPool, GuidencePublishPage, fetch_accessory, fetch_page, get_listing_url
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 各阶段之间队列的容量
+QUEUE_SIZE = 64
+
+
+def iter_listing_pages(
+    page_numbers: range,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    backend: str,
+    driver_pool: DriverPool,
+    max_workers: int,
+    timeout: int,
+    stop_event: threading.Event | None = None,
+) -> Iterator[tuple[int, list[GuidencePublishPage]]]:
+    """
+    按页码顺序并发获取列表页，同时进行的请求不超过 `max_workers` 个，按完成顺序产出 `(页码, 指导原则发布页列表)`。
+
+    列表页按发布日期倒序排列，某一页最早的发布日期早于 `start_date` 时，不再请求之后的页面。
+    `stop_event` 被设置时不再发起新的请求。
+    """
+
+    page_number_iter = iter(page_numbers)
+    stop_page_number: int | None = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures: dict[concurrent.futures.Future, int] = {}
+
+        def submit_next() -> bool:
+            if stop_event is not None and stop_event.is_set():
+                return False
+            page_number = next(page_number_iter, None)
+            if page_number is None or (stop_page_number is not None and page_number > stop_page_number):
+                return False
+            url = get_listing_url(page_number)
+            futures[executor.submit(fetch_page, url, start_date, end_date, backend, driver_pool)] = page_number
+            return True
+
+        while len(futures) < max_workers and submit_next():
+            pass
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                for future, page_number in futures.items():
+                    logger.error(f"Timeout occurred for fetching pages from {get_listing_url(page_number)}.")
+                    future.cancel()
+                break
+
+            for future in done:
+                page_number = futures.pop(future)
+                url = get_listing_url(page_number)
+                try:
+                    pages, oldest_date = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to fetch pages from {url}: {e}.")
+                    continue
+                logger.info(f"成功从 {url} 获取页面")
+
+                # 已到达目标起始日期之前的页面，取消之后页面的请求
+                if oldest_date is not None and oldest_date < start_date:
+                    if stop_page_number is None or page_number < stop_page_number:
+                        stop_page_number = page_number
+                        logger.info(f"页面 {url} 已早于 {start_date}，不再获取之后的页面")
+                        for pending_future, pending_page_number in futures.items():
+                            if pending_page_number > stop_page_number:
+                                pending_future.cancel()
+
+                yield page_number, pages
+
+            while len(futures) < max_workers and submit_next():
+                pass
+            futures = {future: page_number for future, page_number in futures.items() if not future.cancelled()}
+
+
+@dataclasses.dataclass
+class PipelineResult:
+    # 按页码顺序排列的指导原则发布页
+    pages: list[GuidencePublishPage]
+    # 获取附件信息失败的指导原则发布页
+    failed_pages: list[GuidencePublishPage]
+    # 沿用已保存附件、未重新获取附件信息的指导原则发布页
+    known_pages: list[GuidencePublishPage]
+    # 按完成顺序排列的下载结果
+    download_results: list[DownloadResult]
+
+
+class CrawlPipeline:
+    """
+    获取列表页、获取附件信息、下载附件三个阶段重叠执行的流水线。
+
+    每个列表页获取完成后，其中的指导原则发布页立即进入附件信息队列；每个发布页的附件信息获取完成后，
+    其中的有效附件立即进入下载队列。阶段之间使用容量为 `QUEUE_SIZE` 的队列，下游处理不过来时上游阻塞等待。
+    任一发布页的附件信息获取失败时，不再获取新的列表页及附件信息，已开始的下载继续完成。
+
+    传入 `known_accessories` 时，已保存的发布页直接沿用已保存的附件，只下载本地缺失的附件；
+    新的发布页、发布日期不早于 `recent_date` 的发布页及 `refresh_urls` 中的发布页仍重新获取附件信息。
+    发布日期不早于 `recent_date` 的发布页及 `refresh_urls` 中的发布页不使用未过期的页面缓存，总是向服务器验证。
+
+    Args:
+        backend (str): 页面获取后端。
+        driver_pool (DriverPool): 共用的 WebDriver 池。
+        max_listing_workers (int): 同时获取的列表页数量上限。
+        max_accessory_workers (int): 同时获取附件信息的发布页数量上限。
+        timeout (int): 单个列表页的超时时间，以及下载时建立连接及两次读取之间的超时时间（秒）。
+        single_pass (bool): 使用 selenium 时是否通过单次脚本调用提取附件。
+        max_connections (int): 下载的全局并发连接数上限。
+        max_connections_per_host (int): 下载的单个主机并发连接数上限。
+        known_accessories (dict[str, list[Accessory]] | None): 已保存的发布页 url 及其附件，为 None 时全部重新获取。
+        recent_date (datetime.date | None): 发布日期不早于该日期的发布页总是重新获取附件信息。
+        refresh_urls (set[str] | None): 总是重新获取附件信息的发布页 url。
+    """
+
+    def __init__(
+        self,
+        backend: str,
+        driver_pool: DriverPool,
+        max_listing_workers: int,
+        max_accessory_workers: int,
+        timeout: int,
+        single_pass: bool = True,
+        max_connections: int = 32,
+        max_connections_per_host: int = 8,
+        known_accessories: dict[str, list[Accessory]] | None = None,
+        recent_date: datetime.date | None = None,
+        refresh_urls: set[str] | None = None,
+    ):
+        self.backend = backend
+        self.driver_pool = driver_pool
+        self.max_listing_workers = max_listing_workers
+        self.max_accessory_workers = max_accessory_workers
+        self.timeout = timeout
+        self.single_pass = single_pass
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.known_accessories = known_accessories
+        self.recent_date = recent_date
+        self.refresh_urls = refresh_urls or set()
+
+        self.page_queue: queue.Queue[GuidencePublishPage | None] = queue.Queue(maxsize=QUEUE_SIZE)
+        self.accessory_queue: queue.Queue[tuple[Accessory, str] | None] = queue.Queue(maxsize=QUEUE_SIZE)
+        self.stop_event = threading.Event()
+
+        self._lock = threading.Lock()
+        self._pages_by_page_number: dict[int, list[GuidencePublishPage]] = {}
+        self._failed_pages: list[GuidencePublishPage] = []
+        self._known_pages: list[GuidencePublishPage] = []
+        self._download_results: list[DownloadResult] = []
+        self._extractors: list[threading.Thread] = []
+
+    def _produce_pages(self, page_numbers: range, start_date: datetime.date, end_date: datetime.date) -> None:
+        try:
+            for page_number, pages in iter_listing_pages(
+                page_numbers,
+                start_date,
+                end_date,
+                self.backend,
+                self.driver_pool,
+                self.max_listing_workers,
+                self.timeout,
+                self.stop_event,
+            ):
+                with self._lock:
+                    self._pages_by_page_number[page_number] = pages
+                for page in pages:
+                    self.page_queue.put(page)
+        except Exception as e:
+            logger.error(f"An error occurred: {e}.")
+        finally:
+            for _ in range(self.max_accessory_workers):
+                self.page_queue.put(None)
+
+    def _is_known(self, page: GuidencePublishPage) -> bool:
+        """
+        判断发布页能否沿用已保存的附件。
+        """
+
+        if self.known_accessories is None or page.url not in self.known_accessories:
+            return False
+        return not self._needs_refresh(page)
+
+    def _needs_refresh(self, page: GuidencePublishPage) -> bool:
+        """
+        判断发布页是否需要刷新，需要刷新的发布页不沿用已保存的附件，也不使用未过期的页面缓存。
+        """
+
+        if page.url in self.refresh_urls:
+            return True
+        return self.recent_date is not None and page.date >= self.recent_date
+
+    def _extract_accessories(self) -> None:
+        while (page := self.page_queue.get()) is not None:
+            if self.stop_event.is_set():
+                continue
+
+            if self._is_known(page):
+                # 复制已保存的附件，合并时不会被视为移除
+                page.accessories = [copy.copy(accessory) for accessory in self.known_accessories[page.url]]
+                with self._lock:
+                    self._known_pages.append(page)
+                metrics.increment("publish_pages", result="known")
+                save_dir = get_save_dir(page)
+                for accessory in page.accessories:
+                    if (
+                        accessory.is_valid
+                        and accessory.is_link_available
+                        and not os.path.exists(os.path.join(save_dir, accessory.purified_title))
+                    ):
+                        self.accessory_queue.put((accessory, save_dir))
+                continue
+
+            try:
+                fetch_accessory(
+                    page, self.backend, self.driver_pool, self.single_pass, revalidate=self._needs_refresh(page)
+                )
+            except Exception as e:
+                logger.error(f"Failed to fetch accessories from {page.url}: {e!r}.")
+                with self._lock:
+                    self._failed_pages.append(page)
+                metrics.increment("publish_pages", result="failed")
+                self.stop_event.set()
+                continue
+            logger.info(f"成功从 {page.url} 获取附件信息")
+            metrics.increment("publish_pages", result="fetched")
+
+            save_dir = get_save_dir(page)
+            for accessory in page.accessories:
+                if accessory.is_valid and accessory.is_link_available:
+                    self.accessory_queue.put((accessory, save_dir))
+
+    def _download(self) -> None:
+        try:
+            self._download_results = asyncio.run(
+                download_from_queue(
+                    self.accessory_queue, self.timeout, self.max_connections, self.max_connections_per_host
+                )
+            )
+        except Exception as e:
+            logger.error(f"Failed to download accessories: {e}.")
+            self.stop_event.set()
+            # 继续取出队列中的附件，直到获取附件信息的线程全部结束，避免上游阻塞
+            while any(extractor.is_alive() for extractor in self._extractors) or not self.accessory_queue.empty():
+                try:
+                    self.accessory_queue.get(timeout=1)
+                except queue.Empty:
+                    pass
+
+    def run(self, page_numbers: range, start_date: datetime.date, end_date: datetime.date) -> PipelineResult:
+        """
+        运行流水线，所有阶段完成后返回结果。
+
+        各阶段从流水线开始到该阶段结束的耗时记录为 `stage_seconds` 指标。
+        """
+
+        start_time = time.perf_counter()
+        producer = threading.Thread(target=self._produce_pages, args=(page_numbers, start_date, end_date))
+        self._extractors = [
+            threading.Thread(target=self._extract_accessories) for _ in range(self.max_accessory_workers)
+        ]
+        downloader = threading.Thread(target=self._download)
+
+        for extractor in self._extractors:
+            extractor.start()
+        downloader.start()
+        producer.start()
+
+        producer.join()
+        metrics.observe("stage_seconds", time.perf_counter() - start_time, stage="listing")
+        for extractor in self._extractors:
+            extractor.join()
+        metrics.observe("stage_seconds", time.perf_counter() - start_time, stage="accessory")
+        self.accessory_queue.put(None)
+        downloader.join()
+        metrics.observe("stage_seconds", time.perf_counter() - start_time, stage="download")
+
+        return PipelineResult(
+            pages=[
+                page
+                for page_number in sorted(self._pages_by_page_number)
+                for page in self._pages_by_page_number[page_number]
+            ],
+            failed_pages=self._failed_pages,
+            known_pages=self._known_pages,
+            download_results=self._download_results,
+        )
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import re
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from utils import Accessory
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 需要手动处理的附件文件名及非指导原则附件
+PURIFY_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "purify.json")
+
+
+def load_purify_data(file_path: str = PURIFY_DATA_PATH) -> tuple[dict[str, str], frozenset[str]]:
+    """
+    读取需要手动处理的附件文件名及需要手动过滤的附件链接。
+    """
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return dict(data["manual_purified_titles"]), frozenset(data["manual_filter_hrefs"])
+
+
+MANUAL_PURIFIED_TITLE_DICT, MANUAL_FILTER_HREF_SET = load_purify_data()
+
+# 预处理正则表达式，依次作用于附件的各个文本字段，另有去除扩展名的正则表达式由 `get_extension_pattern` 生成
+PREPROCESS_PATTERN_LIST = [
+    (re.compile(r"^(相关)?附件[：]?"), ""),
+    (re.compile(r"^[一二三四五六七八九十]*\d*[：:、．\.]?"), ""),
+    (re.compile(r"\("), "（"),
+    (re.compile(r"\)"), "）"),
+]
+
+# anchor_title 为以下形式时不使用 anchor_title 作为文件名
+ANNOUNCEMENT_ACCESSORY_PATTERN = re.compile(r"通告(\d+号)?附件")
+CONSULTATION_ACCESSORY_PATTERN = re.compile(r"^附件\d+征求意见稿")
+
+# 文件名中的多余字符
+# eg.
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20230511105143123.html 附件3.7项体外诊断试剂修订指导原则.rar
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20230814154949121.html 2023年通告32号 附件1牙科种植体系统同品种临床评价注册审查指导原则.doc
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20230309105146187.html 附件1 牙科粘接剂产品注册审查指导原则.docx
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgtwsj/20230302171913174.html \n特此通告。\n \n附件：\n1.新型冠状病毒（2019-nCoV）核酸检测试剂注册审查指导原则（下载）
+REDUNDANT_PREFIX_PATTERN = re.compile(r"(.*(\n))*^(\d+年通告\d+号)?\s*(附件)?([-：．:\.\d\s]*)?(?!项)", re.M)
+DOWNLOAD_PATTERN = re.compile(r"（?下载）?")
+LEADING_PAREN_PATTERN = re.compile(r"^[（）]")
+TRAILING_PAREN_GROUP_PATTERN = re.compile(r"（[^（）]+）$")
+TRAILING_PAREN_PATTERN = re.compile(r"[（）]$")
+ILLEGAL_CHAR_PATTERN = re.compile(r"[\\/:*?\"<>|]")
+
+# 非指导原则的附件
+FILTER_TITLE_PATTERN_LIST = [
+    re.compile(r"意见表"),
+    re.compile(r"建议表"),
+    re.compile(r"信息征集"),
+    re.compile(r"意见(反馈|征集)表"),
+    re.compile(r"联系方式"),
+    re.compile(r"修(改|订)说明"),
+]
+
+# 链接失效的附件
+LINK_NOT_AVAILABLE_PATTERN = re.compile(r"^https?://www.sf?da.gov.cn/.*$")
+
+
+@functools.lru_cache(maxsize=None)
+def get_extension_patterns(file_extension_without_dot: str) -> tuple[re.Pattern, re.Pattern, re.Pattern]:
+    """
+    获取与扩展名相关的正则表达式：去除结尾的扩展名、匹配 `(附件)?N.ext` 形式的标题、去除书名号，每种扩展名只编译一次。
+    """
+
+    return (
+        re.compile(rf"{file_extension_without_dot}$"),
+        re.compile(rf"^(附件)?\d*\.{file_extension_without_dot}$"),
+        re.compile(rf"^《(.+)》\s*(（(?:第.+次)?征求意见稿）)?\s*(\.{file_extension_without_dot})?$"),
+    )
+
+
+def purify_title(
+    content: str,
+    anchor_title: str,
+    anchor_content: str,
+    anchor_href: str,
+    anchor_text_value: str,
+) -> str:
+    """
+    根据附件的各个文本字段获取附件文件名处理的结果。
+    """
+
+    # 拆分文件名和扩展名
+    _, file_extension = os.path.splitext(anchor_href)
+    file_extension_without_dot = file_extension[1:]
+
+    # 需手动处理的文件名
+    if anchor_href in MANUAL_PURIFIED_TITLE_DICT:
+        return MANUAL_PURIFIED_TITLE_DICT[anchor_href]
+
+    extension_pattern, numbered_title_pattern, book_title_pattern = get_extension_patterns(file_extension_without_dot)
+
+    for pattern, repl in (*PREPROCESS_PATTERN_LIST, (extension_pattern, "")):
+        content = pattern.sub(repl, content)
+        anchor_title = pattern.sub(repl, anchor_title)
+        anchor_content = pattern.sub(repl, anchor_content)
+        anchor_text_value = pattern.sub(repl, anchor_text_value)
+
+    if (
+        ANNOUNCEMENT_ACCESSORY_PATTERN.search(anchor_title)
+        or CONSULTATION_ACCESSORY_PATTERN.search(anchor_title)
+        or numbered_title_pattern.search(anchor_title)
+        or anchor_title in ("下载", "")
+    ):
+        # anchor_title 没有意义时使用附件的描述文本
+        purified_title = content or anchor_text_value
+    else:
+        purified_title = anchor_title
+
+    if not purified_title or "\n" in purified_title:
+        purified_title = anchor_content
+
+    # 处理文件名中的多余字符
+    purified_title = REDUNDANT_PREFIX_PATTERN.sub("", purified_title)
+
+    # 删除“（下载）”
+    purified_title = DOWNLOAD_PATTERN.sub("", purified_title)
+
+    # 删除开头的“（”或“）”
+    purified_title = LEADING_PAREN_PATTERN.sub("", purified_title)
+
+    # 删除结尾的“（”或“）”
+    if not TRAILING_PAREN_GROUP_PATTERN.search(purified_title):
+        purified_title = TRAILING_PAREN_PATTERN.sub("", purified_title)
+
+    # 删除书名号
+    purified_title = book_title_pattern.sub(r"\1\2\3", purified_title)
+
+    # 将文件名中的非法字符替换为连字符
+    purified_title = ILLEGAL_CHAR_PATTERN.sub("-", purified_title)
+
+    # 检查 title 是否有扩展名，没有则添加
+    if not purified_title.endswith(file_extension):
+        purified_title_body = os.path.splitext(purified_title)[0]
+        purified_title = purified_title_body + file_extension
+
+    # 如果最终的文件名为空，则使用 “未获取产品名称-指导原则.file_extension” 代替
+    if purified_title.replace(file_extension, "") == "":
+        purified_title = f"未获取产品名-指导原则.{file_extension}"
+
+    return purified_title
+
+
+def is_filtered(purified_title: str, anchor_href: str) -> bool:
+    """
+    判断附件是否为非指导原则的附件。
+    """
+
+    if any(pattern.search(purified_title) for pattern in FILTER_TITLE_PATTERN_LIST):
+        logger.info(f"过滤附件：{purified_title}")
+        return True
+
+    # 需要手动处理的非指导原则附件
+    if anchor_href in MANUAL_FILTER_HREF_SET:
+        logger.info(f"过滤附件：{anchor_href}")
+        return True
+
+    return False
+
+
+def is_link_not_available(anchor_href: str) -> bool:
+    """
+    判断附件链接是否已失效。
+    """
+
+    if LINK_NOT_AVAILABLE_PATTERN.match(anchor_href):
+        logger.info(f"链接失效：{anchor_href}")
+        return True
+    return False
+
+
+def purify_accessories(accessories: Iterable[Accessory]) -> None:
+    """
+    批量重新计算附件的 `purified_title`、`is_valid` 及 `is_link_available`，直接修改传入的附件。
+    """
+
+    for accessory in accessories:
+        accessory.purified_title = purify_title(
+            accessory.content,
+            accessory.anchor_title,
+            accessory.anchor_content,
+            accessory.anchor_href,
+            accessory.anchor_text_value,
+        )
+        accessory.is_valid = not is_filtered(accessory.purified_title, accessory.anchor_href)
+        accessory.is_link_available = not is_link_not_available(accessory.anchor_href)
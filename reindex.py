@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import dataclasses
+import json
+import logging
+import os
+
+from archives import get_extract_dir, get_manifest_path, is_archive
+from catalog import load_catalog_pages, save_catalog_pages
+from content_store import ContentStore
+from downloader import get_download_state_path
+from export import EXPORT_DIR, export_catalog
+from utils import Accessory, GuidencePublishPage, render_markdown
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 每个子进程一次处理的附件数量
+REINDEX_CHUNK_SIZE = 256
+
+# 重建结果报告文件路径
+REINDEX_REPORT_PATH = os.path.join(".cache", "reindex.json")
+
+
+@dataclasses.dataclass
+class AccessoryChange:
+    page_url: str
+    date: str
+    anchor_href: str
+    old_title: str
+    new_title: str
+    old_is_valid: bool
+    new_is_valid: bool
+    old_is_link_available: bool
+    new_is_link_available: bool
+    renamed: bool = False
+
+
+def get_candidate_fields(accessory: Accessory) -> tuple[str, str, str, str, str]:
+    return (
+        accessory.content,
+        accessory.anchor_title,
+        accessory.anchor_content,
+        accessory.anchor_href,
+        accessory.anchor_text_value,
+    )
+
+
+def reindex_chunk(chunk: list[tuple[str, str, str, str, str]]) -> list[tuple[str, bool, bool]]:
+    """
+    按当前的规则重新计算一批附件的 `(purified_title, is_valid, is_link_available)`，在进程池中执行。
+    """
+
+    # 创建附件时即按当前规则计算文件名及有效性
+    accessories = [Accessory(*fields) for fields in chunk]
+    return [(accessory.purified_title, accessory.is_valid, accessory.is_link_available) for accessory in accessories]
+
+
+def reindex_pages(
+    guidence_publish_pages: list[GuidencePublishPage], max_workers: int | None = None
+) -> tuple[list[AccessoryChange], int]:
+    """
+    按当前的文件名处理及过滤规则重新计算全部附件的 `purified_title`、`is_valid` 及 `is_link_available`，
+    直接修改传入的附件。附件分块后在进程池中并行计算，子进程中不输出过滤附件等日志。
+
+    没有候选标题字段的附件（如读取时丢弃了候选标题）无法重新计算，保持不变。
+
+    Args:
+        guidence_publish_pages (list[GuidencePublishPage]): 指导原则发布页列表。
+        max_workers (int | None): 进程数，为 None 时使用 CPU 核数。
+    Returns:
+        tuple[list[AccessoryChange], int]: 发生变化的附件，以及跳过的附件数量。
+    """
+
+    items: list[tuple[GuidencePublishPage, Accessory]] = []
+    skipped = 0
+    for page in guidence_publish_pages:
+        for accessory in page.accessories:
+            if accessory.content or accessory.anchor_title or accessory.anchor_content or accessory.anchor_text_value:
+                items.append((page, accessory))
+            else:
+                skipped += 1
+
+    chunks = [
+        [get_candidate_fields(accessory) for _, accessory in items[i : i + REINDEX_CHUNK_SIZE]]
+        for i in range(0, len(items), REINDEX_CHUNK_SIZE)
+    ]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=logging.disable, initargs=(logging.INFO,)
+    ) as executor:
+        results = [result for chunk_results in executor.map(reindex_chunk, chunks) for result in chunk_results]
+
+    changes: list[AccessoryChange] = []
+    for (page, accessory), (purified_title, is_valid, is_link_available) in zip(items, results):
+        if (purified_title, is_valid, is_link_available) == (
+            accessory.purified_title,
+            accessory.is_valid,
+            accessory.is_link_available,
+        ):
+            continue
+        changes.append(
+            AccessoryChange(
+                page_url=page.url,
+                date=page.date.isoformat(),
+                anchor_href=accessory.anchor_href,
+                old_title=accessory.purified_title,
+                new_title=purified_title,
+                old_is_valid=accessory.is_valid,
+                new_is_valid=is_valid,
+                old_is_link_available=accessory.is_link_available,
+                new_is_link_available=is_link_available,
+            )
+        )
+        accessory.purified_title = purified_title
+        accessory.is_valid = is_valid
+        accessory.is_link_available = is_link_available
+    return changes, skipped
+
+
+def rename_file(old_path: str, new_path: str) -> None:
+    """
+    重命名附件，以及附件的下载状态文件；压缩包同时重命名展开目录及成员清单。
+    """
+
+    os.replace(old_path, new_path)
+    renames = [(get_download_state_path(old_path), get_download_state_path(new_path))]
+    if is_archive(old_path):
+        renames.append((get_manifest_path(old_path), get_manifest_path(new_path)))
+        renames.append((get_extract_dir(old_path), get_extract_dir(new_path)))
+    for old, new in renames:
+        if os.path.exists(old) and not os.path.exists(new):
+            os.makedirs(os.path.dirname(new), exist_ok=True)
+            os.rename(old, new)
+
+
+def rename_files(changes: list[AccessoryChange], content_store: ContentStore, root: str = "guidences") -> int:
+    """
+    将 `<root>/<发布日期>/` 下的附件重命名为新的文件名。新文件名已存在、或同一目录下多个附件的新文件名相同时不重命名。
+
+    Returns:
+        int: 重命名的文件数量。
+    """
+
+    renamed = 0
+    target_paths: set[str] = set()
+    for change in changes:
+        if change.old_title == change.new_title:
+            continue
+        old_path = os.path.join(root, change.date, change.old_title)
+        new_path = os.path.join(root, change.date, change.new_title)
+        if not os.path.exists(old_path):
+            continue
+        if os.path.exists(new_path) or new_path in target_paths:
+            logger.warning(f"Skipped renaming {old_path}, {new_path} already exists.")
+            continue
+        target_paths.add(new_path)
+
+        digest = content_store.get_digest(old_path)
+        rename_file(old_path, new_path)
+        content_store.add(new_path, digest)
+        change.renamed = True
+        renamed += 1
+        logger.info(f"重命名 {old_path} -> {new_path}")
+    return renamed
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(
+        description="Re-apply the title purification and validation rules to the stored catalog."
+    )
+    parser.add_argument("--catalog", help="The SQLite catalog to re-index, the pickle file is used otherwise.")
+    parser.add_argument("--pickle", default="guidences.pickle", help="The pickle file of the catalog.")
+    parser.add_argument("--markdown", default="guidences-list.md", help="The Markdown file to update.")
+    parser.add_argument("--max-workers", type=int, help="The number of worker processes.")
+    parser.add_argument("--report", default=REINDEX_REPORT_PATH, help="The JSON file to write the changes to.")
+    parser.add_argument("--apply", action="store_true", help="Save the changes to the catalog and the Markdown files.")
+    parser.add_argument(
+        "--rename",
+        action="store_true",
+        help="Also rename the downloaded files under guidences/<date>/ to the new titles, implies --apply.",
+    )
+    args = parser.parse_args()
+
+    guidence_publish_pages = load_catalog_pages(args.catalog, args.pickle)
+    changes, skipped = reindex_pages(guidence_publish_pages, args.max_workers)
+    for change in changes:
+        if change.old_title != change.new_title:
+            logger.info(f"{change.date} {change.old_title} -> {change.new_title}")
+        if change.old_is_valid != change.new_is_valid:
+            logger.info(f"{change.date} {change.new_title} 有效性：{change.old_is_valid} -> {change.new_is_valid}")
+        if change.old_is_link_available != change.new_is_link_available:
+            logger.info(
+                f"{change.date} {change.new_title} 链接可用：{change.old_is_link_available} -> "
+                f"{change.new_is_link_available}"
+            )
+    logger.info(
+        f"共 {sum(len(page.accessories) for page in guidence_publish_pages)} 个附件，{len(changes)} 个发生变化，"
+        f"{skipped} 个没有候选标题而跳过"
+    )
+
+    if changes and (args.apply or args.rename):
+        if args.rename:
+            with ContentStore() as content_store:
+                logger.info(f"重命名 {rename_files(changes, content_store)} 个文件")
+        change_set, guidence_publish_page_list = save_catalog_pages(guidence_publish_pages, args.catalog, args.pickle)
+        logger.info(change_set.summary())
+        render_markdown(guidence_publish_page_list, args.markdown, change_set)
+        export_catalog(guidence_publish_page_list, EXPORT_DIR, change_set)
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump([dataclasses.asdict(change) for change in changes], f, ensure_ascii=False, indent=2)
+    logger.info(f"变化已写入 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import dataclasses
+import datetime
+import hashlib
+import html
+import http.server
+import json
+import logging
+import math
+import os
+import posixpath
+import random
+import threading
+import time
+
+from urllib.parse import urlsplit
+
+from utils import SELECTOR_TYPE_LIST, GuidencePublishPage, read_pickle_file
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 回放站点的页面模板：列表页、发布页及类型 1~9 的附件结构
+REPLAY_FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replay_fixtures.json")
+
+# 列表页、发布页及附件的路径，与 www.cmde.org.cn 一致
+LISTING_PATH = "/flfg/zdyz/"
+PUBLISH_PAGE_PATH = "/flfg/zdyz/replay/"
+ATTACHMENT_PATH = "/images/"
+
+# 每个列表页的发布页数量
+PAGES_PER_LISTING = 20
+
+# 合成附件的默认大小（字节）
+DEFAULT_ATTACHMENT_SIZE = 4 * 1024
+
+# 合成附件的 Last-Modified
+ATTACHMENT_LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def load_fixtures(file_path: str = REPLAY_FIXTURES_PATH) -> dict:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scale_pages(guidence_publish_pages: list[GuidencePublishPage], scale: int) -> list[GuidencePublishPage]:
+    """
+    将目录扩大为 `scale` 倍。第 k 份副本的发布页及附件链接加上 `-k` 后缀，发布日期提前 k 天，
+    使副本的附件保存路径互不相同。结果按发布日期倒序排列。
+    """
+
+    scaled_pages: list[GuidencePublishPage] = []
+    for k in range(scale):
+        for page in guidence_publish_pages:
+            if k == 0:
+                scaled_pages.append(page)
+                continue
+            accessories = []
+            for accessory in page.accessories:
+                accessory = copy.copy(accessory)
+                stem, ext = posixpath.splitext(accessory.anchor_href)
+                accessory.anchor_href = f"{stem}-{k}{ext}"
+                accessories.append(accessory)
+            stem, ext = posixpath.splitext(page.url)
+            scaled_pages.append(
+                GuidencePublishPage(page.title, f"{stem}-{k}{ext}", page.date - datetime.timedelta(days=k), accessories)
+            )
+    scaled_pages.sort(key=lambda x: (-x.date.toordinal(), x.title))
+    return scaled_pages
+
+
+def get_attachment_payload(path: str, size: int) -> bytes:
+    """
+    生成附件的合成内容，内容由路径决定，不同附件的内容不同。
+    """
+
+    digest = hashlib.sha256(path.encode("utf-8")).digest()
+    return (digest * math.ceil(size / len(digest)))[:size]
+
+
+class ReplaySite:
+    """
+    由目录生成的回放站点。
+
+    发布页按顺序轮流使用类型 1~9 的附件结构，附件链接替换为站点内的合成附件，扩展名不变。
+    模板中的 `{title}` 为附件已处理的文件名（不含扩展名），用于链接文本即为标题的附件结构。
+
+    Args:
+        guidence_publish_pages (list[GuidencePublishPage]): 按发布日期倒序排列的指导原则发布页列表。
+        attachment_size (int): 合成附件的大小（字节）。
+        fixtures (dict | None): 页面模板，为 None 时读取 `REPLAY_FIXTURES_PATH`。
+    """
+
+    def __init__(
+        self,
+        guidence_publish_pages: list[GuidencePublishPage],
+        attachment_size: int = DEFAULT_ATTACHMENT_SIZE,
+        fixtures: dict | None = None,
+    ):
+        self.pages = guidence_publish_pages
+        self.attachment_size = attachment_size
+        self.fixtures = fixtures or load_fixtures()
+        self.page_count = max(1, math.ceil(len(guidence_publish_pages) / PAGES_PER_LISTING))
+        self._attachment_paths: set[str] = set()
+        for page_index, page in enumerate(guidence_publish_pages):
+            for accessory_index in range(len(page.accessories)):
+                self._attachment_paths.add(self.get_attachment_path(page_index, accessory_index))
+
+    @staticmethod
+    def get_selector_type(page_index: int) -> int:
+        return page_index % len(SELECTOR_TYPE_LIST) + 1
+
+    @staticmethod
+    def get_publish_page_path(page_index: int) -> str:
+        return f"{PUBLISH_PAGE_PATH}{page_index}.html"
+
+    def get_attachment_path(self, page_index: int, accessory_index: int) -> str:
+        _, ext = posixpath.splitext(self.pages[page_index].accessories[accessory_index].anchor_href)
+        return f"{ATTACHMENT_PATH}{page_index}_{accessory_index}{ext}"
+
+    def render_listing(self, page_number: int) -> bytes | None:
+        if not 0 <= page_number < self.page_count:
+            return None
+        first = page_number * PAGES_PER_LISTING
+        items = "".join(
+            self.fixtures["listing_item"].format(
+                href=posixpath.relpath(self.get_publish_page_path(page_index), LISTING_PATH),
+                title=html.escape(page.title),
+                date=page.date.isoformat(),
+            )
+            for page_index, page in enumerate(self.pages[first : first + PAGES_PER_LISTING], start=first)
+        )
+        return (
+            self.fixtures["listing_page"]
+            .format(items=items, page_count=self.page_count, page_number=page_number)
+            .encode("utf-8")
+        )
+
+    def render_publish_page(self, page_index: int) -> bytes | None:
+        if not 0 <= page_index < len(self.pages):
+            return None
+        page = self.pages[page_index]
+        template = self.fixtures["accessory_types"][str(self.get_selector_type(page_index))]
+        accessories = "".join(
+            template.format(
+                href=self.get_attachment_path(page_index, accessory_index),
+                content=html.escape(accessory.content),
+                anchor_title=html.escape(accessory.anchor_title),
+                anchor_content=html.escape(accessory.anchor_content),
+                anchor_text_value=html.escape(accessory.anchor_text_value),
+                title=html.escape(posixpath.splitext(accessory.purified_title)[0]),
+            )
+            for accessory_index, accessory in enumerate(page.accessories)
+        )
+        return (
+            self.fixtures["publish_page"]
+            .format(title=html.escape(page.title), date=page.date.isoformat(), accessories=accessories)
+            .encode("utf-8")
+        )
+
+    def get_attachment(self, path: str) -> bytes | None:
+        if path not in self._attachment_paths:
+            return None
+        return get_attachment_payload(path, self.attachment_size)
+
+    def get_page(self, path: str) -> tuple[str, bytes] | None:
+        """
+        获取路径对应的 `(Content-Type, 内容)`，路径不存在时返回 None。
+        """
+
+        directory, name = posixpath.split(path)
+        stem, ext = posixpath.splitext(name)
+        body: bytes | None = None
+        if directory + "/" == LISTING_PATH and ext == ".html":
+            if stem == "index":
+                body = self.render_listing(0)
+            elif stem.startswith("index_") and stem[len("index_") :].isdigit():
+                body = self.render_listing(int(stem[len("index_") :]))
+        elif directory + "/" == PUBLISH_PAGE_PATH and ext == ".html" and stem.isdigit():
+            body = self.render_publish_page(int(stem))
+        elif directory + "/" == ATTACHMENT_PATH:
+            if (body := self.get_attachment(path)) is not None:
+                return "application/octet-stream", body
+        if body is None:
+            return None
+        return "text/html; charset=utf-8", body
+
+
+@dataclasses.dataclass
+class FaultSettings:
+    # 每个请求的固定延迟及随机延迟上限（秒）
+    latency: float = 0.0
+    jitter: float = 0.0
+    # 返回 `error_status` 的请求比例
+    error_rate: float = 0.0
+    error_status: int = 503
+    # 附件响应只发送一半内容后断开连接的比例
+    truncate_rate: float = 0.0
+
+
+class ReplayRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def do_GET(self) -> None:
+        self.respond(head=False)
+
+    def do_HEAD(self) -> None:
+        self.respond(head=True)
+
+    def send_body(self, status: int, content_type: str, body: bytes, headers: dict[str, str], head: bool) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if head:
+            return
+
+        if content_type == "application/octet-stream" and self.server.roll(self.server.faults.truncate_rate):
+            # 只发送一半内容后断开连接，模拟下载中断
+            self.wfile.write(body[: len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def respond(self, head: bool) -> None:
+        faults = self.server.faults
+        if delay := faults.latency + (self.server.uniform(0, faults.jitter) if faults.jitter else 0):
+            time.sleep(delay)
+
+        if self.server.roll(faults.error_rate):
+            self.send_body(faults.error_status, "text/plain", b"", {}, head)
+            return
+
+        if (page := self.server.site.get_page(urlsplit(self.path).path)) is None:
+            self.send_body(404, "text/plain", b"", {}, head)
+            return
+        content_type, body = page
+
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Last-Modified": ATTACHMENT_LAST_MODIFIED, "Accept-Ranges": "bytes"}
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # 只支持 bytes=<start>- 及 bytes=<start>-<end> 形式的 Range 请求
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes=") and self.headers.get("If-Range", etag) in (etag, ATTACHMENT_LAST_MODIFIED):
+            first, _, last = range_header[len("bytes=") :].partition("-")
+            start = int(first) if first.isdigit() else 0
+            end = min(int(last), len(body) - 1) if last.isdigit() else len(body) - 1
+            if start >= len(body):
+                self.send_body(416, "text/plain", b"", {"Content-Range": f"bytes */{len(body)}"}, head)
+                return
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            self.send_body(206, content_type, body[start : end + 1], headers, head)
+            return
+
+        self.send_body(200, content_type, body, headers, head)
+
+
+class ReplayServer(http.server.ThreadingHTTPServer):
+    """
+    在本地回放站点的 HTTP 服务器，可注入延迟、错误状态码及中断的下载。
+
+    Args:
+        address (tuple[str, int]): 监听地址，端口为 0 时自动选择。
+        site (ReplaySite): 回放站点。
+        faults (FaultSettings | None): 注入的延迟及错误。
+        seed (int | None): 随机数种子。
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        site: ReplaySite,
+        faults: FaultSettings | None = None,
+        seed: int | None = None,
+    ):
+        super().__init__(address, ReplayRequestHandler)
+        self.site = site
+        self.faults = faults or FaultSettings()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    @property
+    def listing_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{LISTING_PATH}index.html"
+
+    def handle_error(self, request, client_address) -> None:
+        # 客户端超时或提前断开连接是注入错误的正常结果
+        logger.debug(f"Error while handling a request from {client_address}.", exc_info=True)
+
+    def roll(self, probability: float) -> bool:
+        if probability <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < probability
+
+    def uniform(self, a: float, b: float) -> float:
+        with self._random_lock:
+            return self._random.uniform(a, b)
+
+
+def start_replay_server(
+    site: ReplaySite,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    faults: FaultSettings | None = None,
+    seed: int | None = None,
+) -> ReplayServer:
+    """
+    在后台线程中启动回放服务器，使用完毕后调用 `shutdown()` 及 `server_close()` 关闭。
+    """
+
+    server = ReplayServer((host, port), site, faults, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Serve a local replay of the guidence site built from the catalog.")
+    parser.add_argument("--pickle", default="guidences.pickle", help="The pickle file to build the site from.")
+    parser.add_argument("--scale", type=int, default=1, help="Serve this many copies of the catalog.")
+    parser.add_argument("--host", default="127.0.0.1", help="The address to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="The port to listen on, 0 picks a free port.")
+    parser.add_argument(
+        "--attachment-size", type=int, default=DEFAULT_ATTACHMENT_SIZE, help="The size of each attachment in bytes."
+    )
+    parser.add_argument("--latency", type=float, default=0.0, help="The delay added to every response in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="The maximum random extra delay in seconds.")
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="The fraction of requests answered with an error."
+    )
+    parser.add_argument("--error-status", type=int, default=503, help="The status code of injected errors.")
+    parser.add_argument(
+        "--truncate-rate",
+        type=float,
+        default=0.0,
+        help="The fraction of attachment responses cut off halfway through.",
+    )
+    parser.add_argument("--seed", type=int, help="The random seed of the injected faults.")
+    args = parser.parse_args()
+
+    site = ReplaySite(scale_pages(read_pickle_file(args.pickle), args.scale), args.attachment_size)
+    faults = FaultSettings(args.latency, args.jitter, args.error_rate, args.error_status, args.truncate_rate)
+    with ReplayServer((args.host, args.port), site, faults, args.seed) as server:
+        logger.info(f"回放 {len(site.pages)} 个发布页，共 {site.page_count} 个列表页：{server.listing_url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
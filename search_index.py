@@ -0,0 +1,563 @@
+from __future__ import annotations
+
+import argparse
+import collections
+import concurrent.futures
+import dataclasses
+import functools
+import logging
+import math
+import os
+import re
+import sqlite3
+import unicodedata
+import xml.etree.ElementTree as ElementTree
+import zipfile
+import zlib
+
+from collections.abc import Callable
+
+from archives import ARCHIVE_EXTRACT_DIR, get_extract_dir
+from catalog import load_catalog_pages
+from utils import Accessory, GuidencePublishPage
+
+try:
+    import pypdf
+except ImportError:
+    # 未安装 pypdf 时不提取 PDF 文件的文本
+    pypdf = None
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 索引文件路径
+SEARCH_INDEX_PATH = os.path.join(".cache", "search-index.sqlite3")
+
+# 索引格式版本，分词或文本提取方式变化时递增，版本不一致的索引会被重建
+SEARCH_INDEX_VERSION = 1
+
+# 文本提取状态
+EXTRACT_STATUS_EXTRACTED = "extracted"
+EXTRACT_STATUS_UNSUPPORTED = "unsupported"
+EXTRACT_STATUS_FAILED = "failed"
+
+# 每提取多少个文件提交一次，中断后已提交的文件无需重新提取
+COMMIT_INTERVAL = 50
+
+# 搜索结果摘要在匹配位置前后保留的字符数
+SNIPPET_RADIUS = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    text BLOB,
+    page_url TEXT,
+    page_title TEXT,
+    date TEXT,
+    purified_title TEXT
+);
+
+CREATE TABLE IF NOT EXISTS postings (
+    token TEXT NOT NULL,
+    document_id INTEGER NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (token, document_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_document_id ON postings (document_id);
+"""
+
+# 中日韩统一表意文字（含扩展 A 及兼容表意文字），按字二元切分
+CJK_PATTERN = r"㐀-䶿一-鿿豈-﫿"
+TOKEN_PATTERN = re.compile(rf"[{CJK_PATTERN}]+|[0-9a-z]+")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# WordprocessingML 及 SpreadsheetML 的命名空间
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+SHEET_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+@functools.lru_cache(maxsize=None)
+def get_binary_text_pattern() -> re.Pattern:
+    """
+    匹配 .doc / .xls 中 UTF-16 文本片段的正则表达式：由 GB2312 汉字、全角字符、中文标点及 ASCII 可打印字符组成，
+    且至少含有一个 GB2312 汉字。只接受 GB2312 汉字可以排除将二进制数据解码为 UTF-16 时产生的大部分生僻字。
+    """
+
+    code_points = sorted(
+        ord(bytes((high, low)).decode("gb2312"))
+        for high in range(0xB0, 0xF8)
+        for low in range(0xA1, 0xFF)
+        if not (high == 0xD7 and low >= 0xFA)
+    )
+    ranges: list[tuple[int, int]] = []
+    for code_point in code_points:
+        if ranges and ranges[-1][1] == code_point - 1:
+            ranges[-1] = (ranges[-1][0], code_point)
+        else:
+            ranges.append((code_point, code_point))
+    hanzi = "".join(chr(first) if first == last else f"{chr(first)}-{chr(last)}" for first, last in ranges)
+    other = r"　-〿！-～ -~\r\n\t"
+    return re.compile(f"[{hanzi}{other}]*[{hanzi}][{hanzi}{other}]*")
+
+
+def normalize_text(text: str) -> str:
+    """
+    统一全角、半角字符及大小写，合并连续的空白字符。
+    """
+
+    return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+def tokenize(normalized_text: str) -> list[str]:
+    """
+    将规范化后的文本切分为词元：连续的汉字切分为相互重叠的二元组，每个位置各一个，
+    最后一个字单独作为一个词元，使单字也能通过前缀查询；字母及数字按连续的词切分。
+    """
+
+    tokens: list[str] = []
+    for match in TOKEN_PATTERN.finditer(normalized_text):
+        run = match.group()
+        if run[0].isascii():
+            tokens.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run)))
+    return tokens
+
+
+def tokenize_query(normalized_query: str) -> tuple[list[str], list[str]]:
+    """
+    将规范化后的查询切分为需要精确匹配的词元及需要前缀匹配的单字。
+    """
+
+    tokens: list[str] = []
+    prefixes: list[str] = []
+    for match in TOKEN_PATTERN.finditer(normalized_query):
+        run = match.group()
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            prefixes.append(run)
+        else:
+            tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens, prefixes
+
+
+def extract_docx_text(file_path: str) -> str:
+    paragraphs: list[str] = []
+    with zipfile.ZipFile(file_path) as archive:
+        names = [
+            name
+            for name in archive.namelist()
+            if name == "word/document.xml" or re.fullmatch(r"word/(header|footer|footnotes)\d*\.xml", name)
+        ]
+        for name in names:
+            with archive.open(name) as f:
+                texts: list[str] = []
+                for _, element in ElementTree.iterparse(f):
+                    if element.tag == f"{WORD_NAMESPACE}t" and element.text:
+                        texts.append(element.text)
+                    elif element.tag == f"{WORD_NAMESPACE}p":
+                        paragraphs.append("".join(texts))
+                        texts.clear()
+                        element.clear()
+    return "\n".join(paragraphs)
+
+
+def extract_xlsx_text(file_path: str) -> str:
+    cells: list[str] = []
+    with zipfile.ZipFile(file_path) as archive:
+        names = [
+            name
+            for name in archive.namelist()
+            if name == "xl/sharedStrings.xml" or re.fullmatch(r"xl/worksheets/sheet\d+\.xml", name)
+        ]
+        for name in names:
+            with archive.open(name) as f:
+                for _, element in ElementTree.iterparse(f):
+                    # 共享字符串及单元格内联字符串均保存在 <t> 元素中
+                    if element.tag == f"{SHEET_NAMESPACE}t" and element.text:
+                        cells.append(element.text)
+                    elif element.tag in (f"{SHEET_NAMESPACE}si", f"{SHEET_NAMESPACE}row"):
+                        element.clear()
+    return "\n".join(cells)
+
+
+def extract_binary_text(file_path: str, alignments: tuple[int, ...] = (0,)) -> str:
+    """
+    从 Word 97-2003 / Excel 97-2003 等 OLE 复合文档中提取 UTF-16 文本片段。
+
+    不解析文档结构，只将文件内容按 UTF-16LE 解码并保留由常用汉字、标点及 ASCII 字符组成的片段，
+    中文文档的正文均以 UTF-16LE 保存，足以用于全文检索。
+    """
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+    pattern = get_binary_text_pattern()
+    fragments: list[str] = []
+    for alignment in alignments:
+        aligned_data = data[alignment:]
+        text = aligned_data[: len(aligned_data) // 2 * 2].decode("utf-16le", errors="replace")
+        fragments.extend(fragment for fragment in pattern.findall(text) if len(fragment) >= 2)
+    return "\n".join(fragments)
+
+
+def extract_pdf_text(file_path: str) -> str:
+    reader = pypdf.PdfReader(file_path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def get_extractor(file_path: str) -> Callable[[str], str] | None:
+    """
+    根据扩展名获取文本提取函数，不支持的文件类型返回 None。
+    """
+
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".docx":
+        return extract_docx_text
+    if extension == ".xlsx":
+        return extract_xlsx_text
+    if extension == ".doc":
+        return extract_binary_text
+    if extension == ".xls":
+        # Excel 的字符串记录前有一个字节的标志，文本可能从奇数位置开始
+        return functools.partial(extract_binary_text, alignments=(0, 1))
+    if extension == ".pdf" and pypdf is not None:
+        return extract_pdf_text
+    return None
+
+
+@dataclasses.dataclass
+class ExtractedDocument:
+    path: str
+    size: int
+    mtime_ns: int
+    status: str
+    text: str = ""
+    token_counts: dict[str, int] = dataclasses.field(default_factory=dict)
+    error: str = ""
+
+
+def extract_document(file_path: str) -> ExtractedDocument:
+    """
+    提取单个文件的文本并统计词频，在进程池中执行。
+    """
+
+    stat = os.stat(file_path)
+    document = ExtractedDocument(file_path, stat.st_size, stat.st_mtime_ns, EXTRACT_STATUS_UNSUPPORTED)
+    if (extractor := get_extractor(file_path)) is None:
+        return document
+
+    try:
+        document.text = normalize_text(extractor(file_path))
+    except Exception as e:
+        document.status = EXTRACT_STATUS_FAILED
+        document.error = repr(e)
+        return document
+    document.status = EXTRACT_STATUS_EXTRACTED
+    document.token_counts = dict(collections.Counter(tokenize(document.text)))
+    return document
+
+
+def get_accessory_paths(
+    guidence_publish_pages: list[GuidencePublishPage], root: str = "guidences"
+) -> dict[str, tuple[GuidencePublishPage, Accessory]]:
+    """
+    获取附件保存路径对应的指导原则发布页及附件，路径与下载时的保存路径一致。压缩包展开后的文件对应压缩包附件。
+    """
+
+    accessory_paths: dict[str, tuple[GuidencePublishPage, Accessory]] = {}
+    for page in guidence_publish_pages:
+        save_dir = os.path.join(root, page.date.strftime("%Y-%m-%d"))
+        for accessory in page.accessories:
+            save_path = os.path.normpath(os.path.join(save_dir, accessory.purified_title))
+            accessory_paths[save_path] = (page, accessory)
+            for member in accessory.members:
+                member_path = os.path.join(get_extract_dir(save_path, root), *member.name.split("/"))
+                accessory_paths[os.path.normpath(member_path)] = (page, accessory)
+    return accessory_paths
+
+
+def scan_files(root: str) -> dict[str, tuple[int, int]]:
+    """
+    获取目录下所有文件的大小及修改时间（纳秒）。
+    """
+
+    files: dict[str, tuple[int, int]] = {}
+    for dir_path, _, file_names in os.walk(root):
+        for file_name in file_names:
+            file_path = os.path.normpath(os.path.join(dir_path, file_name))
+            if file_name.endswith((".part", ".tmp")):
+                continue
+            stat = os.stat(file_path)
+            files[file_path] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+@dataclasses.dataclass
+class IndexUpdateResult:
+    extracted: int = 0
+    unsupported: int = 0
+    failed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"提取 {self.extracted} 个文件，不支持 {self.unsupported} 个，失败 {self.failed} 个，"
+            f"移除 {self.removed} 个，未变化 {self.unchanged} 个"
+        )
+
+
+@dataclasses.dataclass
+class SearchResult:
+    path: str
+    score: float
+    snippet: str
+    page_url: str | None
+    page_title: str | None
+    date: str | None
+    purified_title: str | None
+
+
+class SearchIndex:
+    """
+    附件全文的倒排索引，保存在 SQLite 数据库中。
+
+    - 汉字按二元组切分，字母及数字按词切分，词元及其在每个文件中出现的次数保存在 postings 表中；
+    - 按文件大小及修改时间判断文件是否变化，更新时只重新提取新增及变化的文件，已删除的文件从索引中移除；
+    - 每个文件关联下载它的发布页 url 及附件文件名。
+
+    Args:
+        file_path (str): SQLite 数据库文件路径。
+    """
+
+    def __init__(self, file_path: str = SEARCH_INDEX_PATH):
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(file_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SEARCH_INDEX_VERSION:
+            self.connection.executescript("DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS documents;")
+            self.connection.execute(f"PRAGMA user_version = {SEARCH_INDEX_VERSION}")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self) -> SearchIndex:
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+        self.connection.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _write_document(self, document: ExtractedDocument) -> None:
+        text = zlib.compress(document.text.encode("utf-8")) if document.text else None
+        document_id = self.connection.execute(
+            """
+            INSERT INTO documents (path, size, mtime_ns, status, text) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (path) DO UPDATE SET
+                size = excluded.size, mtime_ns = excluded.mtime_ns, status = excluded.status, text = excluded.text
+            RETURNING id
+            """,
+            (document.path, document.size, document.mtime_ns, document.status, text),
+        ).fetchone()[0]
+        self.connection.execute("DELETE FROM postings WHERE document_id = ?", (document_id,))
+        self.connection.executemany(
+            "INSERT INTO postings (token, document_id, count) VALUES (?, ?, ?)",
+            ((token, document_id, count) for token, count in document.token_counts.items()),
+        )
+
+    def _update_accessory_fields(self, accessory_paths: dict[str, tuple[GuidencePublishPage, Accessory]]) -> None:
+        parameters: list[tuple] = []
+        for document_id, path in self.connection.execute("SELECT id, path FROM documents").fetchall():
+            if (page_accessory := accessory_paths.get(path)) is None:
+                parameters.append((None, None, None, None, document_id))
+                continue
+            page, accessory = page_accessory
+            parameters.append((page.url, page.title, page.date.isoformat(), accessory.purified_title, document_id))
+        self.connection.executemany(
+            "UPDATE documents SET page_url = ?, page_title = ?, date = ?, purified_title = ? WHERE id = ?", parameters
+        )
+
+    def update(
+        self,
+        root: str,
+        guidence_publish_pages: list[GuidencePublishPage],
+        max_workers: int | None = None,
+    ) -> IndexUpdateResult:
+        """
+        增量更新索引。
+
+        Args:
+            root (str): 附件根目录。
+            guidence_publish_pages (list[GuidencePublishPage]): 目录中的指导原则发布页，用于关联文件及发布页。
+            max_workers (int | None): 提取文本的进程数，为 None 时使用 CPU 核数。
+        Returns:
+            IndexUpdateResult: 更新结果。
+        """
+
+        result = IndexUpdateResult()
+        # 压缩包展开后的文件位于缓存目录中，一并索引
+        files = scan_files(root) | scan_files(ARCHIVE_EXTRACT_DIR)
+        indexed_files = {
+            row["path"]: row
+            for row in self.connection.execute("SELECT id, path, size, mtime_ns, status FROM documents")
+        }
+
+        removed_paths = indexed_files.keys() - files.keys()
+        self.connection.executemany(
+            "DELETE FROM documents WHERE id = ?", ((indexed_files[path]["id"],) for path in removed_paths)
+        )
+        result.removed = len(removed_paths)
+
+        changed_paths: list[str] = []
+        for path, (size, mtime_ns) in files.items():
+            row = indexed_files.get(path)
+            if (
+                row is None
+                or (row["size"], row["mtime_ns"]) != (size, mtime_ns)
+                # 之后安装了可选依赖的文件类型需要重新提取
+                or (row["status"] == EXTRACT_STATUS_UNSUPPORTED and get_extractor(path) is not None)
+            ):
+                changed_paths.append(path)
+        result.unchanged = len(files) - len(changed_paths)
+        logger.info(f"共 {len(files)} 个文件，需要提取 {len(changed_paths)} 个")
+
+        if changed_paths:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for i, document in enumerate(executor.map(extract_document, changed_paths, chunksize=4), start=1):
+                    self._write_document(document)
+                    if document.status == EXTRACT_STATUS_EXTRACTED:
+                        result.extracted += 1
+                    elif document.status == EXTRACT_STATUS_UNSUPPORTED:
+                        result.unsupported += 1
+                    else:
+                        result.failed += 1
+                        logger.warning(f"Failed to extract text from {document.path}: {document.error}.")
+                    if i % COMMIT_INTERVAL == 0:
+                        self.connection.commit()
+                        logger.info(f"已提取 {i}/{len(changed_paths)} 个文件")
+
+        self._update_accessory_fields(get_accessory_paths(guidence_publish_pages, root))
+        self.connection.commit()
+        return result
+
+    def _get_postings(self, token: str, prefix: bool) -> dict[int, int]:
+        if prefix:
+            rows = self.connection.execute(
+                "SELECT document_id, SUM(count) FROM postings WHERE token >= ? AND token < ? GROUP BY document_id",
+                (token, token + "\U0010ffff"),
+            )
+        else:
+            rows = self.connection.execute("SELECT document_id, count FROM postings WHERE token = ?", (token,))
+        return dict(rows.fetchall())
+
+    def search(self, query: str, limit: int = 20) -> list[SearchResult]:
+        """
+        查询同时包含所有关键词（以空格分隔）的文件，按 TF-IDF 得分排序。
+
+        二元组全部出现不代表关键词出现，候选文件再按保存的文本逐个确认。
+
+        Args:
+            query (str): 查询语句。
+            limit (int): 最多返回的结果数量。
+        Returns:
+            list[SearchResult]: 搜索结果。
+        """
+
+        normalized_query = normalize_text(query)
+        terms = normalized_query.split()
+        tokens, prefixes = tokenize_query(normalized_query)
+        if not tokens and not prefixes:
+            return []
+
+        document_count = self.connection.execute(
+            "SELECT COUNT(*) FROM documents WHERE status = ?", (EXTRACT_STATUS_EXTRACTED,)
+        ).fetchone()[0]
+        scores: dict[int, float] | None = None
+        for token, prefix in [*((token, False) for token in dict.fromkeys(tokens)), *((p, True) for p in prefixes)]:
+            postings = self._get_postings(token, prefix)
+            idf = math.log(1 + document_count / len(postings)) if postings else 0.0
+            if scores is None:
+                scores = {document_id: count * idf for document_id, count in postings.items()}
+            else:
+                scores = {
+                    document_id: score + postings[document_id] * idf
+                    for document_id, score in scores.items()
+                    if document_id in postings
+                }
+            if not scores:
+                return []
+
+        results: list[SearchResult] = []
+        for document_id, score in sorted(scores.items(), key=lambda x: -x[1]):
+            row = self.connection.execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+            text = zlib.decompress(row["text"]).decode("utf-8")
+            if not all(term in text for term in terms):
+                continue
+            position = text.find(terms[0])
+            start = max(0, position - SNIPPET_RADIUS)
+            snippet = text[start : position + len(terms[0]) + SNIPPET_RADIUS].replace("\n", " ")
+            results.append(
+                SearchResult(
+                    path=row["path"],
+                    score=score,
+                    snippet=snippet,
+                    page_url=row["page_url"],
+                    page_title=row["page_title"],
+                    date=row["date"],
+                    purified_title=row["purified_title"],
+                )
+            )
+            if len(results) >= limit:
+                break
+        return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Build or query the full-text index of the downloaded guidences.")
+    parser.add_argument("--index", default=SEARCH_INDEX_PATH, help="The SQLite file of the index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Extract new or changed files and update the index.")
+    build_parser.add_argument("--root", default="guidences", help="The directory of the downloaded guidences.")
+    build_parser.add_argument("--catalog", help="The SQLite catalog used to link files to publish pages.")
+    build_parser.add_argument(
+        "--pickle", default="guidences.pickle", help="The pickle file used when the catalog is not given."
+    )
+    build_parser.add_argument("--max-workers", type=int, help="The number of extraction processes.")
+    query_parser = subparsers.add_parser("query", help="Search the index.")
+    query_parser.add_argument("query", nargs="+", help="The keywords, all of them must appear in a file.")
+    query_parser.add_argument("--limit", type=int, default=20, help="The maximum number of results.")
+    args = parser.parse_args()
+
+    with SearchIndex(args.index) as search_index:
+        if args.command == "build":
+            result = search_index.update(args.root, load_catalog_pages(args.catalog, args.pickle), args.max_workers)
+            logger.info(result.summary())
+            return
+
+        results = search_index.search(" ".join(args.query), args.limit)
+        for result in results:
+            print(f"{result.date or '-'} {result.purified_title or os.path.basename(result.path)}")
+            if result.page_url:
+                print(f"    {result.page_title} {result.page_url}")
+            print(f"    {result.path}")
+            print(f"    …{result.snippet}…")
+        if not results:
+            print("没有找到匹配的文件")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import collections
+import logging
+import posixpath
+import threading
+
+from urllib.parse import urlsplit
+
+import soupsieve
+
+from bs4 import BeautifulSoup, Tag
+
+from metrics import metrics
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 类型 1~9 选择器匹配的必要条件：至少有一个附件链接同时具有以下全部特征。
+# 特征为 `("parent", 标签)`、`("child", 标签)`、`("prev", 标签)` 及 `("prev2", 标签)`，分别表示附件链接的父元素、
+# 某个子元素、前一个相邻元素及再前一个相邻元素，与 `utils.SELECTOR_TYPE_LIST` 中的选择器一一对应。
+ACCESSORY_TYPE_REQUIREMENTS: list[frozenset[tuple[str, str]]] = [
+    # 类型1：p:has(>a)
+    frozenset({("parent", "p")}),
+    # 类型2：span + a
+    frozenset({("prev", "span")}),
+    # 类型3：p > img + a
+    frozenset({("parent", "p"), ("prev", "img")}),
+    # 类型4：a:has(>font)
+    frozenset({("child", "font")}),
+    # 类型5：br + a
+    frozenset({("prev", "br")}),
+    # 类型6：span + img + a
+    frozenset({("prev", "img"), ("prev2", "span")}),
+    # 类型7：br + img + a
+    frozenset({("prev", "img"), ("prev2", "br")}),
+    # 类型8：a:has(>span)
+    frozenset({("child", "span")}),
+    # 类型9：a
+    frozenset(),
+]
+
+
+def get_layout_key(url: str) -> str:
+    """
+    获取发布页的版式分组：url 所在目录及文件名中的年份，如 `/flfg/zdyz/zqyjg/2014`。
+    """
+
+    directory, name = posixpath.split(urlsplit(url).path)
+    year = name[:4]
+    return f"{directory}/{year}" if year.isdigit() else directory
+
+
+def get_anchor_features(anchor: Tag) -> frozenset[tuple[str, str]]:
+    features: set[tuple[str, str]] = set()
+    if anchor.parent is not None and anchor.parent.name:
+        features.add(("parent", anchor.parent.name))
+    for child in anchor.find_all(recursive=False):
+        features.add(("child", child.name))
+    if (prev := anchor.find_previous_sibling()) is not None:
+        features.add(("prev", prev.name))
+        if (prev2 := prev.find_previous_sibling()) is not None:
+            features.add(("prev2", prev2.name))
+    return frozenset(features)
+
+
+class SelectorPlan:
+    """
+    附件选择器的匹配计划。
+
+    选择器只编译一次。匹配前先遍历页面中的附件链接，记录每个链接的父元素、子元素及相邻元素，
+    不满足 `ACCESSORY_TYPE_REQUIREMENTS` 的类型直接跳过，不执行查询；其余类型仍按优先级依次查询，
+    结果与逐个查询全部类型相同。每个版式分组命中的类型及查询次数计入指标。
+
+    Args:
+        selectors (list[str]): 按优先级排列的类型 1~9 选择器。
+        file_extensions (list[str]): 附件扩展名。
+    """
+
+    def __init__(self, selectors: list[str], file_extensions: list[str]):
+        if len(selectors) != len(ACCESSORY_TYPE_REQUIREMENTS):
+            raise ValueError(f"Expected {len(ACCESSORY_TYPE_REQUIREMENTS)} selectors, got {len(selectors)}.")
+        self.compiled_selectors = [soupsieve.compile(selector) for selector in selectors]
+        self.file_extensions = tuple(file_extensions)
+        self._lock = threading.Lock()
+        self._type_counts: dict[str, collections.Counter[int]] = {}
+
+    def get_viable_types(self, soup: BeautifulSoup) -> list[int]:
+        """
+        获取页面中可能匹配的类型（从 1 开始），按优先级排列。
+        """
+
+        anchor_features = {
+            get_anchor_features(anchor)
+            for anchor in soup.find_all("a", href=True)
+            if anchor["href"].endswith(self.file_extensions)
+        }
+        return [
+            selector_type
+            for selector_type, requirements in enumerate(ACCESSORY_TYPE_REQUIREMENTS, start=1)
+            if any(requirements <= features for features in anchor_features)
+        ]
+
+    def match(self, url: str, soup: BeautifulSoup) -> tuple[int | None, list[Tag]]:
+        """
+        按优先级查找第一个有匹配元素的类型。
+
+        Args:
+            url (str): 页面 url，用于统计版式分组。
+            soup (BeautifulSoup): 页面。
+        Returns:
+            tuple[int | None, list[Tag]]: 匹配的类型（从 1 开始）及匹配的元素，没有匹配时为 `(None, [])`。
+        """
+
+        viable_types = self.get_viable_types(soup)
+        metrics.increment("selector_queries", len(self.compiled_selectors) - len(viable_types), result="skipped")
+
+        for selector_type in viable_types:
+            if elements := self.compiled_selectors[selector_type - 1].select(soup):
+                metrics.increment("selector_queries", result="matched")
+                self.record(url, selector_type)
+                return selector_type, elements
+            metrics.increment("selector_queries", result="failed")
+        return None, []
+
+    def record(self, url: str, selector_type: int) -> None:
+        layout_key = get_layout_key(url)
+        with self._lock:
+            self._type_counts.setdefault(layout_key, collections.Counter())[selector_type] += 1
+        metrics.increment("selector_matches", type=str(selector_type), layout=layout_key)
+
+    def get_stats(self) -> dict[str, dict[int, int]]:
+        """
+        各版式分组命中的类型及次数。
+        """
+
+        with self._lock:
+            return {layout_key: dict(counts.most_common()) for layout_key, counts in sorted(self._type_counts.items())}
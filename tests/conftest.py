@@ -0,0 +1,10 @@
+from __future__ import annotations
+
+import os
+import sys
+
+
+# 测试直接导入仓库根目录下的模块
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import os
+import zipfile
+
+import pytest
+
+from archives import (
+    ARCHIVE_EXTRACT_DIR,
+    ARCHIVE_STATUS_EXPANDED,
+    ARCHIVE_STATUS_UNCHANGED,
+    expand_archive,
+    get_extract_dir,
+)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("guidences", "2024-01-01"))
+    return tmp_path
+
+
+def test_extract_dir_keeps_extension():
+    zip_dir = get_extract_dir(os.path.join("guidences", "2024-01-01", "附件.zip"))
+    rar_dir = get_extract_dir(os.path.join("guidences", "2024-01-01", "附件.rar"))
+
+    assert zip_dir == os.path.join(ARCHIVE_EXTRACT_DIR, "2024-01-01", "附件.zip")
+    assert zip_dir != rar_dir
+
+
+def test_archive_is_expanded_outside_guidences():
+    save_path = os.path.join("guidences", "2024-01-01", "附件.zip")
+    with zipfile.ZipFile(save_path, "w") as archive:
+        archive.writestr("1.doc", b"1" * 100)
+        archive.writestr("目录/2.pdf", b"2" * 100)
+
+    result = expand_archive(save_path)
+
+    assert result.status == ARCHIVE_STATUS_EXPANDED
+    assert [member.name for member in result.members] == ["1.doc", "目录/2.pdf"]
+    for member in result.members:
+        assert os.path.isfile(os.path.join(get_extract_dir(save_path), *member.name.split("/")))
+    # 附件目录中只有压缩包本身
+    assert os.listdir(os.path.join("guidences", "2024-01-01")) == ["附件.zip"]
+    assert expand_archive(save_path).status == ARCHIVE_STATUS_UNCHANGED
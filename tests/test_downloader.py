@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import queue
+
+from collections.abc import AsyncIterator
+
+import pytest
+
+from aiohttp import web
+
+from downloader import (
+    DOWNLOAD_STATUS_DOWNLOADED,
+    DOWNLOAD_STATUS_FAILED,
+    DOWNLOAD_STATUS_NOT_MODIFIED,
+    DOWNLOAD_STATUS_SKIPPED,
+    PART_FILE_SUFFIX,
+    DownloadState,
+    download_from_queue,
+    get_download_state_path,
+    read_download_state,
+    write_download_state,
+)
+from utils import Accessory
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """
+    在临时目录中运行，下载的附件及下载状态写入临时目录。
+    """
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("guidences", "2024-01-01"))
+    return tmp_path
+
+
+def make_accessory(href: str, title: str) -> Accessory:
+    accessory = Accessory("", title, "下载", href, "")
+    accessory.purified_title = title
+    accessory.is_valid = True
+    accessory.is_link_available = True
+    return accessory
+
+
+class FileServer:
+    """
+    测试用的附件服务器，支持 Range、If-Range 及 If-None-Match，响应分块发送以便多个下载相互重叠。
+    """
+
+    def __init__(self, files: dict[str, bytes], chunk_size: int = 1024, chunk_delay: float = 0.01):
+        self.files = files
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.requests: list[tuple[str, dict[str, str]]] = []
+        self.base_url = ""
+
+    @staticmethod
+    def get_etag(path: str) -> str:
+        return f'"{path.strip("/")}"'
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append((request.path, dict(request.headers)))
+        if (body := self.files.get(request.path)) is None:
+            return web.Response(status=404)
+        etag = self.get_etag(request.path)
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        status, start = 200, 0
+        range_header = request.headers.get("Range", "")
+        if range_header.startswith("bytes=") and request.headers.get("If-Range", etag) == etag:
+            start = int(range_header[len("bytes=") :].rstrip("-"))
+            if start >= len(body):
+                return web.Response(status=416, headers={"Content-Range": f"bytes */{len(body)}"})
+            status = 206
+
+        response = web.StreamResponse(status=status, headers={"ETag": etag})
+        response.content_length = len(body) - start
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        await response.prepare(request)
+        for offset in range(start, len(body), self.chunk_size):
+            await response.write(body[offset : offset + self.chunk_size])
+            await asyncio.sleep(self.chunk_delay)
+        await response.write_eof()
+        return response
+
+    @contextlib.asynccontextmanager
+    async def serve(self) -> AsyncIterator[FileServer]:
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        try:
+            yield self
+        finally:
+            await runner.cleanup()
+
+
+async def download_all(server: FileServer, items: list[tuple[Accessory, str]]) -> list:
+    accessory_queue: queue.Queue = queue.Queue()
+    for item in items:
+        accessory_queue.put(item)
+    accessory_queue.put(None)
+    async with server.serve():
+        for accessory, _ in items:
+            accessory.anchor_href = server.base_url + accessory.anchor_href
+        return await download_from_queue(accessory_queue, timeout=10)
+
+
+def test_same_title_accessories_are_downloaded_once():
+    server = FileServer({"/a.docx": b"a" * 16 * 1024, "/b.docx": b"b" * 16 * 1024})
+    save_dir = os.path.join("guidences", "2024-01-01")
+    items = [
+        (make_accessory("/a.docx", "附件.docx"), save_dir),
+        (make_accessory("/b.docx", "附件.docx"), save_dir),
+    ]
+
+    results = asyncio.run(download_all(server, items))
+
+    assert sorted(result.status for result in results) == [DOWNLOAD_STATUS_DOWNLOADED, DOWNLOAD_STATUS_SKIPPED]
+    assert not any(result.error for result in results)
+    downloaded = next(result for result in results if result.status == DOWNLOAD_STATUS_DOWNLOADED)
+    with open(os.path.join(save_dir, "附件.docx"), "rb") as f:
+        assert f.read() == server.files[downloaded.url.removeprefix(server.base_url)]
+    assert not os.path.exists(os.path.join(save_dir, "附件.docx" + PART_FILE_SUFFIX))
+    assert len(server.requests) == 1
+
+
+async def download_one(server: FileServer, path: str, prepare=None) -> tuple:
+    """
+    下载单个附件，`prepare(url, save_path)` 在服务器启动后、下载前调用，用于准备已有文件及下载状态。
+    """
+
+    save_dir = os.path.join("guidences", "2024-01-01")
+    accessory = make_accessory(path, os.path.basename(path))
+    save_path = os.path.join(save_dir, accessory.purified_title)
+    async with server.serve():
+        accessory.anchor_href = server.base_url + path
+        if prepare is not None:
+            prepare(accessory.anchor_href, save_path)
+        accessory_queue: queue.Queue = queue.Queue()
+        accessory_queue.put((accessory, save_dir))
+        accessory_queue.put(None)
+        (result,) = await download_from_queue(accessory_queue, timeout=10)
+    return result, save_path
+
+
+def test_part_file_is_resumed_with_range():
+    body = bytes(range(256)) * 64
+    server = FileServer({"/a.pdf": body})
+
+    def prepare(url: str, save_path: str) -> None:
+        with open(save_path + PART_FILE_SUFFIX, "wb") as f:
+            f.write(body[:5000])
+        write_download_state(
+            get_download_state_path(save_path),
+            DownloadState(url=url, etag=server.get_etag("/a.pdf"), content_length=len(body), bytes_written=5000),
+        )
+
+    result, save_path = asyncio.run(download_one(server, "/a.pdf", prepare))
+
+    assert result.status == DOWNLOAD_STATUS_DOWNLOADED
+    assert result.status_code == 206
+    assert result.resumed_from == 5000
+    assert server.requests[0][1]["Range"] == "bytes=5000-"
+    assert server.requests[0][1]["If-Range"] == server.get_etag("/a.pdf")
+    with open(save_path, "rb") as f:
+        assert f.read() == body
+    state = read_download_state(get_download_state_path(save_path))
+    assert state.bytes_written == len(body)
+    assert state.sha256 == hashlib.sha256(body).hexdigest()
+
+
+def test_unchanged_file_is_not_modified():
+    body = b"x" * 4096
+    server = FileServer({"/a.doc": body})
+
+    def prepare(url: str, save_path: str) -> None:
+        with open(save_path, "wb") as f:
+            f.write(body)
+        write_download_state(
+            get_download_state_path(save_path),
+            DownloadState(url=url, etag=server.get_etag("/a.doc"), content_length=len(body), bytes_written=len(body)),
+        )
+
+    result, save_path = asyncio.run(download_one(server, "/a.doc", prepare))
+
+    assert result.status == DOWNLOAD_STATUS_NOT_MODIFIED
+    assert result.status_code == 304
+    assert result.bytes == 0
+    assert server.requests[0][1]["If-None-Match"] == server.get_etag("/a.doc")
+    assert "Range" not in server.requests[0][1]
+    with open(save_path, "rb") as f:
+        assert f.read() == body
+
+
+def test_complete_part_file_is_kept_on_416():
+    body = b"y" * 4096
+    server = FileServer({"/a.xls": body})
+
+    def prepare(url: str, save_path: str) -> None:
+        with open(save_path + PART_FILE_SUFFIX, "wb") as f:
+            f.write(body)
+        write_download_state(
+            get_download_state_path(save_path),
+            DownloadState(url=url, etag=server.get_etag("/a.xls"), content_length=len(body), bytes_written=len(body)),
+        )
+
+    result, save_path = asyncio.run(download_one(server, "/a.xls", prepare))
+
+    assert result.status == DOWNLOAD_STATUS_DOWNLOADED
+    assert not result.error
+    assert server.requests[0][1]["Range"] == f"bytes={len(body)}-"
+    assert not os.path.exists(save_path + PART_FILE_SUFFIX)
+    with open(save_path, "rb") as f:
+        assert f.read() == body
+
+
+def test_missing_file_fails_with_status_code():
+    server = FileServer({})
+
+    result, save_path = asyncio.run(download_one(server, "/missing.doc"))
+
+    assert result.status == DOWNLOAD_STATUS_FAILED
+    assert result.status_code == 404
+    assert result.error == "status code: 404"
+    assert not os.path.exists(save_path)
@@ -0,0 +1,57 @@
+"""
+HTTP 后端与 selenium 后端解析结果的一致性。
+
+`fixtures/pages/` 下按 url 路径保存发布页 HTML，如 `www.cmde.org.cn/flfg/zdyz/zqyjg/20241128091030130.html`
+对应 `https://www.cmde.org.cn/flfg/zdyz/zqyjg/20241128091030130.html`。页面为 `utils.py` 中各类型选择器注释所列
+的示例页面，期望结果为 selenium 后端获取并保存在 `guidences.pickle` 中的附件。
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+
+import pytest
+
+from utils import Accessory, get_accessories_from_html, read_pickle_file
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIXTURE_PAGES_DIR = os.path.join(REPO_ROOT, "tests", "fixtures", "pages")
+
+FIXTURE_PAGE_PATHS = sorted(glob.glob(os.path.join(FIXTURE_PAGES_DIR, "**", "*.html"), recursive=True))
+
+
+def get_fixture_url(file_path: str) -> str:
+    return "https://" + os.path.relpath(file_path, FIXTURE_PAGES_DIR).replace(os.sep, "/")
+
+
+def get_candidates(accessory: Accessory) -> tuple[str, str, str, str, str]:
+    return (
+        accessory.content,
+        accessory.anchor_title,
+        accessory.anchor_content,
+        accessory.anchor_href,
+        accessory.anchor_text_value,
+    )
+
+
+@pytest.fixture(scope="module")
+def stored_pages() -> dict[str, list[Accessory]]:
+    return {page.url: page.accessories for page in read_pickle_file(os.path.join(REPO_ROOT, "guidences.pickle"))}
+
+
+def test_fixture_pages_exist():
+    assert len(FIXTURE_PAGE_PATHS) >= 9
+
+
+@pytest.mark.parametrize("file_path", FIXTURE_PAGE_PATHS, ids=get_fixture_url)
+def test_http_backend_matches_selenium(file_path: str, stored_pages: dict[str, list[Accessory]]):
+    url = get_fixture_url(file_path)
+    with open(file_path, "rb") as f:
+        accessories = get_accessories_from_html(url, f.read())
+
+    assert [get_candidates(accessory) for accessory in accessories] == [
+        get_candidates(accessory) for accessory in stored_pages[url]
+    ]
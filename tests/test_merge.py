@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import datetime
+import os
+import pickle
+
+from catalog import Catalog
+from utils import (
+    Accessory,
+    ArchiveMember,
+    ChangeSet,
+    GuidencePublishPage,
+    get_accessory_fields,
+    get_page_digest,
+    merge_accessories,
+    merge_pages,
+    read_pickle_file,
+    update_pickle_file,
+)
+
+
+PAGE_URL = "https://www.cmde.org.cn/flfg/zdyz/zqyjg/20240101000000000.html"
+
+
+def make_accessory(name: str, title: str | None = None) -> Accessory:
+    return Accessory(
+        "",
+        title or f"{name}注册审查指导原则.docx",
+        "下载",
+        f"https://www.cmde.org.cn/directory/web/cmde/images/{name}.docx",
+        "",
+    )
+
+
+def make_page(accessories: list[Accessory], url: str = PAGE_URL, title: str = "指导原则") -> GuidencePublishPage:
+    return GuidencePublishPage(title, url, datetime.date(2024, 1, 1), accessories)
+
+
+def get_hrefs(accessories: list[tuple[str, Accessory]] | list[Accessory]) -> list[str]:
+    return [(item[1] if isinstance(item, tuple) else item).anchor_href for item in accessories]
+
+
+def test_merge_unchanged_accessories():
+    change_set = ChangeSet()
+    old = [make_accessory("a"), make_accessory("b")]
+
+    merged, changed = merge_accessories(PAGE_URL, old, [make_accessory("a"), make_accessory("b")], change_set)
+
+    assert not changed
+    assert get_hrefs(merged) == get_hrefs(old)
+    assert not change_set.added_accessories
+    assert not change_set.updated_accessories
+    assert not change_set.removed_accessories
+
+
+def test_merge_added_removed_and_updated_accessories():
+    change_set = ChangeSet()
+    old = [make_accessory("a"), make_accessory("b"), make_accessory("c")]
+    new = [make_accessory("c", "新标题.docx"), make_accessory("a"), make_accessory("d")]
+
+    merged, changed = merge_accessories(PAGE_URL, old, new, change_set)
+
+    assert changed
+    # 保留旧附件的顺序，新附件追加在末尾
+    assert get_hrefs(merged) == get_hrefs([old[0], old[2], new[2]])
+    assert merged[1].purified_title == "新标题.docx"
+    assert get_hrefs(change_set.added_accessories) == get_hrefs([new[2]])
+    assert get_hrefs(change_set.updated_accessories) == get_hrefs([new[0]])
+    assert get_hrefs(change_set.removed_accessories) == get_hrefs([old[1]])
+
+
+def test_merge_keeps_archive_members_when_not_expanded():
+    change_set = ChangeSet()
+    old = make_accessory("a")
+    old.members = (ArchiveMember("a/1.doc", 10, "0" * 64),)
+
+    merged, changed = merge_accessories(PAGE_URL, [old], [make_accessory("a")], change_set)
+
+    assert not changed
+    assert merged[0].members == old.members
+
+
+def test_merge_duplicate_href_in_old_list():
+    change_set = ChangeSet()
+    old = [make_accessory("a"), make_accessory("a"), make_accessory("b")]
+    new = [make_accessory("a"), make_accessory("b")]
+
+    merged, changed = merge_accessories(PAGE_URL, old, new, change_set)
+
+    assert changed
+    assert get_hrefs(merged) == get_hrefs(new)
+    assert get_hrefs(change_set.removed_accessories) == get_hrefs([old[1]])
+    assert not change_set.added_accessories
+
+
+def test_merge_pages_change_set():
+    unchanged = make_page([make_accessory("a")], url=PAGE_URL + "?unchanged")
+    updated = make_page([make_accessory("b")], url=PAGE_URL + "?updated")
+    old_data = [unchanged, updated]
+    new_data = [
+        make_page([make_accessory("a")], url=PAGE_URL + "?unchanged"),
+        make_page([make_accessory("b"), make_accessory("c")], url=PAGE_URL + "?updated"),
+        make_page([make_accessory("d")], url=PAGE_URL + "?added"),
+    ]
+
+    change_set = merge_pages(old_data, new_data)
+
+    assert change_set
+    assert [page.url for page in change_set.added_pages] == [PAGE_URL + "?added"]
+    assert change_set.updated_pages == [updated]
+    assert get_hrefs(change_set.added_accessories) == get_hrefs([make_accessory("c"), make_accessory("d")])
+    assert {page.date for page in change_set.added_pages + change_set.updated_pages} == change_set.changed_dates
+    # 合并时计算摘要
+    assert all(page.digest == get_page_digest(page) for page in old_data)
+    assert len(old_data) == 3
+
+
+def assert_same_pages(actual: list[GuidencePublishPage], expected: list[GuidencePublishPage]) -> None:
+    assert [(page.title, page.url, page.date, page.digest) for page in actual] == [
+        (page.title, page.url, page.date, page.digest) for page in expected
+    ]
+    for actual_page, expected_page in zip(actual, expected):
+        assert [get_accessory_fields(accessory) for accessory in actual_page.accessories] == [
+            get_accessory_fields(accessory) for accessory in expected_page.accessories
+        ]
+
+
+def test_pickle_sqlite_round_trip(tmp_path):
+    archive = make_accessory("c", "压缩包.zip")
+    archive.anchor_href = archive.anchor_href.replace(".docx", ".zip")
+    archive.members = (ArchiveMember("1.doc", 10, "1" * 64), ArchiveMember("目录/2.pdf", 20, "2" * 64))
+    pages = [
+        make_page([make_accessory("a"), make_accessory("b"), archive]),
+        GuidencePublishPage("旧指导原则", PAGE_URL + "?old", datetime.date(2010, 2, 12), [make_accessory("e")]),
+        GuidencePublishPage("无附件", PAGE_URL + "?empty", datetime.date(2015, 4, 30), []),
+    ]
+    pickle_path = os.path.join(tmp_path, "guidences.pickle")
+    catalog_path = os.path.join(tmp_path, "guidences.db")
+    exported_path = os.path.join(tmp_path, "exported.pickle")
+
+    update_pickle_file(pages, pickle_path)
+    expected = read_pickle_file(pickle_path)
+
+    with Catalog(catalog_path) as catalog:
+        catalog.import_pickle(pickle_path)
+    with Catalog(catalog_path) as catalog:
+        assert len(catalog) == len(pages)
+        assert_same_pages(catalog.load_pages(), expected)
+        catalog.export_pickle(exported_path)
+
+    assert_same_pages(read_pickle_file(exported_path), expected)
+    with open(pickle_path, "rb") as f, open(exported_path, "rb") as g:
+        assert pickle.load(f) == pickle.load(g)
+
+    # 再次导入相同的数据不产生变化
+    with Catalog(catalog_path) as catalog:
+        assert not catalog.upsert_pages(read_pickle_file(exported_path))
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import contextlib
+import datetime
+import http.server
+import os
+import threading
+
+from collections.abc import Iterator
+
+import pytest
+import requests
+
+import utils
+
+from page_cache import PageCache
+from utils import BACKEND_HTTP, GuidencePublishPage, fetch_accessory
+
+
+FIXTURE_PAGE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "fixtures",
+    "pages",
+    "www.cmde.org.cn",
+    "flfg",
+    "zdyz",
+    "zqyjg",
+    "20241128091030130.html",
+)
+
+EMPTY_PAGE = b"<html><body><div class='pages_content'></div></body></html>"
+
+
+class PageServer:
+    """
+    测试用的页面服务器，支持 If-None-Match，记录每个请求的路径及请求头。
+    """
+
+    def __init__(self, pages: dict[str, bytes]):
+        self.pages = pages
+        self.requests: list[tuple[str, dict[str, str]]] = []
+        self.base_url = ""
+
+    def get_etag(self, path: str) -> str:
+        return f'"{hash(self.pages[path])}"'
+
+    @contextlib.contextmanager
+    def serve(self) -> Iterator[PageServer]:
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                server.requests.append((self.path, dict(self.headers)))
+                if (body := server.pages.get(self.path)) is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = server.get_etag(self.path)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        self.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        try:
+            yield self
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+@pytest.fixture
+def page_cache(tmp_path):
+    cache = PageCache(os.path.join(tmp_path, "pages"))
+    utils.set_page_cache(cache)
+    yield cache
+    utils.set_page_cache(None)
+
+
+def test_fresh_page_is_served_from_cache(page_cache):
+    server = PageServer({"/a.html": b"old"})
+    with server.serve(), requests.Session() as session:
+        url = server.base_url + "/a.html"
+        assert page_cache.get(url, session) == b"old"
+        server.pages["/a.html"] = b"new"
+        assert page_cache.get(url, session) == b"old"
+
+    assert len(server.requests) == 1
+
+
+def test_revalidate_ignores_ttl(page_cache):
+    server = PageServer({"/a.html": b"old"})
+    with server.serve(), requests.Session() as session:
+        url = server.base_url + "/a.html"
+        etag = server.get_etag("/a.html")
+        page_cache.get(url, session)
+
+        # 未变化时发送条件请求并沿用缓存
+        assert page_cache.get(url, session, revalidate=True) == b"old"
+        assert server.requests[1][1]["If-None-Match"] == etag
+
+        server.pages["/a.html"] = b"new"
+        assert page_cache.get(url, session, revalidate=True) == b"new"
+        assert page_cache.peek(url) == b"new"
+
+    assert len(server.requests) == 3
+
+
+def test_fetch_accessory_revalidates_refreshed_page(page_cache):
+    with open(FIXTURE_PAGE_PATH, "rb") as f:
+        fixture_page = f.read()
+    server = PageServer({"/page.html": EMPTY_PAGE})
+    with server.serve():
+        page = GuidencePublishPage("指导原则", server.base_url + "/page.html", datetime.date(2024, 11, 28), [])
+        fetch_accessory(page, BACKEND_HTTP)
+        assert not page.accessories
+
+        server.pages["/page.html"] = fixture_page
+        # 未过期的缓存直接解析，不发送请求
+        fetch_accessory(page, BACKEND_HTTP)
+        assert not page.accessories
+        assert len(server.requests) == 1
+
+        fetch_accessory(page, BACKEND_HTTP, revalidate=True)
+        assert page.accessories
+        assert len(server.requests) == 2
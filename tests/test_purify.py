@@ -0,0 +1,208 @@
+"""
+`purify.json` 及预编译正则表达式与原先 `Accessory` 中逐次编译的正则表达式链的一致性。
+
+`legacy_*` 函数为移入 `purify.py` 之前 `Accessory.get_purified_title` 及 `Accessory.__post_init__` 的实现，
+对 `guidences.pickle` 中全部附件及其变体，两者计算的文件名、是否过滤及链接是否失效应完全相同。
+"""
+
+from __future__ import annotations
+
+import os
+import re
+
+import pytest
+
+from purify import MANUAL_FILTER_HREF_SET, MANUAL_PURIFIED_TITLE_DICT, is_filtered, is_link_not_available, purify_title
+from utils import read_pickle_file
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def legacy_purify_title(
+    content: str, anchor_title: str, anchor_content: str, anchor_href: str, anchor_text_value: str
+) -> str:
+    # 拆分文件名和扩展名
+    _, file_extension = os.path.splitext(anchor_href)
+    file_extension_without_dot = file_extension[1:]
+
+    # 需手动处理的文件名
+    dict_manual_purified_title = dict(
+        (
+            (
+                "https://www.cmde.org.cn/images/1357709569187.doc",
+                "医用磁共振成像系统注册申报资料指导原则（征求意见稿）.doc",
+            ),
+            (
+                "https://www.cmde.org.cn/directory/web/cmde/images/1359083546574.doc",
+                "医用磁共振成像系统注册申报资料指导原则（征求意见稿）.doc",
+            ),
+            (
+                "https://www.cmde.org.cn/images/1352957627987.doc",
+                "疝修补补片产品注册技术审查指导原则（征求意见稿）.doc",
+            ),
+            (
+                "https://www.cmde.org.cn/images/1352957200488.doc",
+                "硬性角膜接触镜说明书编写指导原则（征求意见稿） & 软性亲水接触镜说明书编写指导原则（第三次征求意见稿）.doc",
+            ),
+            (
+                "https://www.cmde.org.cn/images/1347517435279.doc",
+                "乙型肝炎病毒DNA定量检测试剂注册申报资料技术指导原则.doc",
+            ),
+        )
+    )
+
+    if anchor_href in dict_manual_purified_title:
+        purified_title = dict_manual_purified_title[anchor_href]
+        return purified_title
+
+    # 定义预处理正则表达式
+    regex_preprocess_list = [
+        (re.compile(r"^(相关)?附件[：]?"), ""),
+        (re.compile(r"^[一二三四五六七八九十]*\d*[：:、．\.]?"), ""),
+        (re.compile(r"\("), "（"),
+        (re.compile(r"\)"), "）"),
+        (re.compile(rf"{file_extension_without_dot}$"), ""),
+    ]
+
+    for pattern, repl in regex_preprocess_list:
+        content = re.sub(pattern, repl, content)
+        anchor_title = re.sub(pattern, repl, anchor_title)
+        anchor_content = re.sub(pattern, repl, anchor_content)
+        anchor_text_value = re.sub(pattern, repl, anchor_text_value)
+
+    purified_title: str = ""
+
+    if re.search(r"通告(\d+号)?附件", anchor_title):
+        purified_title = content or anchor_text_value
+    elif re.search(r"^附件\d+征求意见稿", anchor_title):
+        purified_title = content or anchor_text_value
+    elif re.search(rf"^(附件)?\d*\.{file_extension_without_dot}$", anchor_title):
+        purified_title = content or anchor_text_value
+    elif anchor_title == "下载":
+        purified_title = content or anchor_text_value
+    elif anchor_title == "":
+        purified_title = content or anchor_text_value
+    else:
+        purified_title = anchor_title
+
+    if not purified_title or "\n" in purified_title:
+        purified_title = anchor_content
+
+    purified_title = re.sub(
+        r"(.*(\n))*^(\d+年通告\d+号)?\s*(附件)?([-：．:\.\d\s]*)?(?!项)", "", purified_title, 0, re.M
+    )
+    purified_title = re.sub(r"（?下载）?", "", purified_title)
+    purified_title = re.sub(r"^[（）]", "", purified_title)
+    if not re.search(r"（[^（）]+）$", purified_title):
+        purified_title = re.sub(r"[（）]$", "", purified_title)
+    purified_title = re.sub(
+        rf"^《(.+)》\s*(（(?:第.+次)?征求意见稿）)?\s*(\.{file_extension_without_dot})?$", r"\1\2\3", purified_title
+    )
+    purified_title = re.sub(r"[\\/:*?\"<>|]", "-", purified_title)
+
+    if not purified_title.endswith(file_extension):
+        purified_title_body = os.path.splitext(purified_title)[0]
+        purified_title = purified_title_body + file_extension
+
+    if purified_title.replace(file_extension, "") == "":
+        purified_title = f"未获取产品名-指导原则.{file_extension}"
+
+    return purified_title
+
+
+def legacy_is_filtered(purified_title: str, anchor_href: str) -> bool:
+    regex_filter_title_list = [
+        re.compile(r"意见表"),
+        re.compile(r"建议表"),
+        re.compile(r"信息征集"),
+        re.compile(r"意见(反馈|征集)表"),
+        re.compile(r"联系方式"),
+        re.compile(r"修(改|订)说明"),
+    ]
+    if any([regex.search(purified_title) for regex in regex_filter_title_list]):
+        return True
+
+    dict_manual_filter_title = (
+        "https://www.cmde.org.cn/directory/web/cmde/images/1363159189788.docx",
+        "https://www.cmde.org.cn/directory/web/cmde/images/1359083557479.doc",
+    )
+    return anchor_href in dict_manual_filter_title
+
+
+def legacy_is_link_not_available(anchor_href: str) -> bool:
+    return bool(re.match(re.compile(r"^https?://www.sf?da.gov.cn/.*$"), anchor_href))
+
+
+# 覆盖各分支的边界情况：`(content, anchor_title, anchor_content, anchor_href, anchor_text_value)`
+EDGE_CASES = [
+    ("", "", "", "https://www.cmde.org.cn/a.doc", ""),
+    ("", "下载", "附件1 牙科粘接剂产品注册审查指导原则.docx", "https://www.cmde.org.cn/a.docx", ""),
+    ("附件：", "2023年通告32号附件1", "", "https://www.cmde.org.cn/a.doc", "附件1牙科种植体系统.doc"),
+    ("", "附件2征求意见稿", "意见反馈表", "https://www.cmde.org.cn/a.doc", "意见反馈表.doc"),
+    ("", "附件3.rar", "附件3.7项体外诊断试剂修订指导原则.rar", "https://www.cmde.org.cn/a.rar", ""),
+    ("\n特此通告。\n \n附件：\n1.核酸检测试剂注册审查指导原则（下载）", "", "", "https://www.cmde.org.cn/a.pdf", ""),
+    ("", "《有源医疗器械》（第二次征求意见稿）.doc", "", "https://www.cmde.org.cn/a.doc", ""),
+    ("", "相关附件：一、指导原则(修订说明)", "", "https://www.cmde.org.cn/a.wps", ""),
+    ("", 'a/b:c*d?e"f<g>h|i', "", "https://www.cmde.org.cn/a", ""),
+    ("", "指导原则", "", "http://www.sda.gov.cn/a.doc", ""),
+    ("", "指导原则", "", "https://www.sfda.gov.cn/a.doc", ""),
+    ("", "联系方式", "", "https://www.cmde.org.cn/a.xls", ""),
+    *(("", "", "", href, "") for href in (*MANUAL_PURIFIED_TITLE_DICT, *MANUAL_FILTER_HREF_SET)),
+]
+
+
+def get_cases() -> list[tuple[str, str, str, str, str]]:
+    """
+    `guidences.pickle` 中全部附件的文本字段，以及 anchor_title 替换为各分支取值的变体。
+    """
+
+    cases = set(EDGE_CASES)
+    for page in read_pickle_file(os.path.join(REPO_ROOT, "guidences.pickle")):
+        for accessory in page.accessories:
+            fields = (
+                accessory.content,
+                accessory.anchor_title,
+                accessory.anchor_content,
+                accessory.anchor_href,
+                accessory.anchor_text_value,
+            )
+            cases.add(fields)
+            extension = os.path.splitext(accessory.anchor_href)[1]
+            for anchor_title in ("", "下载", f"附件1{extension}", "通告12号附件"):
+                cases.add((fields[0], anchor_title, *fields[2:]))
+            cases.add(("", "", *fields[2:]))
+    return sorted(cases)
+
+
+@pytest.fixture(scope="module")
+def cases() -> list[tuple[str, str, str, str, str]]:
+    return get_cases()
+
+
+def test_purify_title_matches_legacy(cases):
+    assert len(cases) > 1000
+    mismatches = [case for case in cases if purify_title(*case) != legacy_purify_title(*case)]
+    assert not mismatches
+
+
+def test_filters_match_legacy(cases):
+    mismatches = []
+    for case in cases:
+        anchor_href = case[3]
+        purified_title = legacy_purify_title(*case)
+        if is_filtered(purified_title, anchor_href) != legacy_is_filtered(purified_title, anchor_href):
+            mismatches.append(case)
+        if is_link_not_available(anchor_href) != legacy_is_link_not_available(anchor_href):
+            mismatches.append(case)
+    assert not mismatches
+
+
+def test_purify_json_matches_legacy():
+    assert MANUAL_FILTER_HREF_SET == {
+        "https://www.cmde.org.cn/directory/web/cmde/images/1363159189788.docx",
+        "https://www.cmde.org.cn/directory/web/cmde/images/1359083557479.doc",
+    }
+    assert {href: legacy_purify_title("", "", "", href, "") for href in MANUAL_PURIFIED_TITLE_DICT} == (
+        MANUAL_PURIFIED_TITLE_DICT
+    )
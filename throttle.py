@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+import time
+
+from collections.abc import AsyncIterator, Iterator
+from urllib.parse import urlsplit
+
+
+# 每个主机每秒允许发起的请求数
+DEFAULT_RATE = 10.0
+
+# 令牌桶容量，允许的瞬时突发请求数
+DEFAULT_BURST = 10
+
+# 每个主机的初始、最小及最大并发请求数
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MIN_CONCURRENCY = 1
+DEFAULT_MAX_CONCURRENCY = 16
+
+# 请求耗时超过该值（秒）时不再增加并发数
+DEFAULT_LATENCY_THRESHOLD = 5.0
+
+# 请求失败时并发数乘以该系数
+DEFAULT_DECREASE_FACTOR = 0.5
+
+# 两次降低并发数之间的最短间隔（秒），避免同一批失败的请求连续降低并发数
+DECREASE_COOLDOWN = 1.0
+
+# 异步等待并发名额时的轮询间隔（秒）
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶，以 `rate` 的速率补充令牌，最多积累 `burst` 个令牌。
+
+    Args:
+        rate (float): 每秒补充的令牌数。
+        burst (int): 令牌桶容量。
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        预订一个令牌，返回令牌可用前需要等待的时间（秒）。
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self) -> None:
+        if delay := self.reserve():
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        if delay := self.reserve():
+            await asyncio.sleep(delay)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD（加性增、乘性减）并发控制器。
+
+    请求成功且耗时不超过 `latency_threshold` 时，并发数每轮增加 1（每个成功的请求增加 1 / 当前并发数）；
+    请求失败（5xx、超时、连接错误）时，并发数乘以 `decrease_factor`，`DECREASE_COOLDOWN` 内最多降低一次。
+
+    Args:
+        initial (int): 初始并发数。
+        minimum (int): 最小并发数。
+        maximum (int): 最大并发数。
+        latency_threshold (float): 允许增加并发数的最长请求耗时（秒）。
+        decrease_factor (float): 请求失败时并发数乘以的系数。
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_INITIAL_CONCURRENCY,
+        minimum: int = DEFAULT_MIN_CONCURRENCY,
+        maximum: int = DEFAULT_MAX_CONCURRENCY,
+        latency_threshold: float = DEFAULT_LATENCY_THRESHOLD,
+        decrease_factor: float = DEFAULT_DECREASE_FACTOR,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_threshold = latency_threshold
+        self.decrease_factor = decrease_factor
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._last_decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        while not self.try_acquire():
+            await asyncio.sleep(ASYNC_POLL_INTERVAL)
+
+    def release(self, success: bool, latency: float) -> None:
+        """
+        释放并发名额，并根据请求结果调整并发数。
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+            if not success:
+                now = time.monotonic()
+                if now - self._last_decreased_at >= DECREASE_COOLDOWN:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decreased_at = now
+            elif latency <= self.latency_threshold:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class Ticket:
+    """
+    一次受限请求的凭证，用于报告请求结果。请求中抛出异常时自动视为失败。
+    """
+
+    def __init__(self):
+        self.success = True
+
+    def record_status(self, status_code: int | None) -> None:
+        """
+        根据 HTTP 状态码记录请求结果，5xx 视为失败。
+        """
+
+        if status_code is not None and status_code >= 500:
+            self.success = False
+
+    def fail(self) -> None:
+        self.success = False
+
+
+class HostThrottle:
+    """
+    单个主机的请求限制：令牌桶限制请求速率，`AdaptiveLimiter` 限制并发数。
+    """
+
+    def __init__(self, bucket: TokenBucket, limiter: AdaptiveLimiter):
+        self.bucket = bucket
+        self.limiter = limiter
+
+    @contextlib.contextmanager
+    def request(self) -> Iterator[Ticket]:
+        self.limiter.acquire()
+        ticket = Ticket()
+        try:
+            self.bucket.acquire()
+            start_time = time.monotonic()
+            yield ticket
+        except BaseException:
+            ticket.fail()
+            raise
+        finally:
+            self.limiter.release(ticket.success, time.monotonic() - start_time if ticket.success else 0.0)
+
+    @contextlib.asynccontextmanager
+    async def request_async(self) -> AsyncIterator[Ticket]:
+        await self.limiter.acquire_async()
+        ticket = Ticket()
+        try:
+            await self.bucket.acquire_async()
+            start_time = time.monotonic()
+            yield ticket
+        except BaseException:
+            ticket.fail()
+            raise
+        finally:
+            self.limiter.release(ticket.success, time.monotonic() - start_time if ticket.success else 0.0)
+
+
+# 各主机共用的请求限制参数
+throttle_settings: dict[str, float] = {
+    "rate": DEFAULT_RATE,
+    "burst": DEFAULT_BURST,
+    "initial": DEFAULT_INITIAL_CONCURRENCY,
+    "maximum": DEFAULT_MAX_CONCURRENCY,
+}
+host_throttles: dict[str, HostThrottle] = {}
+host_throttles_lock = threading.Lock()
+
+
+def configure_throttle(
+    rate: float = DEFAULT_RATE,
+    burst: int = DEFAULT_BURST,
+    initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> None:
+    """
+    设置请求限制参数，只对之后第一次请求的主机生效。
+    """
+
+    with host_throttles_lock:
+        throttle_settings.update(
+            rate=rate, burst=burst, initial=min(initial_concurrency, max_concurrency), maximum=max_concurrency
+        )
+
+
+def get_throttle(url: str) -> HostThrottle:
+    """
+    获取 url 所在主机的请求限制，浏览器访问、页面请求及附件下载共用同一主机的限制。
+    """
+
+    host = urlsplit(url).netloc
+    with host_throttles_lock:
+        if (host_throttle := host_throttles.get(host)) is None:
+            host_throttle = HostThrottle(
+                TokenBucket(throttle_settings["rate"], int(throttle_settings["burst"])),
+                AdaptiveLimiter(int(throttle_settings["initial"]), maximum=int(throttle_settings["maximum"])),
+            )
+            host_throttles[host] = host_throttle
+        return host_throttle
@@ -1,36 +1,48 @@
 from __future__ import annotations
 
+import contextlib
 import dataclasses
 import datetime
+import hashlib
 import logging
 import os
 import pickle
+import queue
 import re
-import sys
 import requests
 import threading
+import time
 
+from collections.abc import Iterator
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+from urllib.parse import urljoin
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.firefox.webdriver import WebDriver
 from selenium.webdriver.firefox.options import Options
 
-# 创建一个线程锁
-lock = threading.Lock()
+from page_cache import PageCache
+from metrics import metrics
+from purify import is_filtered, is_link_not_available, purify_title
+from selector_plan import SelectorPlan
+from throttle import get_throttle, throttle_settings
 
 # 获取根日志记录器
 logger = logging.getLogger()
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(slots=True)
 class GuidencePublishPage:
     title: str
     url: str
     date: datetime.date
     accessories: list[Accessory]
+    # 标题、日期及附件可见内容的摘要，合并或保存时计算，用于比较目录时跳过未变化的发布页
+    digest: str = ""
 
     def __eq__(self, other: GuidencePublishPage) -> bool:
         return (
@@ -40,8 +52,46 @@ class GuidencePublishPage:
             and self.accessories == other.accessories
         )
 
+    def __getstate__(self) -> tuple:
+        return self.title, self.url, self.date.toordinal(), self.accessories, self.digest
+
+    def __setstate__(self, state: tuple | dict) -> None:
+        if isinstance(state, dict):
+            # 早期版本的 pickle 文件保存实例的 __dict__
+            self.title = state["title"]
+            self.url = state["url"]
+            self.date = state["date"]
+            self.accessories = state["accessories"]
+            self.digest = ""
+        else:
+            self.title, self.url, date_ordinal, self.accessories = state[:4]
+            # 早期版本的状态中没有摘要
+            self.digest = state[4] if len(state) > 4 else ""
+            self.date = datetime.date.fromordinal(date_ordinal)
 
-@dataclasses.dataclass
+
+# 附件 pickle 状态中 flags 的各个位
+ACCESSORY_FLAG_IS_VALID = 1
+ACCESSORY_FLAG_IS_LINK_AVAILABLE = 2
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ArchiveMember:
+    """
+    压缩包附件中的一个文件。
+
+    Args:
+        name (str): 文件在压缩包中的路径，以 `/` 分隔。
+        size (int): 文件大小（字节）。
+        sha256 (str): 文件内容的 SHA-256 摘要。
+    """
+
+    name: str
+    size: int
+    sha256: str
+
+
+@dataclasses.dataclass(slots=True)
 class Accessory:
     content: str = ""
     anchor_title: str = ""
@@ -53,6 +103,9 @@ class Accessory:
     is_valid: bool = True
     is_link_available: bool = True
 
+    # 压缩包附件展开后的文件，由 `archives.expand_archives` 在下载后填充
+    members: tuple[ArchiveMember, ...] = ()
+
     def __post_init__(self):
         self.content = self.content.strip()
         self.anchor_title = self.anchor_title.strip()
@@ -70,37 +123,62 @@ class Accessory:
             and self.anchor_text_value == other.anchor_text_value
         )
 
+    def __getstate__(self) -> tuple:
+        """
+        紧凑的 pickle 状态：`(anchor_href, purified_title, flags, content, anchor_title, anchor_content,
+        anchor_text_value, members)`，`members` 为 `(name, size, sha256)` 元组，没有压缩包成员时不保存，
+        此时结尾为空的候选标题字段也不保存。
+        """
+
+        flags = (ACCESSORY_FLAG_IS_VALID if self.is_valid else 0) | (
+            ACCESSORY_FLAG_IS_LINK_AVAILABLE if self.is_link_available else 0
+        )
+        candidates = [self.content, self.anchor_title, self.anchor_content, self.anchor_text_value]
+        if self.members:
+            members = tuple((member.name, member.size, member.sha256) for member in self.members)
+            return self.anchor_href, self.purified_title, flags, *candidates, members
+        while candidates and not candidates[-1]:
+            candidates.pop()
+        return self.anchor_href, self.purified_title, flags, *candidates
+
+    def __setstate__(self, state: tuple | dict) -> None:
+        if isinstance(state, dict):
+            # 早期版本的 pickle 文件保存实例的 __dict__，更早的版本使用 anchor_text 保存附件链接的文本
+            state = dict(state)
+            if "anchor_text" in state and "anchor_content" not in state:
+                state["anchor_content"] = state.pop("anchor_text")
+            for field in dataclasses.fields(Accessory):
+                setattr(self, field.name, state.get(field.name, field.default))
+            return
+
+        self.anchor_href, self.purified_title, flags, *candidates = state
+        self.is_valid = bool(flags & ACCESSORY_FLAG_IS_VALID)
+        self.is_link_available = bool(flags & ACCESSORY_FLAG_IS_LINK_AVAILABLE)
+        members = candidates.pop() if len(candidates) > 4 else ()
+        self.members = tuple(ArchiveMember(*member) for member in members)
+        candidates += [""] * (4 - len(candidates))
+        self.content, self.anchor_title, self.anchor_content, self.anchor_text_value = candidates
+
+    def drop_candidates(self) -> None:
+        """
+        丢弃用于生成 `purified_title` 的候选标题字段，只保留链接、文件名及有效性，用于只读取目录的场景以节省内存。
+
+        丢弃后的附件不能再用于比较或合并。
+        """
+
+        self.content = self.anchor_title = self.anchor_content = self.anchor_text_value = ""
+
     def check_valid(self) -> bool:
         """
         检查附件的有效性。
         """
 
         # 非指导原则的附件
-        regex_filter_title_list = [
-            re.compile(r"意见表"),
-            re.compile(r"建议表"),
-            re.compile(r"信息征集"),
-            re.compile(r"意见(反馈|征集)表"),
-            re.compile(r"联系方式"),
-            re.compile(r"修(改|订)说明"),
-        ]
-        if any([regex.search(self.purified_title) for regex in regex_filter_title_list]):
-            logger.info(f"过滤附件：{self.purified_title}")
-            self.is_valid = False
-
-        # 需要手动处理的非指导原则附件
-        dict_manual_filter_title = (
-            "https://www.cmde.org.cn/directory/web/cmde/images/1363159189788.docx",
-            "https://www.cmde.org.cn/directory/web/cmde/images/1359083557479.doc",
-        )
-        if self.anchor_href in dict_manual_filter_title:
-            logger.info(f"过滤附件：{self.anchor_href}")
+        if is_filtered(self.purified_title, self.anchor_href):
             self.is_valid = False
 
         # 链接失效的附件
-        regex_link_not_avaliable = re.compile(r"^https?://www.sf?da.gov.cn/.*$")
-        if re.match(regex_link_not_avaliable, self.anchor_href):
-            logger.info(f"链接失效：{self.anchor_href}")
+        if is_link_not_available(self.anchor_href):
             self.is_link_available = False
 
     def get_purified_title(self) -> str:
@@ -108,122 +186,144 @@ class Accessory:
         获取附件文件名处理的结果。
         """
 
-        anchor_href = self.anchor_href
-        # 拆分文件名和扩展名
-        _, file_extension = os.path.splitext(anchor_href)
-        file_extension_without_dot = file_extension[1:]
-
-        # 需手动处理的文件名
-        dict_manual_purified_title = dict(
-            (
-                (
-                    "https://www.cmde.org.cn/images/1357709569187.doc",
-                    "医用磁共振成像系统注册申报资料指导原则（征求意见稿）.doc",
-                ),
-                (
-                    "https://www.cmde.org.cn/directory/web/cmde/images/1359083546574.doc",
-                    "医用磁共振成像系统注册申报资料指导原则（征求意见稿）.doc",
-                ),
-                (
-                    "https://www.cmde.org.cn/images/1352957627987.doc",
-                    "疝修补补片产品注册技术审查指导原则（征求意见稿）.doc",
-                ),
-                (
-                    "https://www.cmde.org.cn/images/1352957200488.doc",
-                    "硬性角膜接触镜说明书编写指导原则（征求意见稿） & 软性亲水接触镜说明书编写指导原则（第三次征求意见稿）.doc",
-                ),
-                (
-                    "https://www.cmde.org.cn/images/1347517435279.doc",
-                    "乙型肝炎病毒DNA定量检测试剂注册申报资料技术指导原则.doc",
-                ),
-            )
-        )
-
-        if anchor_href in dict_manual_purified_title:
-            purified_title = dict_manual_purified_title[anchor_href]
-            return purified_title
-
-        content = self.content
-        anchor_title = self.anchor_title
-        anchor_content = self.anchor_content
-        anchor_text_value = self.anchor_text_value
-
-        # 定义预处理正则表达式
-        regex_preprocess_list = [
-            (re.compile(r"^(相关)?附件[：]?"), ""),
-            (re.compile(r"^[一二三四五六七八九十]*\d*[：:、．\.]?"), ""),
-            (re.compile(r"\("), "（"),
-            (re.compile(r"\)"), "）"),
-            (re.compile(rf"{file_extension_without_dot}$"), ""),
-        ]
-
-        for pattern, repl in regex_preprocess_list:
-            content = re.sub(pattern, repl, content)
-            anchor_title = re.sub(pattern, repl, anchor_title)
-            anchor_content = re.sub(pattern, repl, anchor_content)
-            anchor_text_value = re.sub(pattern, repl, anchor_text_value)
-
-        purified_title: str = ""
-
-        if re.search(r"通告(\d+号)?附件", anchor_title):
-            # 如果 anchor_title 匹配 "通告\d+号附件"
-            purified_title = content or anchor_text_value
-        elif re.search(r"^附件\d+征求意见稿", anchor_title):
-            # 如果 anchor_title 匹配 "^附件\d+征求意见稿"
-            purified_title = content or anchor_text_value
-        elif re.search(rf"^(附件)?\d*\.{file_extension_without_dot}$", anchor_title):
-            # 如果 anchor_title 匹配 "^(附件)?\d+\.{file_extension_without_dot}$"
-            purified_title = content or anchor_text_value
-        elif anchor_title == "下载":
-            # 如果 anchor_title 为 "下载"
-            purified_title = content or anchor_text_value
-        elif anchor_title == "":
-            # 如果 anchor_title 为空
-            purified_title = content or anchor_text_value
-        else:
-            purified_title = anchor_title
-
-        if not purified_title or "\n" in purified_title:
-            purified_title = anchor_content
-
-        # 处理文件名中的多余字符
-        # eg.
-        # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20230511105143123.html 附件3.7项体外诊断试剂修订指导原则.rar
-        # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20230814154949121.html 2023年通告32号 附件1牙科种植体系统同品种临床评价注册审查指导原则.doc
-        # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20230309105146187.html 附件1 牙科粘接剂产品注册审查指导原则.docx
-        # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgtwsj/20230302171913174.html \n特此通告。\n \n附件：\n1.新型冠状病毒（2019-nCoV）核酸检测试剂注册审查指导原则（下载）
-        purified_title = re.sub(
-            r"(.*(\n))*^(\d+年通告\d+号)?\s*(附件)?([-：．:\.\d\s]*)?(?!项)", "", purified_title, 0, re.M
-        )
-
-        # 删除“（下载）”
-        purified_title = re.sub(r"（?下载）?", "", purified_title)
-
-        # 删除开头的“（”或“）”
-        purified_title = re.sub(r"^[（）]", "", purified_title)
-
-        # 删除结尾的“（”或“）”
-        if not re.search(r"（[^（）]+）$", purified_title):
-            purified_title = re.sub(r"[（）]$", "", purified_title)
-
-        # 删除书名号
-        purified_title = re.sub(
-            rf"^《(.+)》\s*(（(?:第.+次)?征求意见稿）)?\s*(\.{file_extension_without_dot})?$", r"\1\2\3", purified_title
+        return purify_title(
+            self.content, self.anchor_title, self.anchor_content, self.anchor_href, self.anchor_text_value
         )
 
-        # 将文件名中的非法字符替换为连字符
-        purified_title = re.sub(r"[\\/:*?\"<>|]", "-", purified_title)
-
-        # 检查 title 是否有扩展名，没有则添加
-        if not purified_title.endswith(file_extension):
-            purified_title_body = os.path.splitext(purified_title)[0]
-            purified_title = purified_title_body + file_extension
-
-        # 如果最终的文件名为空，则使用 “未获取产品名称-指导原则.file_extension” 代替
-        if purified_title.replace(file_extension, "") == "":
-            purified_title = f"未获取产品名-指导原则.{file_extension}"
 
-        return purified_title
+# 指导原则发布页列表项选择器
+SELECTOR_LIST_ITEM = ".list li:has(a[href$='.html'])"
+
+# 附件类型选择器列表
+FILE_EXTENSION_LIST = [
+    ".doc",
+    ".docx",
+    ".xls",
+    ".xlsx",
+    ".zip",
+    ".rar",
+    ".pdf",
+]
+
+# 类型1
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20241128091030130.html
+# <p>
+#   xxx
+#   <a href="download_url" title="附件标题">下载</a>
+# </p>
+# 选择器：p:not(:has(span, img)):has(>a:only-of-type:where([href$='.doc'], [href$='.docx']))
+# 注意：<p> 标签内不包含 <span>, <img> 标签，以下页面不符合条件，不会被选中。
+# eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
+# eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20220118085047675.html
+SELECTOR_TYPE_1 = (
+    "p:not(:has(span)):has(>a:only-of-type:where("
+    + ",".join(map(lambda x: f"a[href$='{x}']", FILE_EXTENSION_LIST))
+    + "))"
+)
+
+# 类型2
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20150430164400462.html
+# <span>
+#   <span>附件xxx</span>
+#   <span>附件标题</span>
+# </span>
+# <a href="download_url">下载</a>
+# 选择器：span:has(+a:where([href$='.doc'], [href$='.docx'])):not(:has(+a>span))
+# 注意：<span> 标签后面不能是含有 <span> 的 <a> 标签，以下页面不符合条件，不会被选中。
+# eg: https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141226141700739.html
+SELECTOR_TYPE_2 = (
+    "span:has(+a:where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + ")):not(:has(+a>span))"
+)
+
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20140723155501232.html
+
+# 类型3
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20211214162400496.html
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20220118085047675.html
+# <p>
+#   <img>
+#   <a href="download_url">通告2号 附件1.doc</a>
+# </p>
+# 选择器：p:not(:has(span)) > img:only-of-type + a:only-of-type:where([href$='.docx'], [href$='.doc'])
+# 注意: <p> 标签内不包含 <span> 标签，以下页面不符合条件，不会被选中。
+# eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
+SELECTOR_TYPE_3 = (
+    "p:not(:has(span)) > img:only-of-type + a:only-of-type:where("
+    + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST))
+    + ")"
+)
+
+# 类型4
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20120331134240363.html
+# <font></font>
+# <a href="download_url">
+#   <font>附件标题</font>
+# </a>
+# 选择器：a:where([href$='.doc'], [href$='.docx']):has(>font)
+SELECTOR_TYPE_4 = "a:where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + "):has(>font)"
+
+# 类型5
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20221226164621102.html
+# <br>
+# 附件标题
+# <a href="download_url">下载</a>
+# 选择器：br:has(+a:where([href$='.doc'], [href$='.docx']))
+SELECTOR_TYPE_5 = "br:has(+a:where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + "))"
+
+# 类型6
+# https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
+# <span>附件标题</span>
+# <img>
+# <a href="download_url">下载</a>
+# 选择器：span:has(+img + a:where([href$='.doc'], [href$='.docx'])):not(:has(+img+a>span))
+# 注意：<span> 标签后面不能是 <img> 标签，其中 <img> 标签后面是 <span> 的 <a> 标签，以下页面不符合条件，不会被选中。
+# eg: https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141226141700739.html
+SELECTOR_TYPE_6 = (
+    "span:has(+img + a:where("
+    + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST))
+    + ")):not(:has(+img+a>span))"
+)
+
+# 类型7
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20220623164120132.html
+# <br>
+# 附件标题
+# <img>
+# <a href="download_url">下载</a>
+# 选择器：br:has(+img + a:where([href$='.doc'], [href$='.docx']))
+SELECTOR_TYPE_7 = "br:has(+img + a:where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + "))"
+
+# 类型8
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141219161400165.html
+# <a href="download_url">
+#   <span>附件标题
+# </a>
+# 选择器：a:not(:has(>span>img)):has(>span):where([href$='.doc'], [href$='.docx'])
+SELECTOR_TYPE_8 = (
+    "a:not(:has(>span>img)):has(>span):where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + ")"
+)
+
+# 类型9
+# https://www.cmde.org.cn/flfg/zdyz/zqyjg/20100212074430257.html
+# <a href="download_url">附件标题</a>
+# 选择器：a:where([href$='.doc'], [href$='.docx'])
+SELECTOR_TYPE_9 = "a:where(" + ",".join(map(lambda x: f"[href$='{x}']", FILE_EXTENSION_LIST)) + ")"
+
+# 附件类型选择器，按优先级排列
+SELECTOR_TYPE_LIST = [
+    SELECTOR_TYPE_1,
+    SELECTOR_TYPE_2,
+    SELECTOR_TYPE_3,
+    SELECTOR_TYPE_4,
+    SELECTOR_TYPE_5,
+    SELECTOR_TYPE_6,
+    SELECTOR_TYPE_7,
+    SELECTOR_TYPE_8,
+    SELECTOR_TYPE_9,
+]
+
+# 解析 HTML 时使用的选择器匹配计划，选择器只编译一次，并跳过页面中不可能匹配的类型
+accessory_selector_plan = SelectorPlan(SELECTOR_TYPE_LIST, FILE_EXTENSION_LIST)
 
 
 def get_guidence_publish_pages(
@@ -231,7 +331,7 @@ def get_guidence_publish_pages(
     start_date: datetime.date,
     end_date: datetime.date,
     driver: WebDriver,
-) -> list[GuidencePublishPage]:
+) -> tuple[list[GuidencePublishPage], datetime.date | None]:
     """
     获取目标日期范围内的指导原则发布页列表。
 
@@ -241,18 +341,19 @@ def get_guidence_publish_pages(
         end_date (datetime.date): 目标结束日期。
         driver (WebDriver): WebDriver 实例。
     Returns:
-        list[GuidencePublishPage]: 指导原则发布页列表。
+        tuple[list[GuidencePublishPage], datetime.date | None]: 指导原则发布页列表，以及当前页最早的发布日期，
+            页面没有数据时为 None。
     """
 
-    driver.get(url)
+    with metrics.timer("page_load_seconds", url=url, stage="listing", backend=BACKEND_SELENIUM, source=SOURCE_NETWORK):
+        driver.get(url)
+    selector_start_time = time.perf_counter()
 
     # 指导原则发布页列表
     guidence_publish_page_list: list[GuidencePublishPage] = []
+    oldest_date_in_current_page: datetime.date | None = None
 
-    # 定义选择器
-    selector_list_item = ".list li:has(a[href$='.html'])"
-
-    if elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_list_item):
+    if elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_LIST_ITEM):
         # 如果当前页的发布日期均不在目标日期范围内，提前返回
         oldest_date_in_current_page = datetime.datetime.strptime(
             elements[-1].find_element(by=By.TAG_NAME, value="span").text, "(%Y-%m-%d)"
@@ -285,7 +386,14 @@ def get_guidence_publish_pages(
     else:
         logger.warning(f"页面 {url} 中找不到任何有效数据。")
 
-    return guidence_publish_page_list
+    metrics.observe(
+        "selector_match_seconds",
+        time.perf_counter() - selector_start_time,
+        stage="listing",
+        backend=BACKEND_SELENIUM,
+        source=SOURCE_NETWORK,
+    )
+    return guidence_publish_page_list, oldest_date_in_current_page
 
 
 def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
@@ -297,129 +405,16 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
         driver (WebDriver): WebDriver 实例。
     """
 
-    # 附件类型选择器列表
-    file_extension_list = [
-        ".doc",
-        ".docx",
-        ".xls",
-        ".xlsx",
-        ".zip",
-        ".rar",
-        ".pdf",
-    ]
-
     # 打开指导原则发布页面
-    driver.get(url)
+    with metrics.timer(
+        "page_load_seconds", url=url, stage="accessory", backend=BACKEND_SELENIUM, source=SOURCE_NETWORK
+    ):
+        driver.get(url)
+    selector_start_time = time.perf_counter()
 
     accessory_list: list[Accessory] = []
 
-    # 类型1
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20241128091030130.html
-    # <p>
-    #   xxx
-    #   <a href="download_url" title="附件标题">下载</a>
-    # </p>
-    # 选择器：p:not(:has(span, img)):has(>a:only-of-type:where([href$='.doc'], [href$='.docx']))
-    # 注意：<p> 标签内不包含 <span>, <img> 标签，以下页面不符合条件，不会被选中。
-    # eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
-    # eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20220118085047675.html
-    selector_type_1 = (
-        "p:not(:has(span)):has(>a:only-of-type:where("
-        + ",".join(map(lambda x: f"a[href$='{x}']", file_extension_list))
-        + ")"
-    )
-
-    # 类型2
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20150430164400462.html
-    # <span>
-    #   <span>附件xxx</span>
-    #   <span>附件标题</span>
-    # </span>
-    # <a href="download_url">下载</a>
-    # 选择器：span:has(+a:where([href$='.doc'], [href$='.docx'])):not(:has(+a>span))
-    # 注意：<span> 标签后面不能是含有 <span> 的 <a> 标签，以下页面不符合条件，不会被选中。
-    # eg: https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141226141700739.html
-    selector_type_2 = (
-        "span:has(+a:where(" + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list)) + ")):not(:has(+a>span))"
-    )
-
-    # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20140723155501232.html
-
-    # 类型3
-    # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20211214162400496.html
-    # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgwy/20220118085047675.html
-    # <p>
-    #   <img>
-    #   <a href="download_url">通告2号 附件1.doc</a>
-    # </p>
-    # 选择器：p:not(:has(span)) > img:only-of-type + a:only-of-type:where([href$='.docx'], [href$='.doc'])
-    # 注意: <p> 标签内不包含 <span> 标签，以下页面不符合条件，不会被选中。
-    # eg: https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
-    selector_type_3 = (
-        "p:not(:has(span)) > img:only-of-type + a:only-of-type:where("
-        + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list))
-        + ")"
-    )
-
-    # 类型4
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20120331134240363.html
-    # <font></font>
-    # <a href="download_url">
-    #   <font>附件标题</font>
-    # </a>
-    # 选择器：a:where([href$='.doc'], [href$='.docx']):has(>font)
-    selector_type_4 = "a:where(" + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list)) + "):has(>font)"
-
-    # 类型5
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20221226164621102.html
-    # <br>
-    # 附件标题
-    # <a href="download_url">下载</a>
-    # 选择器：br:has(+a:where([href$='.doc'], [href$='.docx']))
-    selector_type_5 = "br:has(+a:where(" + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list)) + "))"
-
-    # 类型6
-    # https://www.cmde.org.cn/flfg/zdyz/fbg/fbgyy/20220429135956135.html
-    # <span>附件标题</span>
-    # <img>
-    # <a href="download_url">下载</a>
-    # 选择器：span:has(+img + a:where([href$='.doc'], [href$='.docx'])):not(:has(+img+a>span))
-    # 注意：<span> 标签后面不能是 <img> 标签，其中 <img> 标签后面是 <span> 的 <a> 标签，以下页面不符合条件，不会被选中。
-    # eg: https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141226141700739.html
-    selector_type_6 = (
-        "span:has(+img + a:where("
-        + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list))
-        + ")):not(:has(+img+a>span))"
-    )
-
-    # 类型7
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20220623164120132.html
-    # <br>
-    # 附件标题
-    # <img>
-    # <a href="download_url">下载</a>
-    # 选择器：br:has(+img + a:where([href$='.doc'], [href$='.docx']))
-    selector_type_7 = "br:has(+img + a:where(" + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list)) + "))"
-
-    # 类型8
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20141219161400165.html
-    # <a href="download_url">
-    #   <span>附件标题
-    # </a>
-    # 选择器：a:not(:has(>span>img)):has(>span):where([href$='.doc'], [href$='.docx'])
-    selector_type_8 = (
-        "a:not(:has(>span>img)):has(>span):where("
-        + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list))
-        + ")"
-    )
-
-    # 类型9
-    # https://www.cmde.org.cn/flfg/zdyz/zqyjg/20100212074430257.html
-    # <a href="download_url">附件标题</a>
-    # 选择器：a:where([href$='.doc'], [href$='.docx'])
-    selector_type_9 = "a:where(" + ",".join(map(lambda x: f"[href$='{x}']", file_extension_list)) + ")"
-
-    if elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_1):
+    if elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_1):
         for element in elements:
             content = element.text
             anchor = element.find_element(by=By.TAG_NAME, value="a")
@@ -428,7 +423,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_2):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_2):
         for element in elements:
             content = element.text
             anchor = element.find_element(by=By.XPATH, value="following-sibling::a")
@@ -437,7 +432,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_3):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_3):
         for element in elements:
             content = ""
             anchor = element
@@ -446,7 +441,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_4):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_4):
         for element in elements:
             content = ""
             anchor = element
@@ -455,7 +450,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_5):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_5):
         for element in elements:
             content = driver.execute_script("return arguments[0].nextSibling.textContent", element)
             anchor = element.find_element(by=By.XPATH, value="following-sibling::a")
@@ -464,7 +459,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_6):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_6):
         for element in elements:
             content = element.text
             anchor = element.find_element(by=By.XPATH, value="following-sibling::a")
@@ -473,7 +468,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_7):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_7):
         for element in elements:
             content = driver.execute_script("return arguments[0].nextSibling.textContent", element)
             anchor = element.find_element(by=By.XPATH, value="following-sibling::a")
@@ -482,7 +477,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_8):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_8):
         for element in elements:
             content = element.find_element(by=By.TAG_NAME, value="span").text
             anchor = element
@@ -491,7 +486,7 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
             anchor_text_value = anchor.get_attribute("textvalue") or ""
             anchor_content = anchor.text
             accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
-    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=selector_type_9):
+    elif elements := driver.find_elements(by=By.CSS_SELECTOR, value=SELECTOR_TYPE_9):
         for element in elements:
             content = ""
             anchor = element
@@ -503,6 +498,235 @@ def get_accessories(url: str, driver: WebDriver) -> list[Accessory]:
     else:
         logger.info(f"页面 {url} 中找不到附件。")
 
+    metrics.observe(
+        "selector_match_seconds",
+        time.perf_counter() - selector_start_time,
+        stage="accessory",
+        backend=BACKEND_SELENIUM,
+        source=SOURCE_NETWORK,
+    )
+    return accessory_list
+
+
+# 单次往返提取附件的脚本
+# 在浏览器中依次执行类型 1~9 的选择器，返回每个类型匹配到的附件字段，
+# 字段含义与 `get_accessories` 中逐个元素调用 WebDriver 获取的结果一致。
+# arguments[0]: 按优先级排列的选择器列表
+ACCESSORY_EXTRACTION_SCRIPT = """
+const selectors = arguments[0];
+const text = (element) => (element ? (element.innerText || "").trim() : "");
+const followingAnchor = (element) => {
+    let sibling = element.nextElementSibling;
+    while (sibling && sibling.tagName !== "A") {
+        sibling = sibling.nextElementSibling;
+    }
+    return sibling;
+};
+return selectors.map((selector, index) => {
+    const selectorType = index + 1;
+    return Array.from(document.querySelectorAll(selector), (element) => {
+        let content = "";
+        let anchor = element;
+        if (selectorType === 1) {
+            content = text(element);
+            anchor = element.querySelector("a");
+        } else if (selectorType === 2 || selectorType === 6) {
+            content = text(element);
+            anchor = followingAnchor(element);
+        } else if (selectorType === 5 || selectorType === 7) {
+            content = element.nextSibling ? element.nextSibling.textContent || "" : "";
+            anchor = followingAnchor(element);
+        } else if (selectorType === 8) {
+            content = text(element.querySelector("span"));
+        }
+        if (!anchor) {
+            return null;
+        }
+        const anchorTitle = selectorType === 4 ? text(anchor.querySelector("font")) : anchor.title || "";
+        return [content, anchorTitle, text(anchor), anchor.href, anchor.getAttribute("textvalue") || ""];
+    }).filter((fields) => fields !== null);
+});
+"""
+
+
+def get_accessories_single_pass(url: str, driver: WebDriver) -> list[Accessory]:
+    """
+    获取单个页面的附件，通过一次 `execute_script` 调用获取类型 1~9 的全部候选附件，
+    再按与 `get_accessories` 相同的优先级选择第一个匹配的类型。
+
+    Args:
+        url (str): 单个页面的 url。
+        driver (WebDriver): WebDriver 实例。
+    Returns:
+        list[Accessory]: 附件列表。
+    """
+
+    # 打开指导原则发布页面
+    with metrics.timer(
+        "page_load_seconds", url=url, stage="accessory", backend=BACKEND_SELENIUM, source=SOURCE_NETWORK
+    ):
+        driver.get(url)
+
+    with metrics.timer("selector_match_seconds", stage="accessory", backend=BACKEND_SELENIUM, source=SOURCE_NETWORK):
+        candidates_by_type: list[list[list[str]]] = driver.execute_script(
+            ACCESSORY_EXTRACTION_SCRIPT, SELECTOR_TYPE_LIST
+        )
+
+    for candidates in candidates_by_type:
+        if candidates:
+            return [
+                Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value)
+                for content, anchor_title, anchor_content, anchor_href, anchor_text_value in candidates
+            ]
+
+    logger.info(f"页面 {url} 中找不到附件。")
+    return []
+
+
+# 解析 HTML 使用的解析器：html5lib 按浏览器的规则构建文档树（如隐式闭合 <p>、修正错误的嵌套），
+# 选择器是针对 Firefox 的文档树编写的，使用 html.parser 时匹配结果可能与 selenium 后端不同
+HTML_PARSER = "html5lib"
+
+# 块级元素，渲染时前后换行
+BLOCK_TAG_SET = frozenset(
+    ("address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "footer", "form", "h1", "h2", "h3", "h4")
+    + ("h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "table", "td", "th", "tr", "ul")
+)
+
+
+def get_element_text(element: Tag) -> str:
+    """
+    模拟 WebDriver 的 `WebElement.text`，获取元素渲染后的文本。
+
+    Args:
+        element (Tag): BeautifulSoup 元素。
+    Returns:
+        str: 折叠空白字符、按 `<br>` 及块级元素换行后的文本。
+    """
+
+    pieces: list[str] = []
+    for descendant in element.descendants:
+        if isinstance(descendant, NavigableString):
+            if not isinstance(descendant, Comment):
+                pieces.append(re.sub(r"\s+", " ", descendant.replace("\xa0", " ")))
+        elif descendant.name == "br" or descendant.name in BLOCK_TAG_SET:
+            pieces.append("\n")
+    lines = [line.strip() for line in "".join(pieces).split("\n")]
+    return "\n".join(line for line in lines if line)
+
+
+def get_guidence_publish_pages_from_html(
+    url: str,
+    html: str | bytes,
+    start_date: datetime.date,
+    end_date: datetime.date,
+) -> tuple[list[GuidencePublishPage], datetime.date | None]:
+    """
+    从列表页 HTML 中解析目标日期范围内的指导原则发布页列表，与 `get_guidence_publish_pages` 等价。
+
+    Args:
+        url (str): 列表页 url，用于补全相对链接。
+        html (str | bytes): 列表页 HTML。
+        start_date (datetime.date): 目标起始日期。
+        end_date (datetime.date): 目标结束日期。
+    Returns:
+        tuple[list[GuidencePublishPage], datetime.date | None]: 指导原则发布页列表，以及当前页最早的发布日期，
+            页面没有数据时为 None。
+    """
+
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    # 指导原则发布页列表
+    guidence_publish_page_list: list[GuidencePublishPage] = []
+    oldest_date_in_current_page: datetime.date | None = None
+
+    if elements := soup.select(SELECTOR_LIST_ITEM):
+        # 如果当前页的发布日期均不在目标日期范围内，提前返回
+        oldest_date_in_current_page = datetime.datetime.strptime(
+            get_element_text(elements[-1].find("span")), "(%Y-%m-%d)"
+        ).date()
+        newest_date_in_current_page = datetime.datetime.strptime(
+            get_element_text(elements[0].find("span")), "(%Y-%m-%d)"
+        ).date()
+        if oldest_date_in_current_page > end_date or newest_date_in_current_page < start_date:
+            logger.info(f"页面 {url} 中找不到 {start_date} ~ {end_date} 期间发布的指导原则。")
+        else:
+            for element in elements:
+                guidence_publish_page_anchor = element.find("a")
+
+                guidence_publish_page_title = guidence_publish_page_anchor.get("title", "")
+                guidence_publish_page_url = urljoin(url, guidence_publish_page_anchor.get("href", ""))
+                guidence_publish_page_date = datetime.datetime.strptime(
+                    get_element_text(element.find("span")), "(%Y-%m-%d)"
+                ).date()
+                guidence_publish_page_accessories = []
+
+                if start_date <= guidence_publish_page_date <= end_date:
+                    guidence_publish_page_list.append(
+                        GuidencePublishPage(
+                            guidence_publish_page_title,
+                            guidence_publish_page_url,
+                            guidence_publish_page_date,
+                            guidence_publish_page_accessories,
+                        )
+                    )
+    else:
+        logger.warning(f"页面 {url} 中找不到任何有效数据。")
+
+    return guidence_publish_page_list, oldest_date_in_current_page
+
+
+def get_accessories_from_html(url: str, html: str | bytes) -> list[Accessory]:
+    """
+    从指导原则发布页 HTML 中解析附件，与 `get_accessories` 使用相同的类型 1~9 选择器及优先级，
+    通过 `accessory_selector_plan` 跳过页面中不可能匹配的类型。
+
+    Args:
+        url (str): 单个页面的 url，用于补全相对链接。
+        html (str | bytes): 单个页面的 HTML。
+    Returns:
+        list[Accessory]: 附件列表。
+    """
+
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    accessory_list: list[Accessory] = []
+
+    selector_type, elements = accessory_selector_plan.match(url, soup)
+    if selector_type is None:
+        logger.info(f"页面 {url} 中找不到附件。")
+        return accessory_list
+
+    for element in elements:
+        if selector_type == 1:
+            content = get_element_text(element)
+            anchor = element.find("a")
+        elif selector_type in (2, 6):
+            content = get_element_text(element)
+            anchor = element.find_next_sibling("a")
+        elif selector_type in (5, 7):
+            next_sibling = element.next_sibling
+            if isinstance(next_sibling, Tag):
+                content = next_sibling.get_text()
+            else:
+                content = str(next_sibling or "")
+            anchor = element.find_next_sibling("a")
+        elif selector_type == 8:
+            content = get_element_text(element.find("span"))
+            anchor = element
+        else:
+            content = ""
+            anchor = element
+
+        if selector_type == 4:
+            anchor_title = get_element_text(anchor.find("font"))
+        else:
+            anchor_title = anchor.get("title", "")
+        anchor_href = urljoin(url, anchor.get("href", ""))
+        anchor_text_value = anchor.get("textvalue") or ""
+        anchor_content = get_element_text(anchor)
+        accessory_list.append(Accessory(content, anchor_title, anchor_content, anchor_href, anchor_text_value))
+
     return accessory_list
 
 
@@ -511,141 +735,509 @@ def create_driver() -> WebDriver:
     options = Options()
     options.add_argument("--headless")
     options.add_argument("--disable-gpu")
-    driver = webdriver.Firefox(options=options)
+    with metrics.timer("driver_start_seconds"):
+        driver = webdriver.Firefox(options=options)
     driver.implicitly_wait(30)
     return driver
 
 
+class DriverPool:
+    """
+    WebDriver 池，在多个任务之间复用固定数量的长期运行的 WebDriver。
+
+    WebDriver 在首次租用时按需创建，租用前进行健康检查，使用次数达到 `max_uses` 或任务异常后浏览器失去响应时回收。
+
+    Args:
+        size (int): 同时存在的 WebDriver 数量上限。
+        max_uses (int): 单个 WebDriver 的最大使用次数，达到后关闭并在下次租用时重新创建。
+    """
+
+    def __init__(self, size: int, max_uses: int = 50):
+        self.size = size
+        self.max_uses = max_uses
+        self._semaphore = threading.BoundedSemaphore(size)
+        self._idle_drivers: queue.LifoQueue[tuple[WebDriver, int]] = queue.LifoQueue()
+        self._closed = False
+
+    def __enter__(self) -> DriverPool:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @staticmethod
+    def is_alive(driver: WebDriver) -> bool:
+        """
+        检查 WebDriver 是否仍可响应。
+        """
+
+        try:
+            driver.execute_script("return 1")
+        except WebDriverException:
+            return False
+        return True
+
+    @staticmethod
+    def quit_driver(driver: WebDriver) -> None:
+        try:
+            driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Failed to quit driver: {e}.")
+
+    def _take(self) -> tuple[WebDriver, int]:
+        while True:
+            try:
+                driver, uses = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                return create_driver(), 0
+            if self.is_alive(driver):
+                return driver, uses
+            logger.warning("回收失去响应的浏览器")
+            self.quit_driver(driver)
+
+    @contextlib.contextmanager
+    def lease(self) -> Iterator[WebDriver]:
+        """
+        租用一个 WebDriver，退出上下文时归还。
+        """
+
+        if self._closed:
+            raise RuntimeError("DriverPool is closed.")
+
+        with self._semaphore:
+            driver, uses = self._take()
+            healthy = True
+            try:
+                yield driver
+            except BaseException:
+                healthy = self.is_alive(driver)
+                raise
+            finally:
+                uses += 1
+                if self._closed or not healthy or uses >= self.max_uses:
+                    self.quit_driver(driver)
+                else:
+                    self._idle_drivers.put((driver, uses))
+
+    def close(self) -> None:
+        """
+        关闭池中所有空闲的 WebDriver，正在租用的 WebDriver 会在归还时关闭。
+        """
+
+        self._closed = True
+        while True:
+            try:
+                driver, _ = self._idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            self.quit_driver(driver)
+
+
+# 租用 driver，未提供 driver 池时创建一次性的 driver
+@contextlib.contextmanager
+def lease_driver(driver_pool: DriverPool | None = None) -> Iterator[WebDriver]:
+    if driver_pool is not None:
+        with driver_pool.lease() as driver:
+            yield driver
+    else:
+        driver = create_driver()
+        try:
+            yield driver
+        finally:
+            driver.quit()
+
+
+class ThrottledHTTPAdapter(HTTPAdapter):
+    """
+    发送请求前获取目标主机的请求限制，并将响应状态反馈给并发控制器。
+    """
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        with get_throttle(request.url).request() as ticket:
+            response = super().send(request, **kwargs)
+            ticket.record_status(response.status_code)
+            return response
+
+
 # 创建 session
-def create_session() -> requests.Session:
+def create_session(pool_maxsize: int = 10) -> requests.Session:
     retry_strategy = Retry(
         total=5,
-        status_forcelist=[443, 500, 502, 503, 504],
+        status_forcelist=[500, 502, 503, 504],
         backoff_factor=1,
     )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    adapter = ThrottledHTTPAdapter(max_retries=retry_strategy, pool_maxsize=pool_maxsize)
     session = requests.Session()
     session.mount("http://", adapter)
     session.mount("https://", adapter)
     return session
 
 
+# 页面获取后端
+BACKEND_HTTP = "http"
+BACKEND_SELENIUM = "selenium"
+BACKEND_LIST = [BACKEND_HTTP, BACKEND_SELENIUM]
+
+# 页面来源，用于区分页面缓存命中与实际请求的耗时指标
+SOURCE_NETWORK = "network"
+SOURCE_CACHE = "cache"
+
+# 页面获取共用的 session，在线程间复用连接池
+shared_session: requests.Session | None = None
+shared_session_lock = threading.Lock()
+
+
+def get_shared_session() -> requests.Session:
+    global shared_session
+    with shared_session_lock:
+        if shared_session is None:
+            shared_session = create_session(pool_maxsize=int(throttle_settings["maximum"]))
+        return shared_session
+
+
+# 页面缓存，为 None 时不使用缓存
+page_cache: PageCache | None = None
+
+
+def set_page_cache(cache: PageCache | None) -> None:
+    global page_cache
+    page_cache = cache
+
+
+# 获取未过期的缓存页面 HTML
+def get_cached_html(url: str) -> bytes | None:
+    if page_cache is None:
+        return None
+    return page_cache.peek(url)
+
+
+# 通过 HTTP 获取页面 HTML，启用页面缓存时优先使用缓存，`revalidate` 为 True 时总是向服务器验证缓存
+def get_html(url: str, timeout: int = 30, revalidate: bool = False) -> bytes:
+    if page_cache is not None:
+        return page_cache.get(url, get_shared_session(), timeout=timeout, revalidate=revalidate)
+    response = get_shared_session().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.content
+
+
 # 获取指导原则发布页面
-def fetch_page(url: str, start_date: datetime.date, end_date: datetime.date) -> list[GuidencePublishPage]:
-    driver = create_driver()
+def fetch_page(
+    url: str,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    backend: str = BACKEND_SELENIUM,
+    driver_pool: DriverPool | None = None,
+) -> tuple[list[GuidencePublishPage], datetime.date | None]:
+    # 有未过期的缓存时，即使使用 selenium 后端也直接解析缓存
+    cached_html = get_cached_html(url)
+    if backend == BACKEND_HTTP or cached_html is not None:
+        source = SOURCE_NETWORK if cached_html is None else SOURCE_CACHE
+        try:
+            logger.info(f"正在从 {url} 获取页面")
+            with metrics.timer("page_load_seconds", url=url, stage="listing", backend=BACKEND_HTTP, source=source):
+                html = get_html(url)
+            with metrics.timer("selector_match_seconds", stage="listing", backend=BACKEND_HTTP, source=source):
+                return get_guidence_publish_pages_from_html(url, html, start_date, end_date)
+        except Exception as e:
+            logger.warning(f"Failed to fetch pages from {url} over HTTP: {e}, falling back to selenium.")
+            metrics.increment("backend_fallbacks", stage="listing")
+
     try:
-        logger.info(f"正在从 {url} 获取页面")
-        pages = get_guidence_publish_pages(url=url, start_date=start_date, end_date=end_date, driver=driver)
+        with lease_driver(driver_pool) as driver, get_throttle(url).request():
+            logger.info(f"正在从 {url} 获取页面")
+            return get_guidence_publish_pages(url=url, start_date=start_date, end_date=end_date, driver=driver)
     except Exception as e:
         logger.error(f"Failed to fetch pages from {url}: {e}.")
-        pages = []
-    finally:
-        driver.quit()
-    return pages
+        return [], None
+
+
+# 指导原则列表页
+LISTING_URL = "https://www.cmde.org.cn/flfg/zdyz/index.html"
+
+# 无法从分页栏获取页数时使用的最大页码
+DEFAULT_MAX_PAGE = 62
+
+# 分页栏脚本 createPageHTML(总页数, 当前页码, "index", "html") 及分页链接 index_N.html
+PAGER_SCRIPT_PATTERN = re.compile(r"createPageHTML\(\s*(\d+)")
+PAGER_LINK_PATTERN = re.compile(r"index_(\d+)\.html")
+
+
+def set_listing_url(url: str) -> None:
+    """
+    设置第 0 页列表页的 url，其余列表页与其位于同一目录，用于从本地回放站点获取页面。
+    """
+
+    global LISTING_URL
+    LISTING_URL = url
+
+
+def get_listing_url(page: int) -> str:
+    """
+    获取第 `page` 页列表页的 url，第 0 页为 index.html，其余为 index_{page}.html。
+    """
+
+    if page == 0:
+        return LISTING_URL
+    return urljoin(LISTING_URL, f"index_{page}.html")
+
+
+def get_max_page_from_html(html: str | bytes) -> int | None:
+    """
+    从列表页的分页栏中解析最大页码，优先使用分页脚本中的总页数，其次使用分页链接中最大的页码。
+    """
+
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    if match := PAGER_SCRIPT_PATTERN.search(html):
+        return int(match.group(1)) - 1
+    if page_numbers := [int(page_number) for page_number in PAGER_LINK_PATTERN.findall(html)]:
+        return max(page_numbers)
+    return None
+
+
+def discover_max_page(backend: str = BACKEND_SELENIUM, driver_pool: DriverPool | None = None) -> int:
+    """
+    从第 0 页的分页栏获取最大页码，获取失败时返回 `DEFAULT_MAX_PAGE`。
+    """
+
+    max_page: int | None = None
+    try:
+        if backend == BACKEND_HTTP:
+            max_page = get_max_page_from_html(get_html(LISTING_URL))
+        if max_page is None:
+            with lease_driver(driver_pool) as driver, get_throttle(LISTING_URL).request():
+                driver.get(LISTING_URL)
+                max_page = get_max_page_from_html(driver.page_source)
+    except Exception as e:
+        logger.warning(f"Failed to discover the number of pages from {LISTING_URL}: {e}.")
+
+    if max_page is None:
+        logger.warning(f"无法从分页栏获取页数，使用默认的最大页码 {DEFAULT_MAX_PAGE}")
+        return DEFAULT_MAX_PAGE
+    return max_page
 
 
 # 打开每个指导原则发布页面，获取附件内容
-def fetch_accessory(guidence_publish_page: GuidencePublishPage) -> None:
-    driver = create_driver()
+def fetch_accessory(
+    guidence_publish_page: GuidencePublishPage,
+    backend: str = BACKEND_SELENIUM,
+    driver_pool: DriverPool | None = None,
+    single_pass: bool = True,
+    revalidate: bool = False,
+) -> None:
+    url = guidence_publish_page.url
+    # 有未过期的缓存时，即使使用 selenium 后端也直接解析缓存；需要刷新的发布页不使用未过期的缓存
+    cached_html = None if revalidate else get_cached_html(url)
+    if backend == BACKEND_HTTP or cached_html is not None:
+        source = SOURCE_NETWORK if cached_html is None else SOURCE_CACHE
+        try:
+            logger.info(f"正在从 {url} 获取附件信息")
+            with metrics.timer("page_load_seconds", url=url, stage="accessory", backend=BACKEND_HTTP, source=source):
+                html = get_html(url, revalidate=revalidate)
+            with metrics.timer("selector_match_seconds", stage="accessory", backend=BACKEND_HTTP, source=source):
+                guidence_publish_page.accessories = get_accessories_from_html(url, html)
+            return
+        except Exception as e:
+            logger.warning(f"Failed to fetch accessories from {url} over HTTP: {e}, falling back to selenium.")
+            metrics.increment("backend_fallbacks", stage="accessory")
+
     try:
-        url = guidence_publish_page.url
-        logger.info(f"正在从 {url} 获取附件信息")
-        guidence_publish_page.accessories = get_accessories(url=url, driver=driver)
+        with lease_driver(driver_pool) as driver, get_throttle(url).request():
+            logger.info(f"正在从 {url} 获取附件信息")
+            if single_pass:
+                guidence_publish_page.accessories = get_accessories_single_pass(url=url, driver=driver)
+            else:
+                guidence_publish_page.accessories = get_accessories(url=url, driver=driver)
     except Exception as e:
         logger.error(f"Failed to fetch accessories from {url}: {e}.")
-        sys.exit(1)
-    finally:
-        driver.quit()
-
-
-# 删除重复的文件
-def remove_duplicate_files(save_path: str) -> None:
-    with lock:
-        if os.path.exists(save_path):
-            save_dir = os.path.dirname(save_path)
-            items = os.listdir(save_dir)
-            for item in items:
-                file_path = os.path.join(save_dir, item)
-                if file_path != save_path and os.path.getsize(file_path) == os.path.getsize(save_path):
-                    os.remove(file_path)
-                    logger.info(f"删除重复文件 {file_path}")
-
-
-# 下载附件
-def download_accessory(guidence_publish_page: GuidencePublishPage, timeout: int) -> None:
-    save_dir = os.path.join("guidences", guidence_publish_page.date.strftime("%Y-%m-%d"))
-    os.makedirs(save_dir, exist_ok=True)
-
-    for accessory in guidence_publish_page.accessories:
-        if not accessory.is_valid or not accessory.is_link_available:
+        raise
+
+
+@dataclasses.dataclass
+class ChangeSet:
+    """
+    合并新获取的数据后，目录发生的变化。
+
+    附件变化以 `(发布页 url, 附件)` 的形式记录，被移除的附件为合并前的旧附件。
+    """
+
+    added_pages: list[GuidencePublishPage] = dataclasses.field(default_factory=list)
+    updated_pages: list[GuidencePublishPage] = dataclasses.field(default_factory=list)
+    removed_pages: list[GuidencePublishPage] = dataclasses.field(default_factory=list)
+    added_accessories: list[tuple[str, Accessory]] = dataclasses.field(default_factory=list)
+    updated_accessories: list[tuple[str, Accessory]] = dataclasses.field(default_factory=list)
+    removed_accessories: list[tuple[str, Accessory]] = dataclasses.field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added_pages or self.updated_pages or self.removed_pages)
+
+    @property
+    def changed_dates(self) -> set[datetime.date]:
+        """
+        发生变化的发布日期。
+        """
+
+        return {page.date for page in self.added_pages + self.updated_pages + self.removed_pages}
+
+    def summary(self) -> str:
+        return (
+            f"新增 {len(self.added_pages)} 个页面，更新 {len(self.updated_pages)} 个页面，"
+            f"移除 {len(self.removed_pages)} 个页面；"
+            f"新增 {len(self.added_accessories)} 个附件，更新 {len(self.updated_accessories)} 个附件，"
+            f"移除 {len(self.removed_accessories)} 个附件"
+        )
+
+
+def get_accessory_fields(accessory: Accessory) -> tuple:
+    """
+    获取附件全部字段的值，用于判断附件是否发生变化。
+    """
+
+    return tuple(getattr(accessory, field.name) for field in dataclasses.fields(Accessory))
+
+
+def get_accessory_key(accessory: Accessory) -> tuple:
+    """
+    附件在发布说明中可见的内容：链接、文件名、有效性及压缩包中的文件名。
+    """
+
+    return (
+        accessory.anchor_href,
+        accessory.purified_title,
+        accessory.is_valid,
+        accessory.is_link_available,
+        tuple(member.name for member in accessory.members),
+    )
+
+
+def get_page_digest(page: GuidencePublishPage) -> str:
+    """
+    计算发布页标题、链接、日期及全部附件可见内容的 SHA-256 摘要，摘要相同的发布页视为未变化。
+    """
+
+    digest = hashlib.sha256()
+    for value in (page.title, page.url, page.date.isoformat()):
+        digest.update(value.encode("utf-8"))
+        digest.update(b"\0")
+    for accessory in page.accessories:
+        digest.update(repr(get_accessory_key(accessory)).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def merge_accessories(
+    page_url: str, old_acc: list[Accessory], new_acc: list[Accessory], change_set: ChangeSet
+) -> tuple[list[Accessory], bool]:
+    """
+    合并同一发布页的新旧附件：移除不在新数据中的附件，替换两者均有的附件，并在末尾追加新的附件。
+    附件按链接区分，同一链接只保留一个附件。
+
+    Args:
+        page_url (str): 发布页 url。
+        old_acc (list[Accessory]): 已有的附件。
+        new_acc (list[Accessory]): 新获取的附件。
+        change_set (ChangeSet): 记录附件变化的 ChangeSet。
+    Returns:
+        tuple[list[Accessory], bool]: 合并后的附件，以及附件是否发生变化。
+    """
+
+    new_acc_by_href = {acc.anchor_href: acc for acc in new_acc}
+    changed = False
+
+    final_acc: list[Accessory] = []
+    final_acc_href_set: set[str] = set()
+    for old_acc_item in old_acc:
+        new_acc_item = new_acc_by_href.get(old_acc_item.anchor_href)
+        if new_acc_item is None or new_acc_item.anchor_href in final_acc_href_set:
+            # 移除不在新数据中的附件，以及旧数据中链接重复的附件
+            change_set.removed_accessories.append((page_url, old_acc_item))
+            changed = True
             continue
-        save_path = os.path.join(save_dir, accessory.purified_title)
-        if os.path.exists(save_path):
-            logger.info(f"File {save_path} already exists.")
-            remove_duplicate_files(save_path)
+        if not new_acc_item.members:
+            # 本次未展开的压缩包沿用已记录的成员
+            new_acc_item.members = old_acc_item.members
+        # 替换已有的附件
+        if get_accessory_fields(new_acc_item) != get_accessory_fields(old_acc_item):
+            change_set.updated_accessories.append((page_url, new_acc_item))
+            changed = True
+        final_acc.append(new_acc_item)
+        final_acc_href_set.add(new_acc_item.anchor_href)
+
+    for new_acc_item in new_acc_by_href.values():
+        # 添加新的附件
+        if new_acc_item.anchor_href not in final_acc_href_set:
+            change_set.added_accessories.append((page_url, new_acc_item))
+            final_acc.append(new_acc_item)
+            changed = True
+
+    return final_acc, changed
+
+
+def merge_pages(old_data: list[GuidencePublishPage], new_data: list[GuidencePublishPage]) -> ChangeSet:
+    """
+    将新获取的指导原则发布页合并到 `old_data` 中：新的发布页直接添加，已有的发布页保留原标题及日期，
+    附件按 `merge_accessories` 的规则合并。
+
+    Args:
+        old_data (list[GuidencePublishPage]): 已有的指导原则发布页列表，将被原地修改。
+        new_data (list[GuidencePublishPage]): 新获取的指导原则发布页列表。
+    Returns:
+        ChangeSet: 合并产生的变化。
+    """
+
+    change_set = ChangeSet()
+    old_gpp_by_url = {gpp.url: gpp for gpp in old_data}
+
+    for new_gpp in new_data:
+        if (old_gpp := old_gpp_by_url.get(new_gpp.url)) is None:
+            new_gpp.digest = get_page_digest(new_gpp)
+            old_data.append(new_gpp)
+            old_gpp_by_url[new_gpp.url] = new_gpp
+            change_set.added_pages.append(new_gpp)
+            change_set.added_accessories.extend((new_gpp.url, acc) for acc in new_gpp.accessories)
             continue
 
-        try:
-            session = create_session()
-            url = accessory.anchor_href
-            logger.info(f"正在从 {url} 下载附件并保存至 {save_path}")
-            with session.get(url, timeout=timeout, stream=True) as response:
-                if response.status_code == 200:
-                    with open(save_path, "wb") as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                else:
-                    logger.error(f"Failed to download {url}, status code: {response.status_code}.")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to download {url}.")
-            logger.error(e)
-        finally:
-            session.close()
-            remove_duplicate_files(save_path)
+        old_gpp.accessories, changed = merge_accessories(
+            new_gpp.url, old_gpp.accessories, new_gpp.accessories, change_set
+        )
+        if changed or not old_gpp.digest:
+            old_gpp.digest = get_page_digest(old_gpp)
+        if changed:
+            change_set.updated_pages.append(old_gpp)
+
+    return change_set
+
+
+def update_pickle_file(new_data: list[GuidencePublishPage], file_path: str) -> ChangeSet:
+    """
+    将新获取的指导原则发布页合并到 pickle 文件中，数据无变化时不写入文件。
 
+    Args:
+        new_data (list[GuidencePublishPage]): 新获取的指导原则发布页列表。
+        file_path (str): pickle 文件路径。
+    Returns:
+        ChangeSet: 合并产生的变化。
+    """
 
-def update_pickle_file(new_data: list[GuidencePublishPage], file_path: str) -> None:
     if os.path.exists(file_path):
         # 读取 pickle 文件
         with open(file_path, "rb") as f:
             old_data: list[GuidencePublishPage] = pickle.load(f)
+    else:
+        old_data = []
 
-        # 数据无变化，无需更新
-        if old_data == new_data:
-            logger.info("数据无变化，无需更新")
-            return
+    # 合并数据
+    change_set = merge_pages(old_data, new_data)
 
-        # 合并数据
-        old_gpp_url_list = [gpp.url for gpp in old_data]
-        for new_gpp in new_data:
-            if new_gpp.url not in old_gpp_url_list:
-                old_data.append(new_gpp)
-            else:
-                old_acc = old_data[old_gpp_url_list.index(new_gpp.url)].accessories
-                new_acc = new_gpp.accessories
-                old_acc_url_list = [acc.anchor_href for acc in old_acc]
-                new_acc_url_list = [acc.anchor_href for acc in new_acc]
-
-                final_acc: list[Accessory] = []
-
-                for old_acc_item in old_acc:
-                    # 移除不在新数据中的附件
-                    if old_acc_item.anchor_href not in new_acc_url_list:
-                        continue
-                    else:
-                        final_acc.append(old_acc_item)
-
-                for new_acc_item in new_acc:
-                    final_acc_url_list = [acc.anchor_href for acc in final_acc]
-                    # 添加新的附件
-                    if new_acc_item.anchor_href not in final_acc_url_list:
-                        final_acc.append(new_acc_item)
-                    else:
-                        final_acc[final_acc_url_list.index(new_acc_item.anchor_href)] = new_acc_item
-
-                old_data[old_gpp_url_list.index(new_gpp.url)].accessories = final_acc
-    else:
-        old_data = new_data
+    # 数据无变化，无需更新
+    if not change_set and os.path.exists(file_path):
+        logger.info("数据无变化，无需更新")
+        return change_set
+
+    # 补全早期版本的 pickle 文件中没有摘要的发布页
+    for gpp in old_data:
+        if not gpp.digest:
+            gpp.digest = get_page_digest(gpp)
 
     # 排序
     old_data.sort(key=lambda x: (-x.date.toordinal(), x.title))
@@ -654,54 +1246,155 @@ def update_pickle_file(new_data: list[GuidencePublishPage], file_path: str) -> N
     with open(file_path, "wb") as f:
         pickle.dump(old_data, f)
 
-
-def read_pickle_file(file_path: str) -> list[GuidencePublishPage]:
-    if os.path.exists(file_path):
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
-    else:
-        return []
+    return change_set
 
 
-def render_markdown(guidence_publish_page_list: list[GuidencePublishPage], file_path: str) -> None:
+def read_pickle_file(file_path: str, keep_candidates: bool = True) -> list[GuidencePublishPage]:
     """
-    将 GuidencePublishPage 列表渲染为 Markdown 文件。
+    读取 pickle 文件中的指导原则发布页列表，文件不存在时返回空列表。
+
+    Args:
+        file_path (str): pickle 文件路径。
+        keep_candidates (bool): 是否保留附件的候选标题字段，只读取目录时可设为 False 以节省内存。
+    Returns:
+        list[GuidencePublishPage]: 指导原则发布页列表。
     """
 
-    guidence_publish_page_list.sort(key=lambda x: (-x.date.toordinal(), x.title))
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "rb") as f:
+        guidence_publish_page_list: list[GuidencePublishPage] = pickle.load(f)
+    if not keep_candidates:
+        for guidence_publish_page in guidence_publish_page_list:
+            for accessory in guidence_publish_page.accessories:
+                accessory.drop_candidates()
+    return guidence_publish_page_list
+
 
-    markdown = "# List of Guidences\n\n"
-    markdown += "| 发布日期 | 标题 | 附件链接 |\n"
-    markdown += "| -------- | ---- | -------- |\n"
+MARKDOWN_HEADER = "# List of Guidences\n\n| 发布日期 | 标题 | 附件链接 |\n| -------- | ---- | -------- |\n"
 
-    current_row_date = None
-    for page in guidence_publish_page_list:
+# Markdown 表格中某个日期分组首行的日期列
+MARKDOWN_DATE_GROUP_PATTERN = re.compile(r"^\| <a href='guidences/(\d{4}-\d{2}-\d{2})'>")
+
+
+def render_markdown_rows(pages: list[GuidencePublishPage], root: str = "guidences") -> list[str]:
+    """
+    将同一发布日期的 GuidencePublishPage 渲染为 Markdown 表格行，`pages` 需已按标题排序。
+
+    `root` 为日期列链接的附件目录，相对于 Markdown 文件所在目录。
+    """
+
+    rows: list[str] = []
+    for page in pages:
         # 表格各列内容
-        markdown_date = f"<a href='guidences/{page.date}'>{page.date}</a>"
+        markdown_date = f"<a href='{root}/{page.date}'>{page.date}</a>"
         markdown_title = f"<a href='{page.url}' target='_blank'>{page.title}</a>"
 
         markdown_accessories_list: list[str] = []
         for accessory in page.accessories:
             if accessory.is_valid:
+                # 压缩包中的文件列在压缩包下
+                markdown_members = (
+                    f"<ul>{''.join(f'<li>{member.name}</li>' for member in accessory.members)}</ul>"
+                    if accessory.members
+                    else ""
+                )
                 if accessory.is_link_available:
                     markdown_accessories_list.append(
-                        f'<li><a href="{accessory.anchor_href}">{accessory.purified_title}</a></li>'
+                        f'<li><a href="{accessory.anchor_href}">{accessory.purified_title}</a>{markdown_members}</li>'
                     )
                 else:
                     markdown_accessories_list.append(
-                        f'<li><a href="{accessory.anchor_href}">{accessory.purified_title}</a>（链接已失效）</li>'
+                        f'<li><a href="{accessory.anchor_href}">{accessory.purified_title}</a>（链接已失效）'
+                        f"{markdown_members}</li>"
                     )
         if markdown_accessories_list:
             markdown_accessories = f"<ul>{''.join(markdown_accessories_list)}</ul>"
         else:
             markdown_accessories = "无附件"
 
-        # 如果当前行的日期与上一行的日期不同，则添加日期信息
-        if current_row_date is None or page.date != current_row_date:
-            markdown += f"| {markdown_date} | {markdown_title} | {markdown_accessories} \n"
-            current_row_date = page.date
+        # 只有日期分组的第一行显示日期信息
+        if not rows:
+            rows.append(f"| {markdown_date} | {markdown_title} | {markdown_accessories} \n")
         else:
-            markdown += f"| | {markdown_title} | {markdown_accessories} \n"
+            rows.append(f"| | {markdown_title} | {markdown_accessories} \n")
+    return rows
+
+
+def read_markdown_date_groups(file_path: str) -> dict[datetime.date, list[str]] | None:
+    """
+    读取已生成的 Markdown 文件，按发布日期分组返回表格行，文件不存在或格式不符时返回 None。
+    """
+
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        markdown = f.read()
+    if not markdown.startswith(MARKDOWN_HEADER):
+        return None
+
+    date_groups: dict[datetime.date, list[str]] = {}
+    rows: list[str] | None = None
+    for row in markdown[len(MARKDOWN_HEADER) :].splitlines(keepends=True):
+        if match := MARKDOWN_DATE_GROUP_PATTERN.match(row):
+            rows = date_groups.setdefault(datetime.date.fromisoformat(match.group(1)), [])
+        elif rows is None or not row.startswith("| | "):
+            return None
+        rows.append(row)
+    return date_groups
+
+
+def render_markdown(
+    guidence_publish_page_list: list[GuidencePublishPage], file_path: str, change_set: ChangeSet | None = None
+) -> bool:
+    """
+    将 GuidencePublishPage 列表渲染为 Markdown 文件。
+
+    传入 `change_set` 时只重新渲染发生变化的日期分组，其余表格行沿用已有文件的内容；
+    文件不存在或无法解析时完整渲染。渲染结果与已有文件相同时不写入文件。
+
+    Args:
+        guidence_publish_page_list (list[GuidencePublishPage]): 全部指导原则发布页。
+        file_path (str): Markdown 文件路径。
+        change_set (ChangeSet | None): 合并新数据时产生的变化。
+    Returns:
+        bool: 是否写入了文件。
+    """
+
+    date_groups = read_markdown_date_groups(file_path) if change_set is not None else None
+    if date_groups is not None:
+        changed_dates = change_set.changed_dates
+        if not changed_dates:
+            return False
+
+        # 只重新渲染发生变化的日期分组
+        pages_by_date: dict[datetime.date, list[GuidencePublishPage]] = {date: [] for date in changed_dates}
+        for page in guidence_publish_page_list:
+            if page.date in pages_by_date:
+                pages_by_date[page.date].append(page)
+        for date, pages in pages_by_date.items():
+            if pages:
+                pages.sort(key=lambda x: x.title)
+                date_groups[date] = render_markdown_rows(pages)
+            else:
+                date_groups.pop(date, None)
+    else:
+        guidence_publish_page_list.sort(key=lambda x: (-x.date.toordinal(), x.title))
+
+        date_groups = {}
+        for page in guidence_publish_page_list:
+            date_groups.setdefault(page.date, []).append(page)
+        date_groups = {date: render_markdown_rows(pages) for date, pages in date_groups.items()}
+
+    markdown = MARKDOWN_HEADER + "".join(row for date in sorted(date_groups, reverse=True) for row in date_groups[date])
+
+    # 内容无变化时不写入文件，避免产生多余的 git diff
+    if os.path.exists(file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            if f.read() == markdown:
+                logger.info(f"{file_path} 无变化，无需更新")
+                return False
 
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(markdown)
+    return True
@@ -0,0 +1,412 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import dataclasses
+import hashlib
+import json
+import logging
+import mmap
+import os
+import queue
+import sys
+import time
+
+from archives import ARCHIVE_EXTRACT_DIR, get_extract_dir
+from catalog import load_catalog_pages
+from downloader import (
+    PART_FILE_SUFFIX,
+    DownloadResult,
+    download_from_queue,
+    get_download_state_path,
+    read_download_state,
+)
+from utils import Accessory, ArchiveMember, GuidencePublishPage
+
+
+# 获取根日志记录器
+logger = logging.getLogger()
+
+# 校验报告文件路径
+VERIFY_REPORT_PATH = os.path.join(".cache", "verify.json")
+
+# 问题类型
+ISSUE_MISSING = "missing"
+ISSUE_ORPHANED = "orphaned"
+ISSUE_ZERO_BYTE = "zero_byte"
+ISSUE_TRUNCATED = "truncated"
+ISSUE_DUPLICATE = "duplicate"
+ISSUE_MAGIC_MISMATCH = "magic_mismatch"
+ISSUE_MEMBER_MISMATCH = "member_mismatch"
+ISSUE_TYPE_LIST = [
+    ISSUE_MISSING,
+    ISSUE_ORPHANED,
+    ISSUE_ZERO_BYTE,
+    ISSUE_TRUNCATED,
+    ISSUE_DUPLICATE,
+    ISSUE_MAGIC_MISMATCH,
+    ISSUE_MEMBER_MISMATCH,
+]
+
+# 可以通过重新下载修复的问题
+REPAIRABLE_ISSUE_LIST = [ISSUE_MISSING, ISSUE_ZERO_BYTE, ISSUE_TRUNCATED, ISSUE_MAGIC_MISMATCH]
+
+# 文件头及对应的文件类型
+FILE_MAGIC_LIST = [
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "ole"),
+    (b"PK\x03\x04", "zip"),
+    (b"PK\x05\x06", "zip"),
+    (b"%PDF", "pdf"),
+    (b"Rar!\x1a\x07", "rar"),
+    (b"7z\xbc\xaf\x27\x1c", "7z"),
+]
+
+# 扩展名对应的文件类型：.doc / .xls 为 OLE 复合文档，.docx / .xlsx 为 zip 压缩包
+EXTENSION_FILE_TYPE_DICT = {
+    ".doc": "ole",
+    ".xls": "ole",
+    ".docx": "zip",
+    ".xlsx": "zip",
+    ".zip": "zip",
+    ".pdf": "pdf",
+    ".rar": "rar",
+    ".7z": "7z",
+}
+
+# 读取文件头的字节数
+MAGIC_HEADER_SIZE = 8
+
+# 修复时暂存待替换文件的后缀，重新下载失败时恢复
+REPAIR_BACKUP_SUFFIX = ".repair"
+
+
+@dataclasses.dataclass
+class ScannedFile:
+    path: str
+    size: int
+    inode: tuple[int, int]
+    header: bytes = b""
+    sha256: str = ""
+
+
+@dataclasses.dataclass
+class ExpectedFile:
+    page: GuidencePublishPage
+    accessory: Accessory
+    member: ArchiveMember | None = None
+
+
+@dataclasses.dataclass
+class Issue:
+    type: str
+    path: str
+    detail: str = ""
+    page_url: str = ""
+    anchor_href: str = ""
+
+
+@dataclasses.dataclass
+class VerifyResult:
+    files: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    issues: list[Issue] = dataclasses.field(default_factory=list)
+
+    def summary(self) -> str:
+        counts = collections.Counter(issue.type for issue in self.issues)
+        issue_counts = "，".join(f"{issue_type} {counts[issue_type]} 个" for issue_type in ISSUE_TYPE_LIST)
+        return (
+            f"校验 {self.files} 个文件，共 {self.bytes / 1024**2:.1f} MiB，耗时 {self.seconds:.2f} 秒；{issue_counts}"
+        )
+
+
+def scan_tree(root: str) -> list[ScannedFile]:
+    """
+    使用 `os.scandir` 遍历目录下的所有文件，跳过未完成下载的临时文件。符号链接按其指向的文件统计。
+    """
+
+    files: list[ScannedFile] = []
+    dir_paths = [root]
+    while dir_paths:
+        with os.scandir(dir_paths.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dir_paths.append(entry.path)
+                elif entry.is_file() and not entry.name.endswith(
+                    (PART_FILE_SUFFIX, ".tmp", ".link", REPAIR_BACKUP_SUFFIX)
+                ):
+                    stat = entry.stat()
+                    files.append(ScannedFile(os.path.normpath(entry.path), stat.st_size, (stat.st_dev, stat.st_ino)))
+    return files
+
+
+def hash_file_mmap(file_path: str) -> tuple[bytes, str]:
+    """
+    通过内存映射读取文件，返回文件头及 SHA-256 摘要。hashlib 计算摘要时释放 GIL，可以在多个线程中并行。
+    """
+
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b"", hashlib.sha256().hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm[:MAGIC_HEADER_SIZE], hashlib.sha256(mm).hexdigest()
+
+
+def hash_files(files: list[ScannedFile], max_workers: int | None = None) -> None:
+    """
+    并行计算文件摘要，硬链接到同一文件的路径只计算一次。
+    """
+
+    files_by_inode: dict[tuple[int, int], list[ScannedFile]] = {}
+    for file in files:
+        files_by_inode.setdefault(file.inode, []).append(file)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        # 大文件先开始计算，避免最后只剩一个线程在计算大文件
+        inode_files = sorted(files_by_inode.values(), key=lambda x: -x[0].size)
+        for same_files, (header, sha256) in zip(
+            inode_files, executor.map(hash_file_mmap, (same_files[0].path for same_files in inode_files))
+        ):
+            for file in same_files:
+                file.header = header
+                file.sha256 = sha256
+
+
+def detect_file_type(header: bytes) -> str | None:
+    for magic, file_type in FILE_MAGIC_LIST:
+        if header.startswith(magic):
+            return file_type
+    if header.lstrip()[:1] == b"<":
+        return "html"
+    return None
+
+
+def get_expected_files(guidence_publish_pages: list[GuidencePublishPage], root: str) -> dict[str, ExpectedFile]:
+    """
+    获取目录中应当存在的文件：有效且链接可用的附件，以及压缩包展开后的文件。
+    """
+
+    expected_files: dict[str, ExpectedFile] = {}
+    for page in guidence_publish_pages:
+        save_dir = os.path.join(root, page.date.strftime("%Y-%m-%d"))
+        for accessory in page.accessories:
+            if not accessory.is_valid or not accessory.is_link_available:
+                continue
+            save_path = os.path.normpath(os.path.join(save_dir, accessory.purified_title))
+            expected_files[save_path] = ExpectedFile(page, accessory)
+            for member in accessory.members:
+                member_path = os.path.join(get_extract_dir(save_path, root), *member.name.split("/"))
+                expected_files[os.path.normpath(member_path)] = ExpectedFile(page, accessory, member)
+    return expected_files
+
+
+def check_file(file: ScannedFile, expected: ExpectedFile | None) -> list[Issue]:
+    """
+    检查单个文件：空文件、文件头与扩展名不符、小于下载时记录的 Content-Length、压缩包成员的大小或摘要不符。
+    """
+
+    page_url = expected.page.url if expected is not None else ""
+    anchor_href = expected.accessory.anchor_href if expected is not None else ""
+    issues: list[Issue] = []
+
+    if file.size == 0:
+        issues.append(Issue(ISSUE_ZERO_BYTE, file.path, page_url=page_url, anchor_href=anchor_href))
+        return issues
+
+    expected_type = EXTENSION_FILE_TYPE_DICT.get(os.path.splitext(file.path)[1].lower())
+    if expected_type is not None and (actual_type := detect_file_type(file.header)) != expected_type:
+        issues.append(
+            Issue(
+                ISSUE_MAGIC_MISMATCH,
+                file.path,
+                f"expected {expected_type}, got {actual_type or file.header.hex()}",
+                page_url,
+                anchor_href,
+            )
+        )
+
+    if expected is None:
+        return issues
+    if expected.member is not None:
+        if (file.size, file.sha256) != (expected.member.size, expected.member.sha256):
+            issues.append(
+                Issue(
+                    ISSUE_MEMBER_MISMATCH,
+                    file.path,
+                    f"expected {expected.member.size} bytes ({expected.member.sha256[:12]}), "
+                    f"got {file.size} bytes ({file.sha256[:12]})",
+                    page_url,
+                    anchor_href,
+                )
+            )
+    elif (state := read_download_state(get_download_state_path(file.path))) is not None:
+        if state.content_length is not None and file.size < state.content_length:
+            issues.append(
+                Issue(
+                    ISSUE_TRUNCATED,
+                    file.path,
+                    f"{file.size}/{state.content_length} bytes",
+                    page_url,
+                    anchor_href,
+                )
+            )
+    return issues
+
+
+def verify(
+    guidence_publish_pages: list[GuidencePublishPage], root: str = "guidences", max_workers: int | None = None
+) -> VerifyResult:
+    """
+    核对附件目录与目录中的附件。
+
+    - missing：目录中有效且链接可用的附件在磁盘上不存在；
+    - orphaned：磁盘上的文件不对应目录中的任何附件或压缩包成员；
+    - zero_byte：空文件；
+    - truncated：小于下载时服务器返回的 Content-Length；
+    - duplicate：内容相同但不是同一文件（硬链接）的多个文件；
+    - magic_mismatch：文件头与扩展名不符，如保存为 `.docx` 的 HTML 错误页面；
+    - member_mismatch：压缩包展开后的文件与记录的大小或摘要不符。
+
+    Args:
+        guidence_publish_pages (list[GuidencePublishPage]): 指导原则发布页列表。
+        root (str): 附件根目录。
+        max_workers (int | None): 计算摘要的线程数，为 None 时使用 CPU 核数。
+    Returns:
+        VerifyResult: 校验结果。
+    """
+
+    start_time = time.perf_counter()
+    result = VerifyResult()
+    # 压缩包展开后的文件位于缓存目录中，一并校验
+    files: list[ScannedFile] = []
+    for dir_path in (root, ARCHIVE_EXTRACT_DIR):
+        if os.path.isdir(dir_path):
+            files.extend(scan_tree(dir_path))
+    hash_files(files, max_workers)
+    result.files = len(files)
+    result.bytes = sum(file.size for file in {file.inode: file for file in files}.values())
+
+    expected_files = get_expected_files(guidence_publish_pages, root)
+    file_paths = {file.path for file in files}
+    for path, expected in expected_files.items():
+        if path not in file_paths:
+            result.issues.append(
+                Issue(ISSUE_MISSING, path, page_url=expected.page.url, anchor_href=expected.accessory.anchor_href)
+            )
+
+    for file in sorted(files, key=lambda x: x.path):
+        expected = expected_files.get(file.path)
+        if expected is None:
+            result.issues.append(Issue(ISSUE_ORPHANED, file.path))
+        result.issues.extend(check_file(file, expected))
+
+    files_by_sha256: dict[str, dict[tuple[int, int], str]] = {}
+    for file in files:
+        if file.size:
+            files_by_sha256.setdefault(file.sha256, {}).setdefault(file.inode, file.path)
+    for sha256, paths_by_inode in files_by_sha256.items():
+        if len(paths_by_inode) > 1:
+            paths = sorted(paths_by_inode.values())
+            for path in paths[1:]:
+                result.issues.append(Issue(ISSUE_DUPLICATE, path, f"same content as {paths[0]}"))
+
+    result.seconds = time.perf_counter() - start_time
+    return result
+
+
+def repair(
+    result: VerifyResult,
+    guidence_publish_pages: list[GuidencePublishPage],
+    root: str = "guidences",
+    timeout: int = 60,
+) -> int:
+    """
+    将可以修复的附件放入下载队列重新下载。空文件及文件头不符的文件连同下载状态先以 `REPAIR_BACKUP_SUFFIX`
+    为后缀暂存，以便完整下载；下载成功后删除暂存的文件，下载失败时恢复。不完整的文件由下载器续传。
+
+    Returns:
+        int: 重新下载成功的附件数量。
+    """
+
+    expected_files = get_expected_files(guidence_publish_pages, root)
+    accessory_queue: queue.Queue[tuple[Accessory, str] | None] = queue.Queue()
+    queued_paths: set[str] = set()
+    # 附件路径 -> 已暂存的附件及下载状态文件路径
+    backup_paths: dict[str, list[str]] = {}
+    for issue in result.issues:
+        expected = expected_files.get(issue.path)
+        if issue.type not in REPAIRABLE_ISSUE_LIST or expected is None or expected.member is not None:
+            continue
+        if issue.path in queued_paths:
+            continue
+        if issue.type in (ISSUE_ZERO_BYTE, ISSUE_MAGIC_MISMATCH):
+            backup_paths[issue.path] = []
+            for path in (issue.path, get_download_state_path(issue.path)):
+                if os.path.exists(path):
+                    os.replace(path, path + REPAIR_BACKUP_SUFFIX)
+                    backup_paths[issue.path].append(path)
+        queued_paths.add(issue.path)
+        accessory_queue.put((expected.accessory, os.path.dirname(issue.path)))
+    accessory_queue.put(None)
+
+    logger.info(f"重新下载 {len(queued_paths)} 个附件")
+    download_results: list[DownloadResult] = []
+    try:
+        download_results = asyncio.run(download_from_queue(accessory_queue, timeout))
+    finally:
+        downloaded_paths = {
+            os.path.normpath(download_result.save_path)
+            for download_result in download_results
+            if not download_result.error
+        }
+        for save_path, paths in backup_paths.items():
+            restore = os.path.normpath(save_path) not in downloaded_paths or not os.path.exists(save_path)
+            for path in paths:
+                if restore:
+                    os.replace(path + REPAIR_BACKUP_SUFFIX, path)
+                else:
+                    os.remove(path + REPAIR_BACKUP_SUFFIX)
+            if restore:
+                logger.warning(f"Failed to download {save_path} again, restored the original file.")
+    return sum(not download_result.error for download_result in download_results)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Check the downloaded guidences against the catalog.")
+    parser.add_argument("--root", default="guidences", help="The directory of the downloaded guidences.")
+    parser.add_argument("--catalog", help="The SQLite catalog to check against.")
+    parser.add_argument(
+        "--pickle", default="guidences.pickle", help="The pickle file used when the catalog is not given."
+    )
+    parser.add_argument("--max-workers", type=int, help="The number of hashing threads.")
+    parser.add_argument("--report", default=VERIFY_REPORT_PATH, help="The JSON file to write the issues to.")
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Queue missing, empty, truncated and mismatched accessories for download again.",
+    )
+    args = parser.parse_args()
+
+    guidence_publish_pages = load_catalog_pages(args.catalog, args.pickle)
+    result = verify(guidence_publish_pages, args.root, args.max_workers)
+    for issue in result.issues:
+        logger.info(f"{issue.type}: {issue.path}{f' ({issue.detail})' if issue.detail else ''}")
+    logger.info(result.summary())
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(dataclasses.asdict(result), f, ensure_ascii=False, indent=2)
+    logger.info(f"校验结果已写入 {args.report}")
+
+    if args.repair:
+        logger.info(f"成功重新下载 {repair(result, guidence_publish_pages, args.root)} 个附件")
+    elif any(issue.type in REPAIRABLE_ISSUE_LIST for issue in result.issues):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()